@@ -16,6 +16,11 @@ web_urlpatterns = [
     # Dashboard
     path('dashboard/', views.DashboardView.as_view(), name='dashboard'),
     path('dashboard/unified-check/', views.UnifiedCheckView.as_view(), name='unified_check'),
+    path('dashboard/unified-check/stream/', views.UnifiedCheckStreamView.as_view(), name='unified_check_stream'),
+    path('dashboard/batch-jobs/', views.BatchJobCreateView.as_view(), name='batch_job_create'),
+    path('dashboard/batch-jobs/<uuid:job_id>/', views.BatchJobStatusView.as_view(), name='batch_job_status'),
+    path('dashboard/batch-jobs/<uuid:job_id>/download/', views.BatchJobDownloadView.as_view(),
+         name='batch_job_download'),
 ]
 
 # API endpoints
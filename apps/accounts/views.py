@@ -1,28 +1,29 @@
+import asyncio
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import json
-import re
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import login, logout
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import redirect
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic import FormView, View, TemplateView
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 
 from apps.payments.models import Payment
 from apps.payments.services import PaymentService
-from apps.reports.models import Query
+from apps.reports.models import BatchJob, Query
 from apps.reports.services import (
-    AutotekaService,
-    CarfaxService,
-    VinhistoryService,
-    AuctionService,
-    AvitoService
+    ProviderCheckService, CheckJobService, CarstatService, BulkCheckService, QueryLogService, BatchJobService,
+    RecentQueriesService, VehicleReportService
 )
+from apps.reports.vin import decode_vin, normalize_vin, validate_vin
 from .forms import RegistrationForm, ForgotPasswordForm, LoginForm
 from .services import UserService
 
@@ -134,6 +135,12 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         
         user_queries = Query.objects.filter(user=user).order_by('-created_at')[:20]
         context['user_queries'] = user_queries
+
+        context['batch_jobs'] = BatchJob.objects.filter(user=user).defer('vins')[:10]
+        context['batch_providers'] = [
+            (provider, RecentQueriesService.QUERY_TYPE_NAMES.get(provider, provider))
+            for provider in BulkCheckService.CHECKS
+        ]
         
         return context
 
@@ -151,40 +158,32 @@ class UnifiedCheckView(LoginRequiredMixin, View):
             if not vin:
                 return JsonResponse({"error": "VIN не предоставлен"}, status=400)
             
-            # Basic VIN validation (length, pattern can be stricter)
-            vin = vin.strip().upper()
-            if len(vin) != 17 or not re.match(r'^[A-HJ-NPR-Z0-9]{17}$', vin):
-                 return JsonResponse({"error": "Некорректный формат VIN"}, status=400)
+            # Local VIN validation, so malformed VINs never reach the paid providers
+            vin = normalize_vin(vin)
+            vin_error = validate_vin(vin)
+            if vin_error:
+                return JsonResponse({"error": vin_error}, status=400)
 
             logger.info(f"User {request.user.username} requested unified check for VIN: {vin}")
 
             # Perform checks using services from reports app
-            # We run these sequentially for simplicity, could be parallelized later if needed
-            autoteka_result = AutotekaService.check(vin, 'vin') # Assume VIN check for Autoteka here
-            carfax_result = CarfaxService.check(vin)
-            vinhistory_result = VinhistoryService.check(vin)
-            auction_result = AuctionService.check(vin)
+            # All providers run concurrently, so the wait is bounded by the slowest one
+            # Providers with fresh sections in the VIN's report are answered from that one key
+            cached, checks = VehicleReportService.answer(vin, ProviderCheckService.unified_checks(vin))
+            autoteka_job = None
+            if "autoteka" in checks and CheckJobService.is_requested(data):
+                # Autoteka polling moves to a background job, the client polls its status
+                checks.pop("autoteka")
+                autoteka_job = CheckJobService.submit(vin, 'vin')
+            results = CarstatService.split(ProviderCheckService.run_checks(checks)) if checks else {}
+            results.update(cached)
+            if autoteka_job:
+                results["autoteka"] = CheckJobService.serialize(autoteka_job)
+            results["vehicle"] = decode_vin(vin)
             
             # Save the query for the user's history
-            try:
-                Query.objects.create(
-                    user=request.user,
-                    vin=vin,
-                    query_type='unified' # Use a specific type for unified checks
-                )
-                logger.info(f"Saved unified query for user {request.user.username}, VIN {vin}")
-            except Exception:
-                # Log failure but don't block returning results to user
-                logger.exception(f"Failed to save unified query history for user {request.user.username}, VIN {vin}")
-
-            # Aggregate results
-            results = {
-                "autoteka": autoteka_result,
-                "carfax": carfax_result,
-                "vinhistory": vinhistory_result,
-                "auction": auction_result
-            }
-            
+            QueryLogService.log(vin, 'unified', request.user)  # Use a specific type for unified checks
+
             return JsonResponse(results)
 
         except json.JSONDecodeError:
@@ -193,3 +192,140 @@ class UnifiedCheckView(LoginRequiredMixin, View):
         except Exception:
             logger.exception(f"Unexpected error during unified check for user {request.user.username}")
             return JsonResponse({"error": "Внутренняя ошибка сервера при проверке"}, status=500)
+
+
+class UnifiedCheckStreamView(LoginRequiredMixin, View):
+    """
+    Server-Sent Events variant of the unified check, one event per provider as it completes.
+
+    Only the fast providers are checked inline. Autoteka previews take up to minutes, so
+    a missing Autoteka result is handed to a background check job. Under ASGI the stream
+    waits for the job without holding a thread and pushes its result. Under WSGI it sends
+    a 'job' event with the status URL, and the browser polls the job instead.
+    """
+
+    # Providers checked inline, each answers within one upstream round trip
+    INLINE_PROVIDERS = ("carfax", "vinhistory", "auction")
+
+    def get(self, request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        """Handle GET requests from an EventSource with the VIN in the query string."""
+        vin = normalize_vin(request.GET.get('vin'))
+        vin_error = validate_vin(vin)
+        if vin_error:
+            return JsonResponse({"error": vin_error}, status=400)
+
+        logger.info(f"User {request.user.username} requested streamed unified check for VIN: {vin}")
+
+        QueryLogService.log(vin, 'unified', request.user)
+
+        autoteka = BulkCheckService.peek("autoteka", vin)
+        job = CheckJobService.submit(vin, 'vin') if autoteka is None else None
+        if isinstance(request, ASGIRequest):
+            events = self._async_events(vin, autoteka, job)
+        else:
+            events = self._events(vin, autoteka, job)
+
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @classmethod
+    def _events(cls, vin: str, autoteka: Optional[Dict[str, Any]], job):
+        """
+        Yield a 'vehicle' event decoded locally from the VIN, a 'result' event per provider
+        with cache hits first, a 'job' event for Autoteka if it runs in the background,
+        then a closing 'done' event.
+        """
+        yield from cls._inline_events(vin, autoteka)
+        if job:
+            data = {"provider": "autoteka", **CheckJobService.serialize(job),
+                    "status_url": reverse('reports:api_check_job_status', args=[job.job_id])}
+            yield cls._event("job", data)
+        yield "event: done\ndata: {}\n\n"
+
+    @classmethod
+    async def _async_events(cls, vin: str, autoteka: Optional[Dict[str, Any]], job):
+        """Yield the inline events, then wait for the Autoteka job and push its result."""
+        inline = cls._inline_events(vin, autoteka)
+        next_event = sync_to_async(next, thread_sensitive=False)
+        while (event := await next_event(inline, None)) is not None:
+            yield event
+
+        if job:
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + settings.PROVIDER_CHECK_TIMEOUT
+            status = CheckJobService.serialize(job)
+            while "result" not in status and loop.time() < deadline:
+                await asyncio.sleep(settings.CHECK_JOB_STREAM_POLL_INTERVAL)
+                yield ": keep-alive\n\n"
+                status = await sync_to_async(CheckJobService.get_status)(job.job_id)
+            result = status.get("result") or {"error": "Превышено время ожидания ответа от сервиса"}
+            yield cls._event("result", {"provider": "autoteka", "result": result, "cached": False})
+        yield "event: done\ndata: {}\n\n"
+
+    @classmethod
+    def _inline_events(cls, vin: str, autoteka: Optional[Dict[str, Any]]):
+        yield cls._event("vehicle", decode_vin(vin))
+        if autoteka is not None:
+            yield cls._event("result", {"provider": "autoteka", "result": autoteka, "cached": True})
+        for line in BulkCheckService.iter_results([vin], list(cls.INLINE_PROVIDERS),
+                                                  timeout=settings.PROVIDER_CHECK_TIMEOUT):
+            yield cls._event("result", {"provider": line["provider"], "result": line["result"],
+                                        "cached": line["cached"]})
+
+    @staticmethod
+    def _event(name: str, data: Dict[str, Any]) -> str:
+        return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class BatchJobCreateView(LoginRequiredMixin, View):
+    """Upload of a CSV or XLSX file with VINs to be checked in the background."""
+
+    def post(self, request: HttpRequest, *args: Any, **kwargs: Any) -> JsonResponse:
+        """Handle multipart POST requests with the file and the selected providers."""
+        upload = request.FILES.get('file')
+        if not upload:
+            return JsonResponse({"error": "Файл не загружен"}, status=400)
+
+        try:
+            job = BatchJobService.submit(request.user, upload, request.POST.getlist('providers'))
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        except Exception:
+            logger.exception(f"Unexpected error creating batch job for user {request.user.username}")
+            return JsonResponse({"error": "Внутренняя ошибка сервера при создании задачи"}, status=500)
+
+        logger.info(f"User {request.user.username} uploaded {upload.name} with {job.total_count} VINs")
+        return JsonResponse(_batch_job_data(BatchJobService.serialize(job)), status=202)
+
+
+class BatchJobStatusView(LoginRequiredMixin, View):
+    """Progress of a batch job, polled by the dashboard."""
+
+    def get(self, request: HttpRequest, job_id, *args: Any, **kwargs: Any) -> JsonResponse:
+        """Handle GET requests for a job of the current user."""
+        data = BatchJobService.get_status(job_id, request.user)
+        if data is None:
+            return JsonResponse({"error": "Задача не найдена"}, status=404)
+        return JsonResponse(_batch_job_data(data))
+
+
+class BatchJobDownloadView(LoginRequiredMixin, View):
+    """Download of the compressed results of a finished batch job."""
+
+    def get(self, request: HttpRequest, job_id, *args: Any, **kwargs: Any) -> FileResponse:
+        """Handle GET requests for a job of the current user."""
+        job = BatchJob.objects.filter(job_id=job_id, user=request.user).defer('vins').first()
+        if not job or not job.result_file:
+            raise Http404("Результаты не найдены")
+        return FileResponse(job.result_file.open('rb'), as_attachment=True, filename=f"vagvin-{job.job_id}.zip")
+
+
+def _batch_job_data(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the dashboard URLs to a serialized batch job."""
+    data["status_url"] = reverse('accounts:batch_job_status', args=[data["job_id"]])
+    if data["ready"]:
+        data["download_url"] = reverse('accounts:batch_job_download', args=[data["job_id"]])
+    return data
@@ -8,11 +8,11 @@ from decimal import Decimal, ROUND_HALF_UP
 from typing import Tuple, Optional, Dict, Any
 from urllib.parse import urlencode
 
-import requests
 from django.conf import settings
 from django.db import transaction
 from django.db.models import F, Sum, Count
 
+from vagvin.http_client import HttpClientRegistry
 from .models import Payment
 
 logger = logging.getLogger(__name__)
@@ -248,7 +248,7 @@ class YookassaPaymentProcessor(PaymentProcessor):
             }
         }
 
-        response = requests.post(
+        response = HttpClientRegistry.get("yookassa").post(
             "https://api.yookassa.ru/v3/payments",
             auth=(shop_id, secret_key),
             headers={
@@ -319,7 +319,7 @@ class HeleketPaymentProcessor(PaymentProcessor):
         base64_data = base64.b64encode(json_data.encode()).decode()
         sign = hashlib.md5((base64_data + api_key).encode()).hexdigest()
 
-        response = requests.post(
+        response = HttpClientRegistry.get("heleket").post(
             settings.HELEKET_API_URL,
             headers={
                 'merchant': merchant_id,
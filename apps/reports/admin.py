@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Query
+from .models import Query, CheckJob, ProviderResult, NegativeFilter, BatchJob, VinAlias
 
 
 @admin.register(Query)
@@ -22,3 +22,54 @@ class QueryAdmin(admin.ModelAdmin):
             'fields': ('created_at', 'updated_at')
         }),
     )
+
+
+@admin.register(CheckJob)
+class CheckJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'provider', 'input_type', 'input_value', 'status', 'created_at', 'finished_at')
+    list_filter = ('provider', 'status', 'created_at')
+    search_fields = ('job_id', 'input_value')
+    date_hierarchy = 'created_at'
+    readonly_fields = ('job_id', 'result', 'started_at', 'finished_at', 'created_at', 'updated_at')
+    list_per_page = 20
+
+
+@admin.register(ProviderResult)
+class ProviderResultAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'identifier_type', 'identifier', 'fetched_at', 'expires_at')
+    list_filter = ('provider', 'identifier_type', 'fetched_at')
+    search_fields = ('identifier',)
+    date_hierarchy = 'fetched_at'
+    readonly_fields = ('cache_key', 'payload', 'fetched_at', 'fresh_until', 'expires_at', 'created_at', 'updated_at')
+    list_per_page = 20
+
+
+@admin.register(NegativeFilter)
+class NegativeFilterAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'started_at', 'items_count', 'capacity', 'error_rate', 'updated_at')
+    list_filter = ('provider',)
+    exclude = ('bits',)
+    readonly_fields = ('provider', 'started_at', 'items_count', 'capacity', 'error_rate', 'created_at', 'updated_at')
+    list_per_page = 20
+
+
+@admin.register(BatchJob)
+class BatchJobAdmin(admin.ModelAdmin):
+    list_display = ('job_id', 'user', 'file_name', 'status', 'processed_count', 'total_count', 'error_count',
+                    'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('job_id', 'file_name', 'user__username', 'user__email')
+    date_hierarchy = 'created_at'
+    exclude = ('vins',)
+    readonly_fields = ('job_id', 'providers', 'total_count', 'processed_count', 'error_count', 'result_file',
+                       'started_at', 'finished_at', 'created_at', 'updated_at')
+    list_per_page = 20
+
+
+@admin.register(VinAlias)
+class VinAliasAdmin(admin.ModelAdmin):
+    list_display = ('identifier_type', 'identifier', 'vin', 'source', 'updated_at')
+    list_filter = ('identifier_type', 'source')
+    search_fields = ('identifier', 'vin')
+    readonly_fields = ('created_at', 'updated_at')
+    list_per_page = 20
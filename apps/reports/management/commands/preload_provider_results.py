@@ -0,0 +1,59 @@
+from datetime import timedelta
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from apps.reports.models import Query
+from apps.reports.services import ProviderResultService
+
+
+class Command(BaseCommand):
+    """Warm the cache from the provider result store, e.g. after a deploy or cache flush."""
+    help = 'Loads stored provider results for recently requested VINs into the cache'
+
+    def add_arguments(self, parser):
+        """Add command line arguments."""
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=7,
+            help='Preload VINs requested during this many days (default: 7)'
+        )
+
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=1000,
+            help='Maximum number of most recently requested VINs (default: 1000)'
+        )
+
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='VINs loaded from the store per query (default: 200)'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        """Execute the command."""
+        since = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+
+        vins = list(
+            Query.objects.filter(created_at__gte=since)
+            .values('vin')
+            .annotate(last_requested=Max('created_at'))
+            .order_by('-last_requested')
+            .values_list('vin', flat=True)[:options['limit']]
+        )
+        vins = [vin.upper() for vin in vins if vin]
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Preloading provider results for {len(vins)} VINs...'))
+
+        loaded = 0
+        for start in range(0, len(vins), batch_size):
+            loaded += ProviderResultService.preload(vins[start:start + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Loaded {loaded} stored results into the cache.'))
+        return None
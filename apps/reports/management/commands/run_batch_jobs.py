@@ -0,0 +1,64 @@
+import logging
+import time
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand
+
+from apps.reports.models import BatchJob
+from apps.reports.services import BatchJobService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Process uploaded dealer batch jobs outside of the web workers."""
+    help = 'Runs pending batch jobs one at a time, resuming interrupted ones from their last checkpoint'
+
+    def add_arguments(self, parser):
+        """Add command line arguments."""
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to sleep when the queue is empty (default: 5.0)'
+        )
+
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the jobs currently queued and exit'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        """Execute the worker loop."""
+        interval = options['interval']
+        once = options['once']
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Processing batch jobs...'))
+
+        seen = set()
+        while True:
+            requeued = BatchJobService.requeue_stale()
+            if requeued:
+                logger.warning(f'Requeued {requeued} stale batch jobs')
+
+            job_pk = (
+                BatchJob.objects.filter(status='pending')
+                .exclude(pk__in=seen)
+                .order_by('created_at')
+                .values_list('pk', flat=True)
+                .first()
+            )
+            if job_pk is not None:
+                # run_job claims the job atomically, so parallel workers never run it twice
+                if BatchJobService.run_job(job_pk):
+                    self.stdout.write(f'Processed batch job {job_pk}')
+                if once:
+                    seen.add(job_pk)
+            elif once:
+                break
+            else:
+                time.sleep(interval)
+
+        self.stdout.write(self.style.SUCCESS('Batch job queue drained.'))
+        return None
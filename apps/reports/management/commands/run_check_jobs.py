@@ -0,0 +1,101 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.reports.models import CheckJob
+from apps.reports.services import CheckJobService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Process queued provider check jobs outside of the web workers."""
+    help = 'Runs pending background check jobs (use with CHECK_JOBS_BACKEND=worker)'
+
+    def add_arguments(self, parser):
+        """Add command line arguments."""
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.CHECK_JOB_WORKERS,
+            help=f'Number of jobs processed at once (default: {settings.CHECK_JOB_WORKERS})'
+        )
+
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the queue is empty (default: 1.0)'
+        )
+
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Process the jobs currently queued and exit'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        """Execute the worker loop."""
+        concurrency = options['concurrency']
+        interval = options['interval']
+        once = options['once']
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Processing check jobs with {concurrency} threads...'))
+
+        seen = set()
+        running: Dict[Future, int] = {}
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="check-job-worker") as executor:
+            while True:
+                requeued = CheckJobService.requeue_stale()
+                if requeued:
+                    logger.warning(f'Requeued {requeued} stale check jobs')
+
+                # Claim only as many jobs as there are free threads, so a slow check never holds up the rest
+                job_pks = list(
+                    CheckJob.objects.filter(status='pending')
+                    .exclude(pk__in=seen.union(running.values()))
+                    .order_by('created_at')
+                    .values_list('pk', flat=True)[:concurrency - len(running)]
+                ) if len(running) < concurrency else []
+                if once:
+                    seen.update(job_pks)
+
+                # run_job claims each job atomically, so parallel workers never run it twice
+                processed = 0
+                for job_pk in job_pks:
+                    if concurrency > 1:
+                        running[executor.submit(self._run_job, job_pk)] = job_pk
+                    else:
+                        processed += CheckJobService.run_job(job_pk)
+
+                if running:
+                    done, _ = wait(running, timeout=interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        del running[future]
+                        processed += future.result()
+                elif not job_pks:
+                    if once:
+                        break
+                    time.sleep(interval)
+
+                if processed:
+                    self.stdout.write(f'Processed {processed} jobs')
+
+        self.stdout.write(self.style.SUCCESS('Check job queue drained.'))
+        return None
+
+    @staticmethod
+    def _run_job(job_pk: int) -> bool:
+        """Run a single job and release the thread's DB connection."""
+        try:
+            return CheckJobService.run_job(job_pk)
+        except Exception:
+            logger.exception(f'Unexpected error running check job {job_pk}')
+            return False
+        finally:
+            connections.close_all()
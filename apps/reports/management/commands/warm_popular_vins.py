@@ -0,0 +1,59 @@
+import logging
+import time
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.reports.services import CacheWarmingService
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Refresh the cached results of popular VINs before they go stale."""
+    help = 'Refreshes long-lived provider results of the most requested VINs ahead of expiry, within a daily budget'
+
+    def add_arguments(self, parser):
+        """Add command line arguments."""
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.CACHE_WARMING_INTERVAL,
+            help=f'Seconds between warming runs (default: {settings.CACHE_WARMING_INTERVAL})'
+        )
+
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=None,
+            help=f'Number of most requested VINs to warm (default: {settings.CACHE_WARMING_TOP_K})'
+        )
+
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run once and exit'
+        )
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        """Execute the worker loop."""
+        interval = options['interval']
+
+        self.stdout.write(self.style.MIGRATE_HEADING('Warming popular VINs...'))
+
+        while True:
+            try:
+                stats = CacheWarmingService.run(options['top'])
+                self.stdout.write(
+                    f"Looked at {stats['vins']} VINs: {stats['due']} results due, {stats['refreshed']} refreshed, "
+                    f"{stats['failed']} failed, {stats['skipped']} skipped; "
+                    f"{stats['prevented']} misses prevented today"
+                )
+            except Exception:
+                logger.exception('Cache warming run failed')
+            if options['once']:
+                break
+            time.sleep(interval)
+
+        return None
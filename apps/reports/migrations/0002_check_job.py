@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-17 22:31
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CheckJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='ID задачи')),
+                ('provider', models.CharField(default='autoteka', max_length=50, verbose_name='Сервис')),
+                ('input_type', models.CharField(max_length=20, verbose_name='Тип запроса')),
+                ('input_value', models.CharField(max_length=100, verbose_name='Значение')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='Результат')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало выполнения')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание выполнения')),
+            ],
+            options={
+                'verbose_name': 'Фоновая проверка',
+                'verbose_name_plural': 'Фоновые проверки',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='checkjob_status_created_idx')],
+            },
+        ),
+    ]
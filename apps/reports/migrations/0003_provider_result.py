@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-17 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0002_check_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('provider', models.CharField(max_length=50, verbose_name='Сервис')),
+                ('identifier_type', models.CharField(max_length=20, verbose_name='Тип идентификатора')),
+                ('identifier', models.CharField(max_length=100, verbose_name='Идентификатор')),
+                ('cache_key', models.CharField(max_length=200, verbose_name='Ключ кэша')),
+                ('payload', models.JSONField(verbose_name='Ответ сервиса')),
+                ('fetched_at', models.DateTimeField(verbose_name='Время получения')),
+                ('expires_at', models.DateTimeField(verbose_name='Действителен до')),
+            ],
+            options={
+                'verbose_name': 'Результат проверки',
+                'verbose_name_plural': 'Результаты проверок',
+                'ordering': ['-fetched_at'],
+                'indexes': [models.Index(fields=['identifier', 'expires_at'], name='providerresult_ident_exp_idx')],
+                'constraints': [models.UniqueConstraint(fields=('provider', 'identifier_type', 'identifier'), name='providerresult_unique_identifier')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-17 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_provider_result'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NegativeFilter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('provider', models.CharField(max_length=50, verbose_name='Сервис')),
+                ('started_at', models.DateTimeField(verbose_name='Начало поколения')),
+                ('capacity', models.PositiveIntegerField(verbose_name='Ёмкость')),
+                ('error_rate', models.FloatField(verbose_name='Доля ложных срабатываний')),
+                ('items_count', models.PositiveIntegerField(default=0, verbose_name='Количество записей')),
+                ('bits', models.BinaryField(verbose_name='Битовый массив')),
+            ],
+            options={
+                'verbose_name': 'Фильтр отсутствующих VIN',
+                'verbose_name_plural': 'Фильтры отсутствующих VIN',
+                'ordering': ['provider', '-started_at'],
+                'indexes': [models.Index(fields=['provider', 'started_at'], name='negfilter_provider_start_idx')],
+            },
+        ),
+    ]
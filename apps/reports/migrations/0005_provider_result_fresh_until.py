@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0004_negative_filter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='providerresult',
+            name='fresh_until',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Актуален до'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-17 23:11
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0005_provider_result_fresh_until'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('job_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='ID задачи')),
+                ('file_name', models.CharField(max_length=255, verbose_name='Имя файла')),
+                ('providers', models.JSONField(verbose_name='Сервисы')),
+                ('vins', models.JSONField(verbose_name='VIN-номера')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], default='pending', max_length=10, verbose_name='Статус')),
+                ('total_count', models.PositiveIntegerField(default=0, verbose_name='Всего VIN')),
+                ('processed_count', models.PositiveIntegerField(default=0, verbose_name='Обработано VIN')),
+                ('error_count', models.PositiveIntegerField(default=0, verbose_name='Ошибок')),
+                ('result_file', models.FileField(blank=True, upload_to='batch_jobs/', verbose_name='Файл результатов')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало выполнения')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание выполнения')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Пакетная проверка',
+                'verbose_name_plural': 'Пакетные проверки',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='batchjob_status_created_idx')],
+            },
+        ),
+    ]
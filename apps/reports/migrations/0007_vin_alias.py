@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0006_batch_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VinAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('identifier_type', models.CharField(choices=[('regNumber', 'Госномер'), ('itemId', 'Объявление Avito')], max_length=20, verbose_name='Тип идентификатора')),
+                ('identifier', models.CharField(max_length=100, verbose_name='Идентификатор')),
+                ('vin', models.CharField(max_length=17, verbose_name='VIN-номер')),
+                ('source', models.CharField(default='autoteka', max_length=50, verbose_name='Источник')),
+            ],
+            options={
+                'verbose_name': 'Соответствие VIN',
+                'verbose_name_plural': 'Соответствия VIN',
+                'ordering': ['-updated_at'],
+                'indexes': [models.Index(fields=['vin'], name='vinalias_vin_idx')],
+                'constraints': [models.UniqueConstraint(fields=('identifier_type', 'identifier'), name='vinalias_unique_identifier')],
+            },
+        ),
+    ]
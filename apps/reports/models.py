@@ -1,5 +1,8 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 from vagvin.models import BaseModel
 
@@ -17,3 +20,164 @@ class Query(BaseModel):
 
     def __str__(self):
         return f"{self.vin} - {self.created_at.strftime('%d.%m.%Y %H:%M')}"
+
+
+class CheckJob(BaseModel):
+    """Provider check executed by a background worker instead of the request thread."""
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name="ID задачи")
+    provider = models.CharField(max_length=50, default='autoteka', verbose_name="Сервис")
+    input_type = models.CharField(max_length=20, verbose_name="Тип запроса")
+    input_value = models.CharField(max_length=100, verbose_name="Значение")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    result = models.JSONField(null=True, blank=True, verbose_name="Результат")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало выполнения")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание выполнения")
+
+    class Meta:
+        verbose_name = "Фоновая проверка"
+        verbose_name_plural = "Фоновые проверки"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='checkjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.input_type}:{self.input_value} ({self.get_status_display()})"
+
+    @property
+    def is_finished(self) -> bool:
+        """Check if the job has a final result."""
+        return self.status in ('done', 'failed')
+
+
+class ProviderResult(BaseModel):
+    """Last paid provider response for an identifier, kept beyond cache evictions and restarts."""
+    provider = models.CharField(max_length=50, verbose_name="Сервис")
+    identifier_type = models.CharField(max_length=20, verbose_name="Тип идентификатора")
+    identifier = models.CharField(max_length=100, verbose_name="Идентификатор")
+    cache_key = models.CharField(max_length=200, verbose_name="Ключ кэша")
+    payload = models.JSONField(verbose_name="Ответ сервиса")
+    fetched_at = models.DateTimeField(verbose_name="Время получения")
+    fresh_until = models.DateTimeField(null=True, blank=True, verbose_name="Актуален до")
+    expires_at = models.DateTimeField(verbose_name="Действителен до")
+
+    class Meta:
+        verbose_name = "Результат проверки"
+        verbose_name_plural = "Результаты проверок"
+        ordering = ['-fetched_at']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'identifier_type', 'identifier'],
+                                    name='providerresult_unique_identifier'),
+        ]
+        indexes = [
+            models.Index(fields=['identifier', 'expires_at'], name='providerresult_ident_exp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.identifier_type}:{self.identifier}"
+
+    @property
+    def is_expired(self) -> bool:
+        """Check if the stored result is too old to be served."""
+        return self.expires_at <= timezone.now()
+
+
+class NegativeFilter(BaseModel):
+    """One generation of the Bloom filter of identifiers a provider confirmed missing."""
+    provider = models.CharField(max_length=50, verbose_name="Сервис")
+    started_at = models.DateTimeField(verbose_name="Начало поколения")
+    capacity = models.PositiveIntegerField(verbose_name="Ёмкость")
+    error_rate = models.FloatField(verbose_name="Доля ложных срабатываний")
+    items_count = models.PositiveIntegerField(default=0, verbose_name="Количество записей")
+    bits = models.BinaryField(verbose_name="Битовый массив")
+
+    class Meta:
+        verbose_name = "Фильтр отсутствующих VIN"
+        verbose_name_plural = "Фильтры отсутствующих VIN"
+        ordering = ['provider', '-started_at']
+        indexes = [
+            models.Index(fields=['provider', 'started_at'], name='negfilter_provider_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} ({self.started_at.strftime('%d.%m.%Y %H:%M')}, {self.items_count})"
+
+
+class BatchJob(BaseModel):
+    """Check of a dealer's VIN list uploaded as a spreadsheet, processed by a worker in chunks."""
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name="ID задачи")
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='batch_jobs',
+                             verbose_name="Пользователь")
+    file_name = models.CharField(max_length=255, verbose_name="Имя файла")
+    providers = models.JSONField(verbose_name="Сервисы")
+    vins = models.JSONField(verbose_name="VIN-номера")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    total_count = models.PositiveIntegerField(default=0, verbose_name="Всего VIN")
+    processed_count = models.PositiveIntegerField(default=0, verbose_name="Обработано VIN")
+    error_count = models.PositiveIntegerField(default=0, verbose_name="Ошибок")
+    result_file = models.FileField(upload_to='batch_jobs/', blank=True, verbose_name="Файл результатов")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало выполнения")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание выполнения")
+
+    class Meta:
+        verbose_name = "Пакетная проверка"
+        verbose_name_plural = "Пакетные проверки"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='batchjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.file_name} ({self.processed_count}/{self.total_count}, {self.get_status_display()})"
+
+    @property
+    def is_finished(self) -> bool:
+        """Check if the job has a final result."""
+        return self.status in ('done', 'failed')
+
+    @property
+    def progress(self) -> int:
+        """Get the share of processed VINs in percent."""
+        return int(self.processed_count * 100 / self.total_count) if self.total_count else 0
+
+
+class VinAlias(BaseModel):
+    """VIN of a license plate or Avito listing, learned from a resolved provider lookup."""
+    IDENTIFIER_TYPE_CHOICES = [
+        ('regNumber', 'Госномер'),
+        ('itemId', 'Объявление Avito'),
+    ]
+
+    identifier_type = models.CharField(max_length=20, choices=IDENTIFIER_TYPE_CHOICES,
+                                       verbose_name="Тип идентификатора")
+    identifier = models.CharField(max_length=100, verbose_name="Идентификатор")
+    vin = models.CharField(max_length=17, verbose_name="VIN-номер")
+    source = models.CharField(max_length=50, default='autoteka', verbose_name="Источник")
+
+    class Meta:
+        verbose_name = "Соответствие VIN"
+        verbose_name_plural = "Соответствия VIN"
+        ordering = ['-updated_at']
+        constraints = [
+            models.UniqueConstraint(fields=['identifier_type', 'identifier'], name='vinalias_unique_identifier'),
+        ]
+        indexes = [
+            models.Index(fields=['vin'], name='vinalias_vin_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.identifier_type}:{self.identifier} → {self.vin}"
@@ -0,0 +1,52 @@
+"""
+Canonical form of Russian registration plates, computed before any cache key is built.
+
+Users type plates in Cyrillic or in Latin lookalike letters, in either case, with
+spaces, dashes or a trailing RUS, and every spelling used to be its own cache key and
+its own paid Autoteka preview. All of them are reduced to one Cyrillic form by a
+translation table built once at import.
+"""
+import re
+from typing import Any, Optional
+
+# Letters allowed on Russian plates and their Latin lookalikes, in the same order
+PLATE_LETTERS = "АВЕКМНОРСТУХ"
+_LATIN_LOOKALIKES = "ABEKMHOPCTYX"
+_SEPARATORS = " -_.|\t"
+
+# One pass maps the lookalikes to Cyrillic and drops the separators
+_TRANSLATION = str.maketrans(_LATIN_LOOKALIKES, PLATE_LETTERS, _SEPARATORS)
+
+_LETTER = f"[{PLATE_LETTERS}]"
+_PLATE_FORMATS = (
+    re.compile(rf"^{_LETTER}\d{{3}}{_LETTER}{{2}}(?P<region>\d{{2,3}})$"),  # Cars: А123ВС77
+    re.compile(rf"^{_LETTER}{{2}}\d{{3}}(?P<region>\d{{2,3}})$"),  # Taxis and buses: АВ12377
+    re.compile(rf"^{_LETTER}{{2}}\d{{4}}(?P<region>\d{{2,3}})$"),  # Trailers: АВ123477
+    re.compile(rf"^\d{{4}}{_LETTER}{{2}}(?P<region>\d{{2,3}})$"),  # Motorcycles: 1234АВ77
+)
+# Two-digit regions 01-99, three-digit ones are issued in the 1xx, 2xx, 7xx and 9xx series
+_REGION_RE = re.compile(r'^(?:0[1-9]|[1-9]\d|[1279]\d\d)$')
+
+
+def normalize_plate(plate: Any) -> str:
+    """Reduce a plate to its canonical form: uppercase Cyrillic letters and digits only."""
+    plate = str(plate or "").strip().upper()
+    if plate.endswith("RUS"):
+        plate = plate[:-3]
+    return plate.translate(_TRANSLATION)
+
+
+def validate_plate(plate: str) -> Optional[str]:
+    """
+    Validate a normalized plate without any network call.
+
+    Returns:
+        Error message for the user, or None if the plate is valid.
+    """
+    for plate_format in _PLATE_FORMATS:
+        match = plate_format.fullmatch(plate)
+        if match:
+            if not _REGION_RE.fullmatch(match.group('region')):
+                return "Неверный код региона в госномере"
+            return None
+    return "Неверный формат госномера, пример: А123ВС77"
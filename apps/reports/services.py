@@ -1,25 +1,68 @@
+import asyncio
+import atexit
+import csv
+import io
+import shutil
+import tempfile
+import zipfile
+import zlib
 import time
 import requests
 import logging
 import json
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.core.cache import cache
+from django.db import connections
 from urllib.parse import urlparse, parse_qs
+from vagvin.bloom_filter import BloomFilter
+from vagvin.circuit_breaker import CircuitOpenError
+from vagvin.http_client import HttpClientRegistry
+from vagvin.poll_scheduler import PollScheduler, parse_retry_after
+from vagvin.rate_limiter import QuotaExceededError, RateLimiter
+from .plates import normalize_plate, validate_plate
+from .vin import decode_vin, normalize_vin, validate_vin
 import os
-from typing import Dict, Any, Union, Optional, List
+from typing import Dict, Any, Union, Optional, List, Callable, Deque, Iterator, Tuple
 import traceback
 
 logger = logging.getLogger(__name__)
 
-# Cache settings
-CACHE_TTL = 86400  # 24 hours
-CACHE_TIME_SHORT = 3600  # 1 hour
-CACHE_TIME_LONG = 86400  # 24 hours
+# Freshness classes of provider results, resolved to soft/hard TTLs by settings.PROVIDER_CACHE_TTL
+CACHE_TIME_SHORT = "short"  # Not found and partial results
+CACHE_TIME_LONG = "long"  # Found results
+
+# Upstream call result: the check result and its freshness class or TTL in seconds (None to skip caching)
+FetchResult = Tuple[Dict[str, Any], Union[str, int, None]]
+
+
+class _InflightCall:
+    """Upstream call in progress in this process, shared by all threads asking for the same key."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
 
 
 class CacheService:
     """Service for handling cache operations"""
+
+    # Single-flight bookkeeping: one upstream call per cache key in this process
+    _inflight: Dict[str, _InflightCall] = {}
+    _inflight_lock = threading.Lock()
+
+    # Background refreshes of stale entries
+    _revalidating: set = set()
+    _revalidate_executor: Optional[ThreadPoolExecutor] = None
+
+    # Lookup outcomes of this process per provider and identifier type
+    LOOKUP_OUTCOMES = ('hits', 'stale', 'coalesced', 'misses')
+    _lookups: Dict[str, Dict[str, int]] = {}
+    _lookups_lock = threading.Lock()
     
     @classmethod
     def generate_key(cls, prefix: str, *args: Any) -> str:
@@ -27,6 +70,477 @@ class CacheService:
         key_parts = [str(arg) for arg in args]
         return f"{prefix}:" + ":".join(key_parts)
 
+    @classmethod
+    def count(cls, namespace: str, outcome: str, amount: int = 1) -> None:
+        """Count a lookup outcome, or another event such as a rewritten identifier, for a namespace."""
+        with cls._lookups_lock:
+            counters = cls._lookups.setdefault(namespace, dict.fromkeys(cls.LOOKUP_OUTCOMES, 0))
+            counters[outcome] = counters.get(outcome, 0) + amount
+
+    @classmethod
+    def lookup_stats(cls) -> Dict[str, Dict[str, Any]]:
+        """Get lookup outcomes per namespace with the share answered from the cache or the result store."""
+        with cls._lookups_lock:
+            stats = {namespace: dict(counters) for namespace, counters in cls._lookups.items()}
+        for counters in stats.values():
+            lookups = sum(counters[outcome] for outcome in cls.LOOKUP_OUTCOMES)
+            hits = counters['hits'] + counters['stale']
+            counters['hit_rate'] = round(hits / lookups, 4) if lookups else None
+        return stats
+
+    @staticmethod
+    def get_windows(provider: Optional[str], ttl: Union[str, int]) -> Tuple[int, int]:
+        """
+        Resolve a freshness class to the provider's soft and hard TTLs.
+
+        A plain number of seconds is used as both, i.e. without a stale window.
+        """
+        if isinstance(ttl, int):
+            return ttl, ttl
+        windows = settings.PROVIDER_CACHE_TTL.get(provider) or settings.PROVIDER_CACHE_TTL["default"]
+        soft_ttl, hard_ttl = windows[ttl]
+        return soft_ttl, max(soft_ttl, hard_ttl)
+
+    @staticmethod
+    def read(cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a cache entry with its freshness.
+
+        Returns:
+            Dict with 'result', 'fetched_at' and 'fresh_until' (timestamps), or None.
+        """
+        entry = cache.get(cache_key)
+        if not entry:
+            return None
+        if not (isinstance(entry, dict) and "result" in entry and "fresh_until" in entry):
+            # Entries written before soft TTLs existed count as fresh until they expire
+            return {"result": entry, "fetched_at": None, "fresh_until": float("inf")}
+        return entry
+
+    @staticmethod
+    def write(cache_key: str, result: Dict[str, Any], soft_ttl: int, hard_ttl: int,
+              fetched_at: Optional[float] = None, warmed_from: Optional[float] = None) -> None:
+        """
+        Cache a result that is fresh for soft_ttl and may be served stale until hard_ttl.
+
+        Results refreshed ahead of expiry by CacheWarmingService carry warmed_from, the
+        time the replaced entry would have gone stale.
+        """
+        fetched_at = fetched_at or time.time()
+        remaining = int(fetched_at + hard_ttl - time.time())
+        if remaining > 0:
+            entry = {
+                "result": result,
+                "fetched_at": fetched_at,
+                "fresh_until": fetched_at + soft_ttl,
+            }
+            if warmed_from is not None:
+                entry["warmed_from"] = warmed_from
+            cache.set(cache_key, entry, remaining)
+
+    @staticmethod
+    def is_fresh(entry: Optional[Dict[str, Any]]) -> bool:
+        """Check if a cache entry is within its soft TTL."""
+        return bool(entry) and time.time() < entry["fresh_until"]
+
+    @classmethod
+    def get_or_fetch(cls, cache_key: str, fetch: Callable[[], FetchResult],
+                     label: Optional[str] = None,
+                     store_key: Optional[Tuple[str, str, str]] = None) -> Dict[str, Any]:
+        """
+        Get a provider result from the cache, the result store or upstream, in that order.
+
+        Concurrent callers for the same key share one upstream call: threads of this
+        process wait for the local leader, other workers and nodes wait on a cache lease.
+        Past its soft TTL a result is still returned right away, marked with 'stale' and
+        its 'age' in seconds, while one background refresh updates it.
+
+        Args:
+            cache_key: Key generated by generate_key.
+            fetch: Callable performing the upstream call, returning the result and its
+                freshness class or TTL in seconds (None for results that must not be cached).
+            label: Human readable description used in log messages.
+            store_key: (provider, identifier type, normalized identifier) under which
+                cacheable results are persisted in ProviderResult.
+
+        Returns:
+            Dict with the cached or freshly fetched result.
+        """
+        label = label or cache_key
+        namespace = f"{store_key[0]}:{store_key[1]}" if store_key else cache_key.split(":", 1)[0]
+        entry = cls.read(cache_key)
+        if entry:
+            logger.info(f"Retrieved {label} from cache")
+        elif store_key:
+            entry = ProviderResultService.load(cache_key, *store_key)
+            if entry:
+                logger.info(f"Retrieved {label} from result store")
+
+        if entry:
+            if cls.is_fresh(entry):
+                cls.count(namespace, "hits")
+                if store_key and entry.get("warmed_from"):
+                    CacheWarmingService.record_hit(store_key[0], store_key[2], entry["warmed_from"])
+                return entry["result"]
+            cls.count(namespace, "stale")
+            age = int(time.time() - entry["fetched_at"])
+            logger.info(f"Serving stale {label} ({age}s old) while it is refreshed")
+            cls._revalidate(cache_key, fetch, label, store_key)
+            return {**entry["result"], "stale": True, "age": age}
+
+        with cls._inflight_lock:
+            call = cls._inflight.get(cache_key)
+            is_leader = call is None
+            if is_leader:
+                call = _InflightCall()
+                cls._inflight[cache_key] = call
+
+        cls.count(namespace, "misses" if is_leader else "coalesced")
+        if not is_leader:
+            logger.info(f"Waiting for in-flight upstream call for {label}")
+            if not call.event.wait(settings.SINGLE_FLIGHT_LEASE_TTL):
+                return {"error": "Превышено время ожидания ответа от сервиса"}
+            if call.result is None:
+                return {"error": "Непредвиденная ошибка при проверке. Пожалуйста, попробуйте позже."}
+            return call.result
+
+        try:
+            call.result = cls._fetch_with_lease(cache_key, fetch, label, store_key)
+            return call.result
+        finally:
+            call.event.set()
+            with cls._inflight_lock:
+                cls._inflight.pop(cache_key, None)
+
+    @classmethod
+    def _fetch_with_lease(cls, cache_key: str, fetch: Callable[[], FetchResult],
+                          label: str, store_key: Optional[Tuple[str, str, str]] = None) -> Dict[str, Any]:
+        """Run the upstream call under a cache lease so that other workers reuse its result."""
+        lease_key = f"singleflight:lease:{cache_key}"
+        outcome_key = f"singleflight:outcome:{cache_key}"
+        lease_ttl = settings.SINGLE_FLIGHT_LEASE_TTL
+        deadline = time.monotonic() + lease_ttl
+
+        while True:
+            token = uuid.uuid4().hex
+            if cache.add(lease_key, token, lease_ttl):
+                try:
+                    # Another worker may have finished between our cache miss and the lease
+                    entry = cls.read(cache_key)
+                    if cls.is_fresh(entry):
+                        return entry["result"]
+
+                    result, ttl = fetch()
+                    cls._save_result(cache_key, result, ttl, store_key)
+                    # Errors are not cached, but workers waiting on this lease still get them
+                    cache.set(outcome_key, {"token": token, "result": result}, settings.SINGLE_FLIGHT_OUTCOME_TTL)
+                    return result
+                finally:
+                    if cache.get(lease_key) == token:
+                        cache.delete(lease_key)
+
+            leader_token = cache.get(lease_key)
+            if leader_token is None:
+                continue
+
+            logger.info(f"Waiting for upstream call for {label} leased by another worker")
+            poll_interval = 0.1
+            while time.monotonic() < deadline:
+                time.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, 1.0)
+
+                outcome = cache.get(outcome_key)
+                if outcome and outcome.get("token") == leader_token:
+                    return outcome["result"]
+                entry = cls.read(cache_key)
+                if cls.is_fresh(entry):
+                    return entry["result"]
+                if cache.get(lease_key) != leader_token:
+                    # The leader died without publishing a result, try to take over
+                    break
+            else:
+                logger.warning(f"Timed out waiting for in-flight upstream call for {label}")
+                return {"error": "Превышено время ожидания ответа от сервиса"}
+
+    @classmethod
+    def _save_result(cls, cache_key: str, result: Dict[str, Any], ttl: Union[str, int, None],
+                     store_key: Optional[Tuple[str, str, str]], warmed_from: Optional[float] = None) -> None:
+        """Cache and store a fetched result unless it must not be cached."""
+        if not ttl:
+            return
+        soft_ttl, hard_ttl = cls.get_windows(store_key[0] if store_key else None, ttl)
+        cls.write(cache_key, result, soft_ttl, hard_ttl, warmed_from=warmed_from)
+        if store_key:
+            ProviderResultService.save(cache_key, *store_key, result, soft_ttl, hard_ttl)
+            provider, identifier_type, identifier = store_key
+            if identifier_type == "vin":
+                now = time.time()
+                VehicleReportService.update(provider, identifier, result, now, now + soft_ttl, now + hard_ttl,
+                                            warmed_from)
+
+    @classmethod
+    def _revalidate(cls, cache_key: str, fetch: Callable[[], FetchResult],
+                    label: str, store_key: Optional[Tuple[str, str, str]]) -> None:
+        """Refresh a stale entry in the background, once across all workers."""
+        with cls._inflight_lock:
+            if cache_key in cls._revalidating:
+                return
+            cls._revalidating.add(cache_key)
+
+        lease_key = f"singleflight:revalidate:{cache_key}"
+        if not cache.add(lease_key, os.getpid(), settings.SINGLE_FLIGHT_LEASE_TTL):
+            with cls._inflight_lock:
+                cls._revalidating.discard(cache_key)
+            return
+
+        with cls._inflight_lock:
+            if cls._revalidate_executor is None:
+                cls._revalidate_executor = ThreadPoolExecutor(
+                    max_workers=settings.CACHE_REVALIDATE_WORKERS,
+                    thread_name_prefix="cache-revalidate"
+                )
+        cls._revalidate_executor.submit(cls._run_revalidation, cache_key, fetch, label, store_key, lease_key)
+
+    @classmethod
+    def _run_revalidation(cls, cache_key: str, fetch: Callable[[], FetchResult],
+                          label: str, store_key: Optional[Tuple[str, str, str]], lease_key: str) -> None:
+        try:
+            result, ttl = fetch()
+            if ttl:
+                cls._save_result(cache_key, result, ttl, store_key)
+                logger.info(f"Refreshed stale {label}")
+            else:
+                # Keep serving the stale result rather than replacing it with an error
+                logger.warning(f"Failed to refresh stale {label}: {result.get('error')}")
+        except Exception:
+            logger.exception(f"Unexpected error refreshing stale {label}")
+        finally:
+            cache.delete(lease_key)
+            with cls._inflight_lock:
+                cls._revalidating.discard(cache_key)
+            connections.close_all()
+
+
+class ProviderResultService:
+    """Durable store of paid provider results backing the cache."""
+
+    @staticmethod
+    def load(cache_key: str, provider: str, identifier_type: str, identifier: str) -> Optional[Dict[str, Any]]:
+        """
+        Get an unexpired stored result and put it back into the cache for its remaining lifetime.
+
+        Returns:
+            Cache entry as returned by CacheService.read, or None if there is none
+            or the store is unavailable.
+        """
+        from django.utils import timezone
+        from .models import ProviderResult
+
+        try:
+            record = ProviderResult.objects.filter(
+                provider=provider, identifier_type=identifier_type, identifier=identifier,
+                expires_at__gt=timezone.now()
+            ).first()
+        except Exception:
+            logger.exception(f"Failed to read stored {provider} result for {identifier}")
+            return None
+
+        if record is None:
+            return None
+        return ProviderResultService._refill(cache_key, record)
+
+    @staticmethod
+    def save(cache_key: str, provider: str, identifier_type: str, identifier: str,
+             payload: Dict[str, Any], soft_ttl: int, hard_ttl: int) -> None:
+        """Persist a freshly fetched result, replacing the previous one for the identifier."""
+        from django.utils import timezone
+        from .models import ProviderResult
+
+        now = timezone.now()
+        try:
+            ProviderResult.objects.update_or_create(
+                provider=provider, identifier_type=identifier_type, identifier=identifier,
+                defaults={
+                    "cache_key": cache_key,
+                    "payload": payload,
+                    "fetched_at": now,
+                    "fresh_until": now + timedelta(seconds=soft_ttl),
+                    "expires_at": now + timedelta(seconds=hard_ttl),
+                }
+            )
+        except Exception:
+            # The cache still holds the result, losing the durable copy is not fatal
+            logger.exception(f"Failed to store {provider} result for {identifier}")
+
+    @staticmethod
+    def preload(identifiers: List[str], identifier_type: str = "vin") -> int:
+        """
+        Warm the cache with unexpired stored results for the given identifiers.
+
+        Returns:
+            Number of results put into the cache.
+        """
+        from django.utils import timezone
+        from .models import ProviderResult
+
+        records = ProviderResult.objects.filter(
+            identifier_type=identifier_type, identifier__in=identifiers, expires_at__gt=timezone.now()
+        ).only("provider", "identifier_type", "identifier", "cache_key", "payload", "fetched_at", "fresh_until",
+               "expires_at")
+
+        return sum(1 for record in records.iterator() if ProviderResultService._refill(record.cache_key, record))
+
+    @staticmethod
+    def _refill(cache_key: str, record) -> Optional[Dict[str, Any]]:
+        """Put a stored result into the cache with its original fetch time and windows."""
+        fetched_at = record.fetched_at.timestamp()
+        # Rows stored before soft TTLs existed stay fresh until they expire
+        fresh_until = (record.fresh_until or record.expires_at).timestamp()
+        hard_ttl = record.expires_at.timestamp() - fetched_at
+        if fetched_at + hard_ttl <= time.time():
+            return None
+        CacheService.write(cache_key, record.payload, fresh_until - fetched_at, hard_ttl, fetched_at)
+        if record.identifier_type == "vin":
+            VehicleReportService.update(record.provider, record.identifier, record.payload,
+                                        fetched_at, fresh_until, fetched_at + hard_ttl)
+        return {"result": record.payload, "fetched_at": fetched_at, "fresh_until": fresh_until}
+
+
+class _NegativeFilterState:
+    """In-process copy of a provider's negative filter generations."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current: Optional[BloomFilter] = None
+        self.previous: Optional[BloomFilter] = None
+        self.versions: Tuple = ()
+        self.pending: set = set()
+        self.synced_at: Optional[float] = None
+        self.hits = 0
+
+
+class NegativeFilterService:
+    """
+    Bloom filters of identifiers each provider confirmed missing.
+
+    Lookups are answered from memory. Additions are merged into the database copy every
+    NEGATIVE_FILTER_SYNC_INTERVAL seconds, which also picks up other workers' additions.
+    A new generation starts every NEGATIVE_FILTER_ROTATION seconds and the previous one is
+    still consulted, so a miss is remembered for one to two rotation periods.
+    """
+
+    _states: Dict[str, _NegativeFilterState] = {}
+    _states_lock = threading.Lock()
+
+    @classmethod
+    def contains(cls, provider: str, identifier: str) -> bool:
+        """Check if a provider is known not to have any data for the identifier."""
+        state = cls._get_state(provider)
+        with state.lock:
+            found = any(bloom is not None and identifier in bloom for bloom in (state.current, state.previous))
+            found = found or identifier in state.pending
+            if found:
+                state.hits += 1
+        if found:
+            logger.info(f"Skipping {provider} check for {identifier}: known to be missing")
+        return found
+
+    @classmethod
+    def add(cls, provider: str, identifier: str) -> None:
+        """Remember that a provider confirmed it has no data for the identifier."""
+        state = cls._get_state(provider)
+        with state.lock:
+            state.pending.add(identifier)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, Any]]:
+        """Get the size and hit count of every filter loaded in this process."""
+        stats = {}
+        for provider, state in list(cls._states.items()):
+            with state.lock:
+                blooms = [bloom for bloom in (state.current, state.previous) if bloom is not None]
+                stats[provider] = {
+                    "generations": len(blooms),
+                    "bytes": sum(len(bloom.bits) for bloom in blooms),
+                    "pending": len(state.pending),
+                    "hits": state.hits,
+                }
+        return stats
+
+    @classmethod
+    def _get_state(cls, provider: str) -> _NegativeFilterState:
+        state = cls._states.get(provider)
+        if state is None:
+            with cls._states_lock:
+                state = cls._states.setdefault(provider, _NegativeFilterState())
+        if state.synced_at is None or time.monotonic() - state.synced_at >= settings.NEGATIVE_FILTER_SYNC_INTERVAL:
+            cls.sync(provider)
+        return state
+
+    @classmethod
+    def sync(cls, provider: str) -> None:
+        """Merge local additions into the stored filter, rotate it if due and reload it."""
+        from django.db import transaction
+        from django.utils import timezone
+        from .models import NegativeFilter
+
+        state = cls._states.setdefault(provider, _NegativeFilterState())
+        with state.lock:
+            pending, state.pending = state.pending, set()
+            state.synced_at = time.monotonic()
+
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                generations = list(
+                    NegativeFilter.objects.select_for_update()
+                    .filter(provider=provider)
+                    .order_by('-started_at')
+                    .only('pk', 'started_at', 'updated_at')[:2]
+                )
+                rotate = not generations or generations[0].started_at <= now - timedelta(
+                    seconds=settings.NEGATIVE_FILTER_ROTATION)
+                versions = tuple((generation.pk, generation.updated_at) for generation in generations)
+                if not rotate and not pending and versions == state.versions:
+                    return
+
+                generations = [NegativeFilter.objects.get(pk=generation.pk) for generation in generations]
+                if rotate:
+                    bloom = BloomFilter(settings.NEGATIVE_FILTER_CAPACITY, settings.NEGATIVE_FILTER_ERROR_RATE)
+                    generations.insert(0, NegativeFilter(
+                        provider=provider, started_at=now, capacity=bloom.capacity,
+                        error_rate=bloom.error_rate, bits=bloom.to_bytes()
+                    ))
+                    generations = generations[:2]
+
+                current = generations[0]
+                current_bloom = BloomFilter(current.capacity, current.error_rate, bytes(current.bits))
+                current.items_count += sum(1 for identifier in pending if current_bloom.add(identifier))
+                if rotate or pending:
+                    current.bits = current_bloom.to_bytes()
+                    current.save()
+                    if rotate:
+                        NegativeFilter.objects.filter(provider=provider).exclude(
+                            pk__in=[generation.pk for generation in generations]
+                        ).delete()
+                        logger.info(f"Started a new negative filter generation for {provider}")
+
+                previous_bloom = None
+                if len(generations) > 1:
+                    previous = generations[1]
+                    previous_bloom = BloomFilter(previous.capacity, previous.error_rate, bytes(previous.bits))
+                versions = tuple((generation.pk, generation.updated_at) for generation in generations)
+        except Exception:
+            logger.exception(f"Failed to sync negative filter for {provider}")
+            with state.lock:
+                state.pending |= pending
+            return
+
+        with state.lock:
+            state.current, state.previous, state.versions = current_bloom, previous_bloom, versions
+            for identifier in state.pending:
+                state.current.add(identifier)
+
 
 class LoggingService:
     """Service for handling specialized logging operations"""
@@ -39,6 +553,327 @@ class LoggingService:
         return message
 
 
+class QueryLogService:
+    """
+    Buffered writer of the Query log.
+
+    Checks are queued in memory and saved by a background thread with bulk_create once
+    QUERY_LOG_BATCH_SIZE rows are waiting or every QUERY_LOG_FLUSH_INTERVAL seconds,
+    so the request path never waits on the database for logging. The queue is flushed
+    at interpreter exit, which gunicorn workers reach on a graceful shutdown.
+    """
+
+    _queue: Deque[Dict[str, Any]] = deque()
+    _lock = threading.Lock()
+    _wakeup = threading.Event()
+    _writer: Optional[threading.Thread] = None
+    # Owner of anonymous website checks, resolved on the first flush
+    _website_user_id: Optional[int] = None
+
+    @classmethod
+    def log(cls, vin: str, query_type: str, user=None) -> None:
+        """Queue a Query row, saving anonymous checks for the website user."""
+        from .models import Query
+
+        # Raw plates and listing ids may be longer than the column, one long value must not fail a batch
+        entry = {
+            "user_id": user.pk if user is not None and user.is_authenticated else None,
+            "vin": str(vin or "").strip().upper()[:Query._meta.get_field("vin").max_length],
+            "query_type": query_type[:Query._meta.get_field("query_type").max_length],
+        }
+        if not settings.QUERY_LOG_BUFFERED:
+            cls._write([entry])
+            return
+
+        with cls._lock:
+            if len(cls._queue) >= settings.QUERY_LOG_MAX_QUEUE:
+                dropped = cls._queue.popleft()
+                logger.warning(f"Query log queue is full, dropped query for VIN {dropped['vin']}")
+            cls._queue.append(entry)
+            size = len(cls._queue)
+        cls._ensure_writer()
+        if size >= settings.QUERY_LOG_BATCH_SIZE:
+            cls._wakeup.set()
+
+    @classmethod
+    def flush(cls) -> int:
+        """Save all queued rows now, returning how many were saved."""
+        with cls._lock:
+            entries = list(cls._queue)
+            cls._queue.clear()
+        return cls._write(entries) if entries else 0
+
+    @classmethod
+    def get_website_user_id(cls) -> Optional[int]:
+        """Get the 'website' user, or the first superuser as a fallback, looked up once per process."""
+        from django.contrib.auth import get_user_model
+
+        if cls._website_user_id is None:
+            User = get_user_model()
+            user = User.objects.filter(username='website').only('pk').first() or \
+                User.objects.filter(is_superuser=True).only('pk').first()
+            cls._website_user_id = user.pk if user else None
+        return cls._website_user_id
+
+    @classmethod
+    def _write(cls, entries: List[Dict[str, Any]]) -> int:
+        from django.db import transaction
+        from .models import Query
+
+        try:
+            website_user_id = None
+            if any(entry["user_id"] is None for entry in entries):
+                website_user_id = cls.get_website_user_id()
+            queries = [
+                Query(user_id=entry["user_id"] or website_user_id, vin=entry["vin"], query_type=entry["query_type"])
+                for entry in entries if entry["user_id"] or website_user_id
+            ]
+            if len(queries) < len(entries):
+                logger.warning(f"Could not save {len(entries) - len(queries)} website queries - no suitable user found")
+        except Exception:
+            logger.exception(f"Failed to save {len(entries)} queries")
+            cls._website_user_id = None
+            return 0
+
+        try:
+            with transaction.atomic():
+                Query.objects.bulk_create(queries, batch_size=settings.QUERY_LOG_BATCH_SIZE)
+        except Exception:
+            logger.exception(f"Failed to save {len(queries)} queries at once, saving them one by one")
+            queries = cls._write_each(queries)
+        logger.info(f"Saved {len(queries)} queries")
+        RecentQueriesService.append(queries)
+        return len(queries)
+
+    @classmethod
+    def _write_each(cls, queries: List[Any]) -> List[Any]:
+        """Save rows one at a time, so a bad row loses only itself, returning the saved ones."""
+        from django.db import transaction
+
+        saved = []
+        for query in queries:
+            try:
+                with transaction.atomic():
+                    query.save()
+                saved.append(query)
+            except Exception:
+                logger.exception(f"Dropped query {query.query_type} for VIN {query.vin}")
+                # The website user may have been deleted, look it up again next time
+                cls._website_user_id = None
+        return saved
+
+    @classmethod
+    def _ensure_writer(cls) -> None:
+        """Start the background writer of this process on first use (and after a fork)."""
+        if cls._writer is not None and cls._writer.is_alive():
+            return
+        with cls._lock:
+            if cls._writer is not None and cls._writer.is_alive():
+                return
+            if cls._writer is None:
+                atexit.register(cls.flush)
+            cls._writer = threading.Thread(target=cls._run_writer, name="query-log", daemon=True)
+            cls._writer.start()
+
+    @classmethod
+    def _run_writer(cls) -> None:
+        while True:
+            cls._wakeup.wait(settings.QUERY_LOG_FLUSH_INTERVAL)
+            cls._wakeup.clear()
+            try:
+                cls.flush()
+            except Exception:
+                logger.exception("Query log writer failed")
+            finally:
+                connections.close_all()
+
+
+class RecentQueriesService:
+    """
+    Ring buffer of pre-formatted recent queries in the shared cache.
+
+    The query log appends to it, so the examples page polling it costs two cache reads
+    and no database query. Sequence numbers are taken with an incr of the counter and
+    claimed with add(), as RateLimiter claims its tokens, so racing writers on a backend
+    without an atomic incr never share one. Entry `seq` is written to slot
+    `seq % RECENT_QUERIES_SIZE` together with its number, overwriting the oldest one.
+    """
+
+    SEQ_KEY = "recent:queries:seq"
+    SLOT_KEY = "recent:queries:{slot}"
+    CLAIM_KEY = "recent:queries:claim:{seq}"
+    CLAIM_TTL = 3600
+
+    # Display names of query types
+    QUERY_TYPE_NAMES = {
+        'autoteka': 'Автотека (VIN)',
+        'autoteka_reg': 'Автотека (Госномер)',
+        'autoteka_avito': 'Автотека (Avito)',
+        'carfax': 'Carfax / Autocheck',
+        'vinhistory': 'Vinhistory',
+        'auction': 'Аукционы',
+        'basic': 'Базовый отчет',
+        'full': 'Полный отчет',
+        'unified': 'Комплексная проверка'
+    }
+
+    @classmethod
+    def format(cls, vin: str, query_type: str, created_at: datetime) -> str:
+        """Format a query the way the examples page shows it."""
+        timestamp = created_at.strftime('%d-%m-%y %H:%M:%S')
+        query_type_display = cls.QUERY_TYPE_NAMES.get(query_type, query_type)
+        return f"{timestamp} Пользователь сайта запросил проверку {query_type_display} по VIN {vin}"
+
+    @classmethod
+    def append(cls, queries: List[Any]) -> None:
+        """Add saved Query rows, oldest first, to the ring buffer."""
+        if not queries:
+            return
+        try:
+            if cache.get(cls.SEQ_KEY) is None and cls._seed():
+                # The rows are already saved, so the seed included them
+                return
+            cls._push([(query.vin, query.query_type, query.created_at) for query in queries])
+        except Exception:
+            logger.exception("Failed to append to recent queries")
+
+    @classmethod
+    def get(cls, limit: int = 10) -> Tuple[int, List[str]]:
+        """
+        Get the latest queries, newest first.
+
+        Returns:
+            Tuple of the buffer sequence number, which changes with every append, and the entries.
+        """
+        seq = cache.get(cls.SEQ_KEY)
+        if seq is None:
+            cls._seed()
+            seq = cache.get(cls.SEQ_KEY) or 0
+        return seq, cls._read(seq, limit)
+
+    @classmethod
+    def since(cls, after: int) -> Tuple[int, List[str]]:
+        """Get the queries added after sequence number `after`, newest first."""
+        seq = cache.get(cls.SEQ_KEY) or 0
+        return seq, cls._read(seq, seq - after)
+
+    @classmethod
+    def _read(cls, seq: int, limit: int) -> List[str]:
+        size = settings.RECENT_QUERIES_SIZE
+        limit = max(0, min(limit, size))
+        keys = [cls.SLOT_KEY.format(slot=index % size) for index in range(seq, max(seq - limit, 0), -1)]
+        values = cache.get_many(keys)
+        # A slot claimed but not written yet, or skipped by a racing incr, still holds an
+        # older entry or nothing, so only entries carrying the requested number are kept
+        entries = []
+        for index, key in zip(range(seq, max(seq - limit, 0), -1), keys):
+            value = values.get(key)
+            if isinstance(value, tuple) and value[0] == index:
+                entries.append(value[1])
+        return entries
+
+    @classmethod
+    def _push(cls, entries: List[Tuple[str, str, datetime]]) -> None:
+        size = settings.RECENT_QUERIES_SIZE
+        entries = entries[-size:]
+        cache.set_many({
+            cls.SLOT_KEY.format(slot=index % size): (index, cls.format(*entry))
+            for index, entry in zip(cls._claim(len(entries)), entries)
+        }, None)
+
+    @classmethod
+    def _claim(cls, count: int) -> List[int]:
+        """Take `count` sequence numbers no other writer holds, in ascending order."""
+        cache.add(cls.SEQ_KEY, 0, None)
+        claimed = []
+        while len(claimed) < count:
+            missing = count - len(claimed)
+            last = cache.incr(cls.SEQ_KEY, missing)
+            for index in range(last - missing + 1, last + 1):
+                if cache.add(cls.CLAIM_KEY.format(seq=index), 1, cls.CLAIM_TTL):
+                    claimed.append(index)
+                # Another writer got this number through a racing incr, the next incr takes more
+        return claimed
+
+    @classmethod
+    def _seed(cls) -> bool:
+        """
+        Fill an empty buffer, e.g. after a cache flush, from the latest Query rows.
+
+        Returns:
+            True if this call filled it, False if another worker got there first.
+        """
+        from .models import Query
+
+        queries = Query.objects.order_by('-created_at').only('vin', 'query_type', 'created_at')
+        entries = [(query.vin, query.query_type, query.created_at)
+                   for query in reversed(queries[:settings.RECENT_QUERIES_SIZE])]
+        if not cache.add(cls.SEQ_KEY, 0, None):
+            return False
+        if entries:
+            cls._push(entries)
+        return True
+
+
+class RecentQueriesFeed:
+    """
+    Change notifications of the recent queries buffer for streaming connections.
+
+    One watcher task per event loop polls the buffer sequence in the shared cache every
+    RECENT_QUERIES_PUSH_INTERVAL seconds while anybody listens, and wakes all waiting
+    connections when it moves, so idle connections cost nothing but a coroutine.
+    """
+
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _condition: Optional[asyncio.Condition] = None
+    _watcher: Optional[asyncio.Task] = None
+    _listeners = 0
+    _seq: Optional[int] = None
+
+    @classmethod
+    async def wait(cls, seq: int, timeout: float) -> int:
+        """Wait until the buffer moves past `seq` or the timeout passes, returning the current sequence."""
+        cls._ensure_watcher()
+        cls._listeners += 1
+        try:
+            async with cls._condition:
+                await asyncio.wait_for(cls._condition.wait_for(lambda: cls._seq not in (None, seq)), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            cls._listeners -= 1
+        return seq if cls._seq is None else cls._seq
+
+    @classmethod
+    def _ensure_watcher(cls) -> None:
+        loop = asyncio.get_running_loop()
+        if cls._loop is not loop:
+            cls._loop = loop
+            cls._condition = asyncio.Condition()
+            cls._watcher = None
+            cls._seq = None
+        if cls._watcher is None or cls._watcher.done():
+            cls._watcher = loop.create_task(cls._watch())
+
+    @classmethod
+    async def _watch(cls) -> None:
+        while True:
+            try:
+                seq = await cache.aget(RecentQueriesService.SEQ_KEY)
+            except Exception:
+                logger.exception("Failed to read recent queries sequence")
+                seq = None
+            if seq is not None and seq != cls._seq:
+                cls._seq = seq
+                async with cls._condition:
+                    cls._condition.notify_all()
+            await asyncio.sleep(settings.RECENT_QUERIES_PUSH_INTERVAL)
+            if not cls._listeners:
+                # Started again by the next connection
+                cls._seq = None
+                return
+
+
 class AvitoService:
     """Service for handling Avito-related operations"""
     
@@ -66,39 +901,143 @@ class AvitoService:
 
 
 class AvitoAuthService:
-    """Service for handling Avito API authentication."""
-    
-    @staticmethod
-    def get_token() -> Optional[str]:
+    """
+    Service for handling Avito API authentication.
+
+    The token is refreshed in the background shortly before it expires, with a single
+    refresh in flight across all workers, so requests keep using the current token.
+    """
+
+    TOKEN_KEY = "avito_token"
+    LOCK_KEY = "lock:avito_token"
+    LOCK_TTL = 30
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+    _pending: Dict[Optional[str], Future] = {}
+
+    @classmethod
+    def get_token(cls) -> Optional[str]:
         """
         Get authentication token for Avito/Autoteka API with Django caching.
         
         Returns:
             Optional[str]: The authentication token, or None if retrieval failed.
         """
-        cache_key = "avito_token"
-        token = cache.get(cache_key)
-        if token:
+        entry = cache.get(cls.TOKEN_KEY)
+        if isinstance(entry, dict) and entry["expires_at"] > time.time():
             logger.debug("Retrieved Avito token from cache.")
-            return token
+            if time.time() >= entry["refresh_at"]:
+                cls.refresh_in_background()
+            return entry["token"]
 
         # Check if credentials are set properly
         if not settings.AVITO_CLIENT_ID or settings.AVITO_CLIENT_ID == "your_client_id_here" or not settings.AVITO_CLIENT_SECRET or settings.AVITO_CLIENT_SECRET == "your_client_secret_here":
             logger.error("Avito credentials not configured properly. Check AVITO_CLIENT_ID and AVITO_CLIENT_SECRET in settings.")
             return None
 
+        return cls.refresh()
+
+    @classmethod
+    def invalidate(cls, token: Optional[str]) -> Future:
+        """
+        Replace a token rejected by the API (401/403) with a single coordinated refresh.
+
+        Other requests that got the same rejection join this refresh instead of
+        starting their own.
+        """
+        logger.warning("Avito token seems invalid, refreshing it.")
+        return cls.refresh_in_background(stale_token=token)
+
+    @classmethod
+    def refresh_in_background(cls, stale_token: Optional[str] = None) -> Future:
+        """Schedule a token refresh unless one is already pending in this process."""
+        with cls._executor_lock:
+            future = cls._pending.get(stale_token)
+            if future is not None and not future.done():
+                return future
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="avito-token")
+            cls._pending = {key: pending for key, pending in cls._pending.items() if not pending.done()}
+            future = cls._executor.submit(cls._refresh_isolated, stale_token)
+            cls._pending[stale_token] = future
+            return future
+
+    @classmethod
+    def _refresh_isolated(cls, stale_token: Optional[str]) -> Optional[str]:
+        try:
+            return cls.refresh(stale_token=stale_token, wait=False)
+        except Exception:
+            logger.exception("Unexpected error refreshing Avito token in background")
+            return None
+        finally:
+            # The shared cache may be database backed
+            connections.close_all()
+
+    @classmethod
+    def refresh(cls, stale_token: Optional[str] = None, wait: bool = True) -> Optional[str]:
+        """
+        Fetch a new token under a lock shared by all workers.
+
+        Args:
+            stale_token: Token known to be rejected, a cached token equal to it is not reused.
+            wait: Whether to wait for a refresh running in another worker instead of returning.
+
+        Returns:
+            Optional[str]: The current token, or None if retrieval failed.
+        """
+        deadline = time.monotonic() + cls.LOCK_TTL
+        while True:
+            lock_token = uuid.uuid4().hex
+            if cache.add(cls.LOCK_KEY, lock_token, cls.LOCK_TTL):
+                try:
+                    # Another worker may have refreshed between our check and the lock
+                    entry = cache.get(cls.TOKEN_KEY)
+                    if cls._is_fresh(entry, stale_token):
+                        return entry["token"]
+                    return cls._fetch_token()
+                finally:
+                    if cache.get(cls.LOCK_KEY) == lock_token:
+                        cache.delete(cls.LOCK_KEY)
+
+            if not wait:
+                return None
+
+            logger.debug("Waiting for Avito token refresh in another worker.")
+            while time.monotonic() < deadline:
+                time.sleep(0.2)
+                entry = cache.get(cls.TOKEN_KEY)
+                if cls._is_fresh(entry, stale_token):
+                    return entry["token"]
+                if not cache.get(cls.LOCK_KEY):
+                    # The refresh finished without a usable token or its worker died, try ourselves
+                    break
+            else:
+                logger.error("Timed out waiting for Avito token refresh.")
+                return None
+
+    @staticmethod
+    def _is_fresh(entry: Any, stale_token: Optional[str]) -> bool:
+        return (
+            isinstance(entry, dict)
+            and entry["token"] != stale_token
+            and entry["refresh_at"] > time.time()
+        )
+
+    @classmethod
+    def _fetch_token(cls) -> Optional[str]:
+        """Request a new token from Avito and cache it with its refresh time."""
         logger.info("Fetching new Avito token.")
         try:
             headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-            response = requests.post(
+            response = HttpClientRegistry.get("avito").post(
                 settings.AVITO_TOKEN_URL,
                 headers=headers,
                 data={
                     "grant_type": "client_credentials",
                     "client_id": settings.AVITO_CLIENT_ID,
                     "client_secret": settings.AVITO_CLIENT_SECRET
-                },
-                timeout=10  # Standard timeout
+                }
             )
             response.raise_for_status()
 
@@ -109,11 +1048,21 @@ class AvitoAuthService:
                 return None
 
             # Cache token with expiration time - 60 second buffer
-            expires_in = token_data.get('expires_in', 3600) - 60
-            cache.set(cache_key, token, timeout=max(60, expires_in))
-            logger.info(f"Successfully fetched and cached new Avito token. Expires in {expires_in}s.")
+            expires_in = max(60, token_data.get('expires_in', 3600) - 60)
+            # Refresh ahead of expiry, but not before half of the lifetime has passed
+            refresh_in = max(expires_in // 2, expires_in - settings.AVITO_TOKEN_REFRESH_AHEAD)
+            now = time.time()
+            cache.set(cls.TOKEN_KEY, {
+                "token": token,
+                "expires_at": now + expires_in,
+                "refresh_at": now + refresh_in,
+            }, timeout=expires_in)
+            logger.info(f"Successfully fetched and cached new Avito token. Expires in {expires_in}s, refresh in {refresh_in}s.")
             return token
 
+        except (CircuitOpenError, QuotaExceededError) as e:
+            logger.warning(f"Skipping Avito token request: {e}")
+            return None
         except requests.exceptions.RequestException:
             logger.exception("HTTP error getting Avito token")
             return None
@@ -122,6 +1071,89 @@ class AvitoAuthService:
             return None
 
 
+class VinAliasService:
+    """
+    Mapping of license plates and Avito listings to VINs.
+
+    Filled when an Autoteka lookup by plate or listing resolves to a VIN, so later
+    lookups of the same car by any of its identifiers share the VIN's cached results,
+    and VIN-only providers can answer plate or listing queries without an upstream call.
+    Mappings older than VIN_ALIAS_TTL are ignored, since plates get re-registered.
+    """
+
+    IDENTIFIER_TYPES = ('regNumber', 'itemId')
+
+    @staticmethod
+    def normalize(identifier_type: str, identifier: Any) -> str:
+        """Normalize a plate or listing ID the way Autoteka lookups key them, or return ''."""
+        if identifier_type == 'regNumber':
+            return normalize_plate(identifier)
+        identifier = str(identifier or "").strip()
+        return identifier if identifier.isdigit() else ""
+
+    @classmethod
+    def resolve(cls, identifier_type: str, identifier: Any) -> Optional[str]:
+        """Get the VIN of a plate or listing, or None if it is not known."""
+        from django.utils import timezone
+        from .models import VinAlias
+
+        identifier = cls.normalize(identifier_type, identifier)
+        if identifier_type not in cls.IDENTIFIER_TYPES or not identifier:
+            return None
+
+        key = cls._cache_key(identifier_type, identifier)
+        vin = cache.get(key)
+        if vin is not None:
+            return vin or None
+
+        try:
+            alias = VinAlias.objects.filter(
+                identifier_type=identifier_type, identifier=identifier,
+                updated_at__gte=timezone.now() - timedelta(seconds=settings.VIN_ALIAS_TTL),
+            ).only('vin', 'updated_at').first()
+        except Exception:
+            logger.exception(f"Failed to look up VIN of {identifier_type}:{identifier}")
+            return None
+
+        if alias:
+            remaining = settings.VIN_ALIAS_TTL - (timezone.now() - alias.updated_at).total_seconds()
+            cache.set(key, alias.vin, max(int(remaining), 1))
+            return alias.vin
+        # Unknown identifiers are remembered briefly, so repeated misses don't hit the database
+        cache.set(key, "", settings.VIN_ALIAS_MISS_TTL)
+        return None
+
+    @classmethod
+    def record(cls, identifier_type: str, identifier: Any, vin: str, source: str = "autoteka") -> bool:
+        """
+        Save the VIN a plate or listing resolved to.
+
+        Returns:
+            bool: True if the mapping was saved.
+        """
+        from .models import VinAlias
+
+        identifier = cls.normalize(identifier_type, identifier)
+        vin = normalize_vin(vin)
+        if identifier_type not in cls.IDENTIFIER_TYPES or not identifier or validate_vin(vin):
+            return False
+
+        try:
+            VinAlias.objects.update_or_create(
+                identifier_type=identifier_type, identifier=identifier, defaults={"vin": vin, "source": source}
+            )
+            cache.set(cls._cache_key(identifier_type, identifier), vin, settings.VIN_ALIAS_TTL)
+        except Exception:
+            logger.exception(f"Failed to save VIN of {identifier_type}:{identifier}")
+            return False
+        logger.info(f"Linked {identifier_type}:{identifier} to VIN {vin} ({source})")
+        return True
+
+    @staticmethod
+    def _cache_key(identifier_type: str, identifier: str) -> str:
+        return CacheService.generate_key("vin_alias", identifier_type, identifier)
+
+
 class AutotekaService:
     """Service for interacting with the Autoteka API."""
     
@@ -132,6 +1164,13 @@ class AutotekaService:
         "itemId": "https://pro.autoteka.ru/autoteka/v1/request-preview-by-item-id",
         "preview_url": "https://pro.autoteka.ru/autoteka/v1/previews"
     }
+
+    INPUT_TYPES = ('vin', 'regNumber', 'itemId')
+
+    @staticmethod
+    def get_poll_scheduler() -> PollScheduler:
+        """Get the preview poll schedule, learned per input type."""
+        return PollScheduler("autoteka", settings.AUTOTEKA_POLLING)
     
     @staticmethod
     def check(input_value: str, input_type: str) -> Dict[str, Any]:
@@ -155,8 +1194,17 @@ class AutotekaService:
             return {"error": f"Неверный тип запроса: {input_type}. Допустимы: vin, regNumber, itemId"}
 
         # Normalize input based on type
-        if input_type in ('vin', 'regNumber'):
-            cache_key_val = input_value.upper()  # Normalize VIN/RegNumber
+        if input_type == 'vin':
+            # Autoteka also knows Russian-market bodies with non-ISO VINs, so the value is only normalized
+            cache_key_val = normalize_vin(input_value)
+        elif input_type == 'regNumber':
+            # Every spelling of a plate shares one cache key and one preview
+            cache_key_val = normalize_plate(input_value)
+            plate_error = validate_plate(cache_key_val)
+            if plate_error:
+                return {"error": plate_error}
+            if cache_key_val != input_value.upper():
+                CacheService.count("autoteka:regNumber", "canonicalized")
         elif input_type == 'itemId':
             try:
                 # Ensure itemId is numeric
@@ -167,19 +1215,126 @@ class AutotekaService:
         else:
             cache_key_val = input_value
 
+        if input_type != 'vin':
+            # A plate or listing resolved before shares the result of its VIN
+            vin = VinAliasService.resolve(input_type, cache_key_val)
+            if vin:
+                logger.info(f"Autoteka {input_type}:{cache_key_val} is answered by VIN {vin}")
+                return AutotekaService.check(vin, 'vin')
+
         cache_key = CacheService.generate_key("autoteka", input_type, cache_key_val)
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.info(f"Retrieved Autoteka data from cache for {input_type}:{cache_key_val}")
-            return cached_result
+        return CacheService.get_or_fetch(
+            cache_key,
+            lambda: AutotekaService._fetch(cache_key_val, input_type),
+            label=f"Autoteka data for {input_type}:{cache_key_val}",
+            store_key=("autoteka", input_type, cache_key_val)
+        )
 
-        LoggingService.log_check_request("Autoteka", f"{input_type} {cache_key_val}")
+    @staticmethod
+    def pending_preview_key(input_type: str, cache_key_val: str) -> str:
+        """Get the cache key of the preview being polled for an identifier."""
+        return CacheService.generate_key("autoteka_preview", input_type, cache_key_val)
+
+    @staticmethod
+    def _create_preview(cache_key_val: str, input_type: str, preview_request_headers: Dict[str, str],
+                        access_token: str) -> Tuple[Optional[str], Optional[FetchResult]]:
+        """
+        Request a new Autoteka preview.
+
+        Returns:
+            Tuple of the preview ID, or None and the final check result if no preview was created.
+        """
+        # Determine API endpoint and payload based on input type
+        if input_type == 'vin':
+            preview_url = AutotekaService.AUTOTEKA_URLS["vin"]
+            payload = {"vin": cache_key_val}
+        elif input_type == 'regNumber':
+            preview_url = AutotekaService.AUTOTEKA_URLS["regNumber"]
+            payload = {"regNumber": cache_key_val}
+        elif input_type == 'itemId':
+            preview_url = AutotekaService.AUTOTEKA_URLS["itemId"]
+            try:
+                item_id = int(cache_key_val)
+                payload = {"itemId": item_id}
+            except ValueError:
+                logger.error(f"Invalid itemId format: {cache_key_val}")
+                return None, ({"error": "Некорректный ID объявления Авито"}, None)
+        else:
+            logger.error(f"Invalid input_type for Autoteka check: {input_type}")
+            return None, ({"error": "Некорректный тип запроса для Автотеки"}, None)
+
+        # Request preview ID
+        logger.info(f"Requesting Autoteka preview for {input_type}: {cache_key_val} at URL: {preview_url}")
+        logger.debug(f"Autoteka Request Headers: {preview_request_headers}")
+        logger.debug(f"Autoteka Request Payload: {json.dumps(payload)}")
+        
+        try:
+            response = HttpClientRegistry.get("autoteka").post(preview_url, headers=preview_request_headers, json=payload)
+            logger.debug(f"Autoteka Response Status Code: {response.status_code}")
+            logger.debug(f"Autoteka Response Text: {response.text}")
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            status_code = e.response.status_code
+            error_text = e.response.text
+            logger.exception(f"HTTP error during Autoteka preview POST: {status_code}, {error_text}")
+
+            if status_code == 401 or status_code == 403:
+                # Replace the rejected token once for all workers instead of dropping it
+                AvitoAuthService.invalidate(access_token)
+                return None, ({"error": "Ошибка авторизации в Автотеке. Проверьте учетные данные или обновите токен."}, None)
+            elif status_code == 404:
+                # 404 on POST likely means bad endpoint/parameters, not necessarily 'VIN not found'
+                return None, ({"error": f"Ошибка API Автотеки (404 - Not Found). Возможно, неверный URL или параметры запроса."}, None)
+            else:
+                return None, ({"error": f"Ошибка сервера Автотеки ({status_code}) при запросе previewId. Попробуйте позже."}, None)
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping Autoteka preview request: {e}")
+            return None, ({"error": "Сервис Автотеки временно недоступен. Попробуйте позже."}, None)
+        except QuotaExceededError as e:
+            logger.warning(f"Skipping Autoteka preview request: {e}")
+            return None, ({"error": "Превышен лимит запросов к Автотеке. Попробуйте позже."}, None)
+        except requests.exceptions.RequestException as e:
+            logger.exception(f"Request error during Autoteka check: {e}")
+            return None, ({"error": "Ошибка соединения с сервером Автотеки. Проверьте подключение к интернету."}, None)
+        
+        # Parse the response for preview ID
+        try:
+            preview_data = response.json()
+        except json.JSONDecodeError:
+            logger.exception(f"Invalid JSON in Autoteka response: {response.text}")
+            return None, ({"error": "Некорректный ответ от сервера Автотеки. Попробуйте позже."}, None)
+
+        # Extract preview ID
+        preview_id = preview_data.get('result', {}).get('preview', {}).get('previewId')
+        if not preview_id:
+            logger.error(f"No previewId in Autoteka response: {preview_data}")
+            
+            # Check if the API returned a specific status like "notFound" directly
+            status = preview_data.get('result', {}).get('preview', {}).get('status')
+            if status == 'notFound':
+                # Use success: False structure consistent with polling results
+                result = {"success": False, "message": f'❌ {cache_key_val} отсутствует в Автотеке'}
+                return None, (result, CACHE_TIME_SHORT)
+            
+            return None, ({"error": "Не удалось получить данные от Автотеки. Попробуйте позже."}, None)
+
+        return preview_id, None
+
+    @staticmethod
+    def _fetch(cache_key_val: str, input_type: str) -> FetchResult:
+        """
+        Request an Autoteka preview and poll it until it is ready.
+
+        Returns:
+            Tuple of the check result and its freshness class, or None if it must not be cached.
+        """
+        LoggingService.log_check_request("Autoteka", f"{input_type} {cache_key_val}")
 
         # Get API token
         access_token = AvitoAuthService.get_token()
         if not access_token:
             logger.error("Failed to get Avito token for Autoteka check")
-            return {"error": "Ошибка авторизации в Автотеке. Пожалуйста, обратитесь к администратору."}
+            return {"error": "Ошибка авторизации в Автотеке. Пожалуйста, обратитесь к администратору."}, None
 
         # Define headers for API requests
         preview_request_headers = {
@@ -189,94 +1344,47 @@ class AutotekaService:
         status_polling_headers = {'Authorization': f'Bearer {access_token}'}
 
         try:
-            # Determine API endpoint and payload based on input type
-            if input_type == 'vin':
-                preview_url = AutotekaService.AUTOTEKA_URLS["vin"]
-                payload = {"vin": cache_key_val}
-            elif input_type == 'regNumber':
-                preview_url = AutotekaService.AUTOTEKA_URLS["regNumber"]
-                payload = {"regNumber": cache_key_val}
-            elif input_type == 'itemId':
-                preview_url = AutotekaService.AUTOTEKA_URLS["itemId"]
-                try:
-                    item_id = int(cache_key_val)
-                    payload = {"itemId": item_id}
-                except ValueError:
-                    logger.error(f"Invalid itemId format: {cache_key_val}")
-                    return {"error": "Некорректный ID объявления Авито"}
+            # 1. Resume the preview of an earlier attempt, e.g. from a worker that was restarted
+            # while polling, or request a new one
+            pending_key = AutotekaService.pending_preview_key(input_type, cache_key_val)
+            pending = cache.get(pending_key)
+            if pending:
+                preview_id, started_at = pending["preview_id"], pending["started_at"]
+                logger.info(f"Resuming Autoteka preview {preview_id} for {input_type}:{cache_key_val} "
+                            f"started {time.time() - started_at:.0f}s ago")
             else:
-                logger.error(f"Invalid input_type for Autoteka check: {input_type}")
-                return {"error": "Некорректный тип запроса для Автотеки"}
-
-            # 1. Request preview ID
-            logger.info(f"Requesting Autoteka preview for {input_type}: {cache_key_val} at URL: {preview_url}")
-            logger.debug(f"Autoteka Request Headers: {preview_request_headers}")
-            logger.debug(f"Autoteka Request Payload: {json.dumps(payload)}")
-            
-            try:
-                response = requests.post(preview_url, headers=preview_request_headers, json=payload, timeout=(5, 15))
-                logger.debug(f"Autoteka Response Status Code: {response.status_code}")
-                logger.debug(f"Autoteka Response Text: {response.text}")
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                status_code = e.response.status_code
-                error_text = e.response.text
-                logger.exception(f"HTTP error during Autoteka preview POST: {status_code}, {error_text}")
-
-                if status_code == 401 or status_code == 403:
-                    # Invalidate token cache on auth errors
-                    cache.delete("avito_token")
-                    logger.warning("Avito token seems invalid, cache cleared.")
-                    return {"error": "Ошибка авторизации в Автотеке. Проверьте учетные данные или обновите токен."}
-                elif status_code == 404:
-                    # 404 on POST likely means bad endpoint/parameters, not necessarily 'VIN not found'
-                    return {"error": f"Ошибка API Автотеки (404 - Not Found). Возможно, неверный URL или параметры запроса."}
-                else:
-                    return {"error": f"Ошибка сервера Автотеки ({status_code}) при запросе previewId. Попробуйте позже."}
-            except requests.exceptions.RequestException as e:
-                logger.exception(f"Request error during Autoteka check: {e}")
-                return {"error": "Ошибка соединения с сервером Автотеки. Проверьте подключение к интернету."}
-            
-            # Parse the response for preview ID
-            try:
-                preview_data = response.json()
-            except json.JSONDecodeError:
-                logger.exception(f"Invalid JSON in Autoteka response: {response.text}")
-                return {"error": "Некорректный ответ от сервера Автотеки. Попробуйте позже."}
-
-            # Extract preview ID
-            preview_id = preview_data.get('result', {}).get('preview', {}).get('previewId')
-            if not preview_id:
-                logger.error(f"No previewId in Autoteka response: {preview_data}")
-                
-                # Check if the API returned a specific status like "notFound" directly
-                status = preview_data.get('result', {}).get('preview', {}).get('status')
-                if status == 'notFound':
-                    # Use success: False structure consistent with polling results
-                    result = {"success": False, "message": f'❌ {cache_key_val} отсутствует в Автотеке'}
-                    cache.set(cache_key, result, CACHE_TIME_SHORT)
-                    return result
-                
-                return {"error": "Не удалось получить данные от Автотеки. Попробуйте позже."}
+                preview_id, error = AutotekaService._create_preview(
+                    cache_key_val, input_type, preview_request_headers, access_token
+                )
+                if error:
+                    return error
+                started_at = time.time()
+                cache.set(pending_key, {"preview_id": preview_id, "started_at": started_at},
+                          settings.AUTOTEKA_PREVIEW_RESUME_TTL)
 
             # 2. Poll for status
             # Use the v1 preview URL base for status polling
             status_url = f"{AutotekaService.AUTOTEKA_URLS['preview_url']}/{preview_id}"
-            max_wait_time = 120  # seconds
-            poll_interval = 3    # seconds
-            elapsed_time = 0
+            poll_run = AutotekaService.get_poll_scheduler().start(input_type, started_at)
+            retry_after = None
+            # Transient polling errors are retried until the deadline, the last one is reported then
+            timeout_result = {"error": "Превышено время ожидания ответа от Автотеки"}
 
             logger.info(f"Polling Autoteka status for previewId: {preview_id}")
-            while elapsed_time < max_wait_time:
-                time.sleep(poll_interval)
-                elapsed_time += poll_interval
+            while True:
+                delay = poll_run.next_delay(retry_after)
+                if delay is None:
+                    break
+                time.sleep(delay)
+                retry_after = None
 
                 try:
                     logger.debug(f"Polling Autoteka status URL: {status_url}")
                     logger.debug(f"Polling Autoteka status Headers: {status_polling_headers}")
-                    status_response = requests.get(status_url, headers=status_polling_headers, timeout=(5, 15))
+                    status_response = HttpClientRegistry.get("autoteka").get(status_url, headers=status_polling_headers)
                     logger.debug(f"Polling Autoteka status Response Code: {status_response.status_code}")
                     logger.debug(f"Polling Autoteka status Response Text: {status_response.text}")
+                    retry_after = parse_retry_after(status_response.headers.get('Retry-After'))
                     status_response.raise_for_status()
                     status_data = status_response.json()
 
@@ -288,6 +1396,7 @@ class AutotekaService:
                         brand = preview_content.get('data', {}).get('brand')
                         model = preview_content.get('data', {}).get('model')
                         year = preview_content.get('data', {}).get('year')
+                        vin = normalize_vin(preview_content.get('vin') or preview_content.get('data', {}).get('vin'))
 
                         # Construct a more informative success message
                         result = {
@@ -301,8 +1410,17 @@ class AutotekaService:
                             }
                         }
                         logger.info(f"Autoteka check successful for {input_type}:{cache_key_val}")
-                        cache.set(cache_key, result, CACHE_TIME_LONG)
-                        return result
+                        if input_type != 'vin' and VinAliasService.record(input_type, cache_key_val, vin):
+                            # The next lookup by VIN, plate or listing is served from the VIN's entry
+                            result["data"]["VIN"] = vin
+                            vin_result = {**result, "data": {**result["data"], "VIN/ГН/Id": vin}}
+                            CacheService._save_result(
+                                CacheService.generate_key("autoteka", "vin", vin), vin_result, CACHE_TIME_LONG,
+                                ("autoteka", "vin", vin)
+                            )
+                        poll_run.finish()
+                        cache.delete(pending_key)
+                        return result, CACHE_TIME_LONG
 
                     elif status == 'processing':
                         logger.debug(f"Autoteka report for {preview_id} still processing...")
@@ -311,21 +1429,23 @@ class AutotekaService:
                     elif status == 'notFound':
                         logger.info(f"Autoteka check result: {cache_key_val} not found.")
                         result = {"success": False, "message": f'❌ {cache_key_val} отсутствует в Автотеке'}
-                        cache.set(cache_key, result, CACHE_TIME_SHORT)  # Cache not found results shorter
-                        return result
+                        poll_run.finish()
+                        cache.delete(pending_key)
+                        return result, CACHE_TIME_SHORT  # Cache not found results shorter
 
                     elif status == 'error':
                         error_details = status_data.get('result', {}).get('preview', {}).get('error', {})
                         logger.error(f"Autoteka processing error for {preview_id}: {error_details}")
                         result = {"error": "Ошибка обработки данных в Автотеке."}
-                        cache.set(cache_key, result, CACHE_TIME_SHORT)
-                        return result
+                        cache.delete(pending_key)
+                        return result, CACHE_TIME_SHORT
                     
                     elif status == 'reportNotFound':  # Handle specific 'reportNotFound' status if it exists
                         logger.info(f"Autoteka report not found for {preview_id}. VIN: {cache_key_val}")
                         result = {"success": False, "message": f'❌ Отчет Автотеки для {cache_key_val} не найден'}
-                        cache.set(cache_key, result, CACHE_TIME_SHORT)
-                        return result
+                        poll_run.finish()
+                        cache.delete(pending_key)
+                        return result, CACHE_TIME_SHORT
 
                     else:
                         logger.warning(f"Unknown Autoteka status for {preview_id}: {status}. Data: {status_data}")
@@ -337,279 +1457,1478 @@ class AutotekaService:
                     logger.exception(f"HTTP error polling Autoteka status for {preview_id}: {status_code}, {error_text}")
                     # Don't cache intermittent polling errors, but stop polling if it's auth related
                     if status_code == 401 or status_code == 403:
-                        cache.delete("avito_token")
-                        logger.warning("Avito token seems invalid during polling, cache cleared.")
-                        return {"error": "Ошибка авторизации в Автотеке во время проверки статуса."}
-                    # Retry on other server errors? For now, stop polling and return error.
-                    return {"error": f"Ошибка сервера Автотеки ({status_code}) при проверке статуса."}
+                        AvitoAuthService.invalidate(access_token)
+                        return {"error": "Ошибка авторизации в Автотеке во время проверки статуса."}, None
+                    if status_code == 429 or status_code >= 500:
+                        # The preview is still being built upstream, keep polling it
+                        timeout_result = {"error": f"Ошибка сервера Автотеки ({status_code}) при проверке статуса."}
+                        continue
+                    # The preview is unknown or rejected, the next attempt must request a new one
+                    cache.delete(pending_key)
+                    return {"error": f"Ошибка сервера Автотеки ({status_code}) при проверке статуса."}, None
+                except CircuitOpenError as e:
+                    logger.warning(f"Stopped polling Autoteka status for {preview_id}: {e}")
+                    return {"error": "Сервис Автотеки временно недоступен. Попробуйте позже."}, None
+                except QuotaExceededError as e:
+                    logger.warning(f"Stopped polling Autoteka status for {preview_id}: {e}")
+                    return {"error": "Превышен лимит запросов к Автотеке. Попробуйте позже."}, None
                 except requests.exceptions.RequestException as e:
-                    logger.exception(f"Request error polling Autoteka status for {preview_id}: {e}")
-                    # Stop polling on connection errors
-                    return {"error": "Ошибка соединения с сервером Автотеки при проверке статуса."}
+                    logger.warning(f"Request error polling Autoteka status for {preview_id}, retrying: {e}")
+                    timeout_result = {"error": "Ошибка соединения с сервером Автотеки при проверке статуса."}
+                    continue
                 except json.JSONDecodeError:
                     logger.exception(f"Invalid JSON in Autoteka status response: {status_response.text}")
-                    return {"error": "Некорректный ответ от сервера Автотеки при проверке статуса."}
+                    return {"error": "Некорректный ответ от сервера Автотеки при проверке статуса."}, None
+
+            # If loop finishes without a result, the preview is kept for the next attempt to resume
+            logger.warning(f"Autoteka check timed out for {preview_id} ({input_type}:{cache_key_val}) "
+                           f"after {poll_run.polls} polls")
+            return timeout_result, None
+
+        except Exception:
+            logger.exception(f"Unexpected error during Autoteka check for {input_type}:{cache_key_val}")
+            return {"error": "Непредвиденная ошибка при проверке Автотеки"}, None
+
+
+class CarstatService:
+    """Combined Carstat lookup: Carfax/Autocheck record counts and auction records for one VIN."""
+
+    PARTS = ("carfax", "auction")
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        """Get the per-process executor for auction requests, creating it on first use."""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=settings.PROVIDER_CHECK_MAX_WORKERS,
+                        thread_name_prefix="carstat"
+                    )
+        return cls._executor
+
+    @staticmethod
+    def check(vin: str) -> Dict[str, Any]:
+        """
+        Get both Carstat results for a VIN from one cache entry.
+
+        Args:
+            vin: Vehicle identification number.
+
+        Returns:
+            Dict with 'carfax' and 'auction' results, or an error message.
+        """
+        vin_upper = normalize_vin(vin)
+        vin_error = validate_vin(vin_upper)
+        if vin_error:
+            return {"error": vin_error}
+
+        # Check if API key is set properly
+        if not settings.CARSTAT_API_KEY or len(settings.CARSTAT_API_KEY) < 10:
+            logger.error("Carstat API key not configured properly. Check CARSTAT_API_KEY in settings.")
+            return {"error": "Ошибка настройки API ключа Carstat. Пожалуйста, обратитесь к администратору."}
+
+        # Both resources come from one round trip, so it is skipped only if both are known missing
+        if NegativeFilterService.contains("carfax", vin_upper) and NegativeFilterService.contains("auction", vin_upper):
+            return {"carfax": CarfaxService.not_found(vin_upper), "auction": AuctionService.not_found(vin_upper)}
+
+        cache_key = CacheService.generate_key("carstat", vin_upper)
+        return CacheService.get_or_fetch(
+            cache_key,
+            lambda: CarstatService._fetch(vin_upper),
+            label=f"Carstat data for {vin_upper}",
+            store_key=("carstat", "vin", vin_upper)
+        )
+
+    @classmethod
+    def get_part(cls, vin: str, part: str) -> Dict[str, Any]:
+        """Get the result of one Carstat resource ('carfax' or 'auction') for a VIN."""
+        combined = cls.check(vin)
+        # Validation and timeout errors have no parts and apply to both resources
+        return combined[part] if part in combined else combined
+
+    @classmethod
+    def split(cls, results: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Replace a combined 'carstat' result with separate 'carfax' and 'auction' results."""
+        if "carstat" not in results:
+            return results
+        combined = results.pop("carstat")
+        for part in cls.PARTS:
+            results[part] = combined[part] if part in combined else dict(combined)
+        return results
+
+    @classmethod
+    def _fetch(cls, vin_upper: str) -> FetchResult:
+        """
+        Request both Carstat resources at the same time.
+
+        The auction request runs on a worker thread while this thread requests the record
+        counts, both over keep-alive connections of the pooled Carstat client. If one part
+        fails, the other is cached on its own and reused by the next fetch.
+
+        Returns:
+            Tuple of the combined result and its freshness class, or None if it must not be cached.
+        """
+        auction_future = cls.get_executor().submit(cls._fetch_part_isolated, vin_upper, "auction")
+        carfax_result, carfax_ttl = cls._fetch_part(vin_upper, "carfax")
+        auction_result, auction_ttl = auction_future.result()
+
+        result = {"carfax": carfax_result, "auction": auction_result}
+        # A transient error in either part must not be cached for the whole entry
+        if not carfax_ttl or not auction_ttl:
+            for part, part_result, part_ttl in (("carfax", carfax_result, carfax_ttl),
+                                                ("auction", auction_result, auction_ttl)):
+                if part_ttl:
+                    soft_ttl, hard_ttl = CacheService.get_windows("carstat", part_ttl)
+                    CacheService.write(CacheService.generate_key("carstat", part, vin_upper),
+                                       {"result": part_result, "ttl": part_ttl}, soft_ttl, hard_ttl)
+            ttl = None
+        elif CACHE_TIME_SHORT in (carfax_ttl, auction_ttl):
+            ttl = CACHE_TIME_SHORT
+        else:
+            ttl = CACHE_TIME_LONG
+        return result, ttl
+
+    @staticmethod
+    def _fetch_part(vin_upper: str, part: str) -> FetchResult:
+        """Request one Carstat resource unless it is still cached from a fetch where the other part failed."""
+        entry = CacheService.read(CacheService.generate_key("carstat", part, vin_upper))
+        if CacheService.is_fresh(entry):
+            logger.info(f"Reusing cached Carstat {part} part for {vin_upper}")
+            return entry["result"]["result"], entry["result"]["ttl"]
+        if part == "carfax":
+            return CarfaxService._fetch(vin_upper)
+        return AuctionService._fetch(vin_upper)
+
+    @classmethod
+    def _fetch_part_isolated(cls, vin_upper: str, part: str) -> FetchResult:
+        """Request one Carstat resource on a worker thread and release its DB connection afterwards."""
+        try:
+            return cls._fetch_part(vin_upper, part)
+        finally:
+            connections.close_all()
+
+
+class CarfaxService:
+    """Service for interacting with Carfax/Autocheck APIs."""
+    
+    @staticmethod
+    def check(vin: str) -> Dict[str, Any]:
+        """
+        Check vehicle information in Carfax/Autocheck databases via Carstat API.
+        
+        Args:
+            vin: Vehicle identification number.
+            
+        Returns:
+            Dict with results of the check or an error message.
+        """
+        vin_upper = normalize_vin(vin)
+        vin_error = validate_vin(vin_upper)
+        if vin_error:
+            return {"error": vin_error}
+
+        # Check if API key is set properly
+        if not settings.CARSTAT_API_KEY or len(settings.CARSTAT_API_KEY) < 10:
+            logger.error("Carstat API key not configured properly. Check CARSTAT_API_KEY in settings.")
+            return {"error": "Ошибка настройки API ключа Carstat. Пожалуйста, обратитесь к администратору."}
+
+        if NegativeFilterService.contains("carfax", vin_upper):
+            return CarfaxService.not_found(vin_upper)
+
+        # Record counts are fetched and cached together with the auction lookup
+        return CarstatService.get_part(vin_upper, "carfax")
+
+    @staticmethod
+    def not_found(vin_upper: str) -> Dict[str, Any]:
+        """Get the result for a VIN missing in Carfax/Autocheck."""
+        return {"success": False, "message": f"❌ VIN {vin_upper} отсутствует в базах Carfax/Autocheck"}
+
+    @staticmethod
+    def _fetch(vin_upper: str) -> FetchResult:
+        """
+        Request Carfax/Autocheck record counts from the Carstat API.
+
+        Returns:
+            Tuple of the check result and its freshness class, or None if it must not be cached.
+        """
+        LoggingService.log_check_request("Carfax/Autocheck", vin_upper)
+        url = f'https://carstat.dev/api/reports/check-records/{vin_upper}'
+        headers = {'accept': '*/*', 'x-api-key': settings.CARSTAT_API_KEY}
+
+        try:
+            logger.info(f"Checking Carfax/Autocheck (Carstat) for {vin_upper}")
+            response = HttpClientRegistry.get("carstat").get(url, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+
+            vehicle_info = data.get('vehicle')
+            carfax_records = data.get('carfax')
+            autocheck_records = data.get('autocheck')
+
+            # Check if data is meaningful
+            has_records = (carfax_records is not None and carfax_records > 0) or \
+                        (autocheck_records is not None and autocheck_records > 0)
+            is_valid_vehicle = vehicle_info and vehicle_info.lower() not in ('null null', 'null null 0')
+
+            if has_records and is_valid_vehicle:
+                result = {
+                    "success": True,
+                    "vehicle_info": vehicle_info,
+                    "carfax": carfax_records,
+                    "autocheck": autocheck_records,
+                    "message": f"✅ Найдены записи для {vehicle_info}"
+                }
+                logger.info(f"Carfax/Autocheck check successful for {vin_upper}")
+            else:
+                logger.info(f"No Carfax/Autocheck records found for {vin_upper}")
+                result = CarfaxService.not_found(vin_upper)
+                NegativeFilterService.add("carfax", vin_upper)
+
+            return result, CACHE_TIME_LONG
+
+        except requests.exceptions.HTTPError as e:
+            logger.exception(f"HTTP error during Carfax/Autocheck check for {vin_upper}. Status: {e.response.status_code}, Response: {e.response.text}")
+            # Handle specific Carstat errors if known, e.g., 404 for not found
+            if e.response.status_code == 404:
+                result = {"success": False, "message": f"❌ VIN {vin_upper} не найден в Carstat"}
+                NegativeFilterService.add("carfax", vin_upper)
+                return result, CACHE_TIME_SHORT
+            return {"error": f"Ошибка сети при запросе к Carstat ({e.response.status_code})"}, None
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping Carfax/Autocheck check for {vin_upper}: {e}")
+            return {"error": "Сервис Carstat временно недоступен. Попробуйте позже."}, None
+        except QuotaExceededError as e:
+            logger.warning(f"Skipping Carfax/Autocheck check for {vin_upper}: {e}")
+            return {"error": "Превышен лимит запросов к Carstat. Попробуйте позже."}, None
+        except requests.exceptions.RequestException:
+            logger.exception(f"Request error during Carfax/Autocheck check for {vin_upper}")
+            return {"error": "Ошибка сети при запросе к Carstat. Проверьте подключение к интернету."}, None
+        except Exception:
+            logger.exception(f"Unexpected error during Carfax/Autocheck check for {vin_upper}")
+            return {"error": "Внутренняя ошибка при проверке Carfax/Autocheck. Пожалуйста, попробуйте позже."}, None
+
+
+class VinhistoryService:
+    """Service for interacting with Vinhistory API."""
+    
+    @staticmethod
+    def check(vin: str) -> Dict[str, Any]:
+        """
+        Check vehicle information in Vinhistory database.
+        
+        Args:
+            vin: Vehicle identification number.
+            
+        Returns:
+            Dict with results of the check or an error message.
+        """
+        if not vin:
+            logger.error("Empty VIN provided to check_vinhistory")
+            return {"error": "Необходимо указать VIN"}
+
+        vin_upper = normalize_vin(vin)
+        vin_error = validate_vin(vin_upper)
+        if vin_error:
+            logger.warning(f"Invalid VIN for Vinhistory check: {vin_upper}")
+            return {"error": vin_error}
+
+        if NegativeFilterService.contains("vinhistory", vin_upper):
+            return VinhistoryService.not_found(vin_upper)
+
+        cache_key = CacheService.generate_key("vinhistory", vin_upper)
+        return CacheService.get_or_fetch(
+            cache_key,
+            lambda: VinhistoryService._fetch(vin_upper),
+            label=f"Vinhistory data for VIN: {vin_upper}",
+            store_key=("vinhistory", "vin", vin_upper)
+        )
+
+    @staticmethod
+    def not_found(vin_upper: str) -> Dict[str, Any]:
+        """Get the result for a VIN missing in Vinhistory."""
+        return {"success": False, "message": f"❌ В базе данных Vinhistory отсутствует VIN {vin_upper}"}
+
+    @staticmethod
+    def _fetch(vin_upper: str) -> FetchResult:
+        """
+        Request vehicle data and photo count from the Vinhistory API.
+
+        Returns:
+            Tuple of the check result and its freshness class, or None if it must not be cached.
+        """
+        LoggingService.log_check_request("Vinhistory", vin_upper)
+
+        if not settings.VINHISTORY_LOGIN or not settings.VINHISTORY_PASS:
+            logger.error("VINHistory credentials not configured properly.")
+            return {"error": "Ошибка конфигурации сервиса Vinhistory."}, None
+
+        params = {"login": settings.VINHISTORY_LOGIN, "password": settings.VINHISTORY_PASS, "vin": vin_upper}
+
+        try:
+            logger.info(f"Checking Vinhistory for {vin_upper}")
+            response = HttpClientRegistry.get("vinhistory").get("https://vinhistory.ru/api/search", params=params)
+            response.raise_for_status()  # Raise HTTPError for bad responses
+
+            data = response.json()
+
+            # Extract relevant data
+            vehicle_data = data.get('vehicle', {})
+            images_count = data.get('images', 0)
+            
+            vehicle_make = vehicle_data.get('make')
+            vehicle_model = vehicle_data.get('model')
+            vehicle_year = vehicle_data.get('year')
+
+            # Check if actual data exists and there are images
+            if images_count > 0 and vehicle_make and vehicle_model and vehicle_year:
+                logger.info(f"Vinhistory found {images_count} images for {vin_upper}")
+                result = {
+                    "success": True,
+                    "message": "Данные найдены в Vinhistory.",
+                    "vehicle": f"{vehicle_make} {vehicle_model} {vehicle_year}",
+                    "images_count": images_count
+                }
+                ttl = CACHE_TIME_LONG
+            # Handle case where VIN might be found but has no images (or incomplete data)
+            elif vehicle_make and vehicle_model and vehicle_year:
+                logger.info(f"Vinhistory found vehicle data but no images for {vin_upper}")
+                # Return a slightly different message indicating data exists but no images
+                result = {
+                    "success": True,  # Still technically a success, but with nuance
+                    "message": "Данные об автомобиле найдены, но фото отсутствуют.",
+                    "vehicle": f"{vehicle_make} {vehicle_model} {vehicle_year}",
+                    "images_count": 0
+                }
+                ttl = CACHE_TIME_SHORT
+            else:
+                # VIN not found or incomplete data returned
+                logger.info(f"No complete Vinhistory data found for {vin_upper}")
+                result = VinhistoryService.not_found(vin_upper)
+                NegativeFilterService.add("vinhistory", vin_upper)
+                ttl = CACHE_TIME_SHORT  # Cache not found results shorter
+
+            logger.info(f"Stored Vinhistory result for VIN: {vin_upper} with {ttl} TTL")
+            return result, ttl
+
+        except requests.exceptions.HTTPError as e:
+            status_code = e.response.status_code
+            error_text = e.response.text
+            logger.exception(f"HTTP error during Vinhistory check for {vin_upper}: {status_code}, {error_text}")
+            # Check for specific errors if needed, e.g., bad credentials
+            if status_code == 401 or status_code == 403:
+                return {"error": "Ошибка авторизации в Vinhistory. Проверьте учетные данные."}, None
+            return {"error": f"Ошибка сервера Vinhistory ({status_code}). Попробуйте позже."}, None
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping Vinhistory check for {vin_upper}: {e}")
+            return {"error": "Сервис Vinhistory временно недоступен. Попробуйте позже."}, None
+        except QuotaExceededError as e:
+            logger.warning(f"Skipping Vinhistory check for {vin_upper}: {e}")
+            return {"error": "Превышен лимит запросов к Vinhistory. Попробуйте позже."}, None
+        except requests.exceptions.RequestException:
+            logger.exception(f"Request error during Vinhistory check for {vin_upper}")
+            return {"error": "Ошибка соединения с сервером Vinhistory."}, None
+        except json.JSONDecodeError:
+            logger.exception(f"Invalid JSON in Vinhistory response")
+            return {"error": "Некорректный ответ от сервера Vinhistory."}, None
+        except Exception:
+            logger.exception(f"Unexpected error during Vinhistory check for {vin_upper}")
+            return {"error": "Непредвиденная ошибка при проверке Vinhistory"}, None
+
+
+class AuctionService:
+    """Service for checking auction data."""
+    
+    @staticmethod
+    def check(vin: str) -> Dict[str, Any]:
+        """
+        Check vehicle auction history using Carstat API.
+        
+        Args:
+            vin: Vehicle identification number.
+            
+        Returns:
+            Dict with results of the check or an error message.
+        """
+        vin_upper = normalize_vin(vin)
+        vin_error = validate_vin(vin_upper)
+        if vin_error:
+            return {"error": vin_error}
+
+        # Check if API key is set properly
+        if not settings.CARSTAT_API_KEY or len(settings.CARSTAT_API_KEY) < 10:
+            logger.error("Carstat API key not configured properly. Check CARSTAT_API_KEY in settings.")
+            return {"error": "Ошибка настройки API ключа Carstat. Пожалуйста, обратитесь к администратору."}
+
+        if NegativeFilterService.contains("auction", vin_upper):
+            return AuctionService.not_found(vin_upper)
+
+        # Auction records are fetched and cached together with the Carfax/Autocheck lookup
+        return CarstatService.get_part(vin_upper, "auction")
+
+    @staticmethod
+    def not_found(vin_upper: str) -> Dict[str, Any]:
+        """Get the result for a VIN missing in the Carstat auction database."""
+        return {"success": False, "message": f"❌ VIN {vin_upper} отсутствует в базе аукционов Carstat"}
+
+    @staticmethod
+    def _fetch(vin_upper: str) -> FetchResult:
+        """
+        Request auction records from the Carstat API.
+
+        Returns:
+            Tuple of the check result and its freshness class, or None if it must not be cached.
+        """
+        LoggingService.log_check_request("Auction (Carstat)", vin_upper)
+        url = f'https://carstat.dev/api/local-exists/{vin_upper}'
+        headers = {'accept': '*/*', 'x-api-key': settings.CARSTAT_API_KEY}
+
+        try:
+            logger.info(f"Checking auction history (Carstat) for {vin_upper}")
+            response = HttpClientRegistry.get("carstat").get(url, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+
+            if data.get('exists'):
+                # The 'domains' list seems to indicate individual auction records/sources
+                auction_count = len(data.get('domains', []))
+                result = {
+                    "success": True,
+                    "auction_count": auction_count,
+                    "message": f"✅ Найдены записи об аукционах ({auction_count} шт.) для VIN {vin_upper}"
+                }
+                logger.info(f"Auction check (Carstat) successful for {vin_upper}")
+            else:
+                logger.info(f"No auction records (Carstat) found for {vin_upper}")
+                result = AuctionService.not_found(vin_upper)
+                NegativeFilterService.add("auction", vin_upper)
+
+            return result, CACHE_TIME_LONG
+
+        except requests.exceptions.HTTPError as e:
+            logger.exception(f"HTTP error during auction check (Carstat) for {vin_upper}. Status: {e.response.status_code}, Response: {e.response.text}")
+            # Handle specific Carstat errors if known, e.g., 404
+            if e.response.status_code == 404:
+                result = {"success": False, "message": f"❌ VIN {vin_upper} не найден в базе аукционов Carstat"}
+                NegativeFilterService.add("auction", vin_upper)
+                return result, CACHE_TIME_SHORT
+            return {"error": f"Ошибка сети при запросе к Carstat (аукционы) ({e.response.status_code})"}, None
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping auction check (Carstat) for {vin_upper}: {e}")
+            return {"error": "Сервис Carstat временно недоступен. Попробуйте позже."}, None
+        except QuotaExceededError as e:
+            logger.warning(f"Skipping auction check (Carstat) for {vin_upper}: {e}")
+            return {"error": "Превышен лимит запросов к Carstat. Попробуйте позже."}, None
+        except requests.exceptions.RequestException:
+            logger.exception(f"Request error during auction check (Carstat) for {vin_upper}")
+            return {"error": "Ошибка сети при запросе к Carstat (аукционы). Проверьте подключение к интернету."}, None
+        except Exception:
+            logger.exception(f"Unexpected error during auction check (Carstat) for {vin_upper}")
+            return {"error": "Внутренняя ошибка при проверке истории аукционов. Пожалуйста, попробуйте позже."}, None
+
+
+class VehicleReportService:
+    """
+    Canonical per-VIN report merging the results of all providers.
+
+    Every cacheable provider result for a VIN is merged into the VIN's report when it is
+    cached, as a section with its own fetch time, soft and hard expiry. The report is
+    stored as one zlib-compressed JSON value, so pages showing several providers read one
+    key instead of one per provider. Sections past their soft TTL are left to the provider
+    services, which serve them stale while they refresh.
+    """
+
+    # Report sections filled by the cached result of each provider
+    SECTIONS = {
+        "autoteka": ("autoteka",),
+        "carstat": CarstatService.PARTS,
+        "vinhistory": ("vinhistory",),
+    }
+
+    # Provider whose cache entry fills each section
+    PROVIDERS = {section: provider for provider, sections in SECTIONS.items() for section in sections}
+
+    # Waits for the report lock before merging without it, in seconds
+    LOCK_TIMEOUT = 0.5
+    LOCK_TTL = 5
+
+    @staticmethod
+    def key(vin: str) -> str:
+        """Get the cache key of a VIN's report."""
+        return CacheService.generate_key("report", vin)
+
+    @classmethod
+    def get(cls, vin: str) -> Dict[str, Any]:
+        """
+        Get the report of a normalized VIN.
+
+        Returns:
+            Dict with 'vin', a 'vehicle' summary merged from local decoding and the
+            providers, and the 'sections' with their 'result', 'fetched_at',
+            'fresh_until' and 'expires_at'.
+        """
+        sections = cls._load(vin)
+        return {"vin": vin, "vehicle": cls._summarize(vin, sections), "sections": sections}
+
+    @classmethod
+    def fresh_sections(cls, vin: str) -> Dict[str, Dict[str, Any]]:
+        """Get the results of the report sections that are within their soft TTL."""
+        now = time.time()
+        fresh = {}
+        for name, section in cls._load(vin).items():
+            if now < section["fresh_until"]:
+                fresh[name] = section["result"]
+                if section.get("warmed_from"):
+                    CacheWarmingService.record_hit(cls.PROVIDERS.get(name, name), vin, section["warmed_from"])
+        return fresh
+
+    @classmethod
+    def section(cls, vin: Any, name: str) -> Optional[Dict[str, Any]]:
+        """Get a fresh result of one section for a VIN as entered by the user, or None."""
+        vin = normalize_vin(vin)
+        if validate_vin(vin):
+            return None
+        return cls.fresh_sections(vin).get(name)
+
+    @classmethod
+    def answer(cls, vin: str, checks: Dict[str, Callable[[], Dict[str, Any]]]
+               ) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Callable[[], Dict[str, Any]]]]:
+        """
+        Answer provider checks from the report where all their sections are fresh.
+
+        Args:
+            vin: Normalized VIN.
+            checks: Checks as returned by ProviderCheckService.unified_checks.
+
+        Returns:
+            Tuple of the results by section name and the checks still to run.
+        """
+        fresh = cls.fresh_sections(vin)
+        results, remaining = {}, {}
+        for name, check in checks.items():
+            sections = cls.SECTIONS.get(name, (name,))
+            if all(section in fresh for section in sections):
+                results.update({section: fresh[section] for section in sections})
+            else:
+                remaining[name] = check
+        return results, remaining
+
+    @classmethod
+    def update(cls, provider: str, vin: str, result: Dict[str, Any], fetched_at: float,
+               fresh_until: float, expires_at: float, warmed_from: Optional[float] = None) -> None:
+        """Merge a cached provider result into the VIN's report."""
+        if provider == "carstat":
+            if not all(part in result for part in CarstatService.PARTS):
+                return
+            results = {part: result[part] for part in CarstatService.PARTS}
+        else:
+            results = {provider: result}
+        entries = {
+            name: {"result": value, "fetched_at": fetched_at, "fresh_until": fresh_until, "expires_at": expires_at}
+            for name, value in results.items()
+        }
+        if warmed_from is not None:
+            for entry in entries.values():
+                entry["warmed_from"] = warmed_from
+
+        lock_key = f"lock:report:{vin}"
+        deadline = time.monotonic() + cls.LOCK_TIMEOUT
+        locked = cache.add(lock_key, 1, cls.LOCK_TTL)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.01)
+            locked = cache.add(lock_key, 1, cls.LOCK_TTL)
+        if not locked:
+            # A lost concurrent update only makes that provider fall back to its own cache key
+            logger.warning(f"Merging {provider} into report of {vin} without the lock")
+
+        try:
+            now = time.time()
+            sections = {name: section for name, section in cls._load(vin).items() if section["expires_at"] > now}
+            sections.update(entries)
+            timeout = int(max(section["expires_at"] for section in sections.values()) - now)
+            if timeout > 0:
+                data = json.dumps(sections, ensure_ascii=False, separators=(",", ":")).encode()
+                cache.set(cls.key(vin), zlib.compress(data), timeout)
+        except Exception:
+            logger.exception(f"Failed to update report of {vin} with {provider} result")
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    @classmethod
+    def _load(cls, vin: str) -> Dict[str, Dict[str, Any]]:
+        try:
+            data = cache.get(cls.key(vin))
+            return json.loads(zlib.decompress(data)) if data else {}
+        except Exception:
+            logger.exception(f"Failed to read report of {vin}")
+            return {}
+
+    @staticmethod
+    def _summarize(vin: str, sections: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """Merge the differently shaped vehicle descriptions of the providers into one."""
+        decoded = decode_vin(vin)
+        autoteka = (sections.get("autoteka", {}).get("result") or {}).get("data") or {}
+        titles = [
+            " ".join(str(value) for value in (autoteka.get("Марка"), autoteka.get("Модель"), autoteka.get("Год"))
+                     if value),
+            (sections.get("carfax", {}).get("result") or {}).get("vehicle_info"),
+            (sections.get("vinhistory", {}).get("result") or {}).get("vehicle"),
+        ]
+        return {
+            "make": autoteka.get("Марка") or decoded.get("make"),
+            "model": autoteka.get("Модель"),
+            "year": autoteka.get("Год") or decoded.get("year"),
+            "country": decoded.get("country"),
+            "title": next((title for title in titles if title), None),
+        }
+
+
+class ProviderCheckService:
+    """Service for running provider checks concurrently on a shared bounded thread pool."""
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        """Get the per-process executor, creating it on first use."""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=settings.PROVIDER_CHECK_MAX_WORKERS,
+                        thread_name_prefix="provider-check"
+                    )
+        return cls._executor
+
+    @staticmethod
+    def _run_isolated(name: str, check: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """Run a single check so that its failure never affects the other providers."""
+        try:
+            return check()
+        except Exception:
+            logger.exception(f"Unexpected error during {name} check in provider fan-out")
+            return {"error": "Непредвиденная ошибка при проверке. Пожалуйста, попробуйте позже."}
+        finally:
+            # Worker threads are long-lived, so release any DB connection opened by the check
+            connections.close_all()
+
+    @classmethod
+    def run_checks(cls, checks: Dict[str, Callable[[], Dict[str, Any]]],
+                   timeout: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Run several provider checks at once and collect their results.
+
+        Args:
+            checks: Mapping of result name to a zero-argument callable performing the check.
+            timeout: Overall deadline in seconds, defaults to settings.PROVIDER_CHECK_TIMEOUT.
+
+        Returns:
+            Dict with a result for every check name. Checks still running at the deadline
+            get an error result; they keep running in the background and fill the cache.
+        """
+        if timeout is None:
+            timeout = settings.PROVIDER_CHECK_TIMEOUT
+
+        executor = cls.get_executor()
+        futures = {
+            name: executor.submit(cls._run_isolated, name, check)
+            for name, check in checks.items()
+        }
+        wait(futures.values(), timeout=timeout)
+
+        results = {}
+        for name, future in futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                logger.warning(f"Provider check {name} did not finish within {timeout}s")
+                results[name] = {"error": "Превышено время ожидания ответа от сервиса"}
+        return results
+
+    @classmethod
+    def unified_checks(cls, vin: str) -> Dict[str, Callable[[], Dict[str, Any]]]:
+        """
+        Get the provider checks that make up a unified VIN check.
+
+        Carfax and auction data come from one combined 'carstat' check,
+        pass the results through CarstatService.split to get them separately.
+        """
+        return {
+            "autoteka": lambda: AutotekaService.check(vin, 'vin'),
+            "carstat": lambda: CarstatService.check(vin),
+            "vinhistory": lambda: VinhistoryService.check(vin),
+        }
+
+    @classmethod
+    def check_unified(cls, vin: str) -> Dict[str, Dict[str, Any]]:
+        """Run the unified check providers the VIN's report has no fresh results of concurrently."""
+        cached, checks = VehicleReportService.answer(vin, cls.unified_checks(vin))
+        results = CarstatService.split(cls.run_checks(checks)) if checks else {}
+        results.update(cached)
+        return results
+
+
+class BulkCheckService:
+    """Service for checking many VINs against several providers in one request."""
+
+    # Checks per provider, each one a regular single VIN check
+    CHECKS: Dict[str, Callable[[str], Dict[str, Any]]] = {
+        "autoteka": lambda vin: AutotekaService.check(vin, 'vin'),
+        "carfax": lambda vin: CarfaxService.check(vin),
+        "vinhistory": lambda vin: VinhistoryService.check(vin),
+        "auction": lambda vin: AuctionService.check(vin),
+    }
+
+    # Cache keys the checks above read their results from
+    CACHE_KEYS: Dict[str, Callable[[str], str]] = {
+        "autoteka": lambda vin: CacheService.generate_key("autoteka", "vin", vin),
+        "carfax": lambda vin: CacheService.generate_key("carstat", vin),
+        "vinhistory": lambda vin: CacheService.generate_key("vinhistory", vin),
+        "auction": lambda vin: CacheService.generate_key("carstat", vin),
+    }
+
+    @staticmethod
+    def normalize(vins: List[Any]) -> List[str]:
+        """Uppercase and strip VINs, dropping empty values and duplicates but keeping the order."""
+        seen = {}
+        for vin in vins:
+            vin = normalize_vin(vin)
+            if vin:
+                seen.setdefault(vin, None)
+        return list(seen)
+
+    @staticmethod
+    def validate(vins: List[str]) -> Tuple[List[str], Dict[str, str]]:
+        """
+        Split normalized VINs into valid ones and the errors of the others.
+
+        Returns:
+            Tuple of the valid VINs and the error message per invalid VIN.
+        """
+        valid, errors = [], {}
+        for vin in vins:
+            error = validate_vin(vin)
+            if error:
+                errors[vin] = error
+            else:
+                valid.append(vin)
+        return valid, errors
+
+    @staticmethod
+    def acquire(user) -> None:
+        """
+        Take one bulk request from the user's hourly limit.
+
+        Raises:
+            QuotaExceededError: If the user has used up the limit.
+        """
+        RateLimiter(f"bulk_check:{user.pk}", {3600: settings.BULK_CHECK_USER_HOURLY_LIMIT}).acquire(max_wait=0)
+
+    @classmethod
+    def peek(cls, provider: str, vin: str) -> Optional[Dict[str, Any]]:
+        """Get a fresh cached result without calling upstream, or None."""
+        entry = CacheService.read(cls.CACHE_KEYS[provider](vin))
+        if not CacheService.is_fresh(entry):
+            return None
+        result = entry["result"]
+        if provider in CarstatService.PARTS:
+            return result.get(provider, result)
+        return result
+
+    @staticmethod
+    def record_queries(vins: List[str], providers: List[str], user=None) -> int:
+        """Queue one Query per VIN and provider, saved in batches by QueryLogService."""
+        for vin in vins:
+            for provider in providers:
+                QueryLogService.log(vin, provider, user)
+        return len(vins) * len(providers)
 
-            # If loop finishes without a result
-            logger.warning(f"Autoteka check timed out for {preview_id} ({input_type}:{cache_key_val})")
-            return {"error": "Превышено время ожидания ответа от Автотеки"}
+    @classmethod
+    def iter_results(cls, vins: List[str], providers: List[str], timeout: Optional[float] = None,
+                     concurrency: Optional[int] = None,
+                     provider_concurrency: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Check every VIN against every provider, yielding results as soon as they are ready.
 
-        except Exception:
-            logger.exception(f"Unexpected error during Autoteka check for {input_type}:{cache_key_val}")
-            return {"error": "Непредвиденная ошибка при проверке Автотеки"}
+        Fresh cached results are yielded first without touching the thread pool. The
+        remaining checks run on the shared provider pool, at most `concurrency` at a time
+        so one bulk request can't starve the interactive checks.
+
+        Args:
+            vins: Normalized VINs.
+            providers: Provider names from CHECKS.
+            timeout: Overall deadline in seconds, defaults to settings.BULK_CHECK_TIMEOUT.
+            concurrency: Checks running at once, defaults to settings.BULK_CHECK_CONCURRENCY.
+            provider_concurrency: Checks of one provider running at once, unlimited by default.
+
+        Yields:
+            Dicts with 'vin', 'provider', 'result' and 'cached'.
+        """
+        if timeout is None:
+            timeout = settings.BULK_CHECK_TIMEOUT
+        if concurrency is None:
+            concurrency = settings.BULK_CHECK_CONCURRENCY
+        provider_concurrency = provider_concurrency or concurrency
+        deadline = time.monotonic() + timeout
+
+        misses: Dict[str, Deque[str]] = {provider: deque() for provider in providers}
+        for vin in vins:
+            # One read of the VIN's report answers all providers it has fresh results of
+            fresh = VehicleReportService.fresh_sections(vin)
+            for provider in providers:
+                result = fresh[provider] if provider in fresh else cls.peek(provider, vin)
+                if result is None:
+                    misses[provider].append(vin)
+                else:
+                    yield {"vin": vin, "provider": provider, "result": result, "cached": True}
+
+        executor = ProviderCheckService.get_executor()
+        pending: Dict[Future, Tuple[str, str]] = {}
+        running = dict.fromkeys(providers, 0)
+
+        while True:
+            # Take the providers in turns, so a slow one doesn't hold back the others
+            submitted = True
+            while submitted and len(pending) < concurrency:
+                submitted = False
+                for provider in providers:
+                    if not misses[provider] or running[provider] >= provider_concurrency \
+                            or len(pending) >= concurrency:
+                        continue
+                    vin = misses[provider].popleft()
+                    check = cls.CHECKS[provider]
+                    future = executor.submit(
+                        ProviderCheckService._run_isolated, f"bulk {provider}", lambda c=check, v=vin: c(v)
+                    )
+                    pending[future] = (vin, provider)
+                    running[provider] += 1
+                    submitted = True
+            if not pending:
+                return
+
+            remaining = deadline - time.monotonic()
+            done, _ = wait(pending, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                vin, provider = pending.pop(future)
+                running[provider] -= 1
+                yield {"vin": vin, "provider": provider, "result": future.result(), "cached": False}
+
+        # Deadline passed: running checks keep filling the cache, the rest is never started
+        logger.warning(f"Bulk check did not finish within {timeout}s, {len(pending)} checks still running")
+        queued = [(vin, provider) for provider, queue in misses.items() for vin in queue]
+        for vin, provider in list(pending.values()) + queued:
+            yield {
+                "vin": vin,
+                "provider": provider,
+                "result": {"error": "Превышено время ожидания ответа от сервиса"},
+                "cached": False,
+            }
+
+
+class CheckJobService:
+    """Service for running slow provider checks as background jobs."""
+
+    # Providers that can be checked in job mode
+    JOB_CHECKS: Dict[str, Callable[[str, str], Dict[str, Any]]] = {
+        "autoteka": lambda input_value, input_type: AutotekaService.check(input_value, input_type),
+    }
 
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        """Get the per-process job executor, creating it on first use."""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(
+                        max_workers=settings.CHECK_JOB_WORKERS,
+                        thread_name_prefix="check-job"
+                    )
+                    # Pick up the jobs a previous process left behind
+                    cls._executor.submit(cls._recover)
+        return cls._executor
 
-class CarfaxService:
-    """Service for interacting with Carfax/Autocheck APIs."""
-    
     @staticmethod
-    def check(vin: str) -> Dict[str, Any]:
+    def is_requested(data) -> bool:
+        """Check if the client asked for a background job instead of a blocking check."""
+        return str(data.get('async', '')).lower() in ('1', 'true', 'yes')
+
+    @classmethod
+    def submit(cls, input_value: str, input_type: str, provider: str = "autoteka"):
         """
-        Check vehicle information in Carfax/Autocheck databases via Carstat API.
-        
+        Create a check job and hand it to the background worker.
+
         Args:
-            vin: Vehicle identification number.
-            
+            input_value: VIN, license plate, or Avito item ID.
+            input_type: Type of input ('vin', 'regNumber', 'itemId').
+            provider: Provider to check, one of JOB_CHECKS.
+
         Returns:
-            Dict with results of the check or an error message.
+            The created CheckJob.
         """
-        vin_upper = vin.upper()
-        if not vin or len(vin_upper) != 17:
-            return {"error": "VIN должен состоять из 17 символов"}
+        from django.db import transaction
+        from .models import CheckJob
 
-        # Check if API key is set properly
-        if not settings.CARSTAT_API_KEY or len(settings.CARSTAT_API_KEY) < 10:
-            logger.error("Carstat API key not configured properly. Check CARSTAT_API_KEY in settings.")
-            return {"error": "Ошибка настройки API ключа Carstat. Пожалуйста, обратитесь к администратору."}
+        if provider not in cls.JOB_CHECKS:
+            raise ValueError(f"Provider {provider} does not support job mode")
 
-        cache_key = CacheService.generate_key("carfax_autocheck", vin_upper)
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.info(f"Retrieved Carfax/Autocheck data from cache for {vin_upper}")
-            return cached_result
+        job = CheckJob.objects.create(provider=provider, input_type=input_type, input_value=input_value)
+        logger.info(f"Created {provider} check job {job.job_id} for {input_type}:{input_value}")
 
-        LoggingService.log_check_request("Carfax/Autocheck", vin_upper)
-        url = f'https://carstat.dev/api/reports/check-records/{vin_upper}'
-        headers = {'accept': '*/*', 'x-api-key': settings.CARSTAT_API_KEY}
+        if settings.CHECK_JOBS_BACKEND == 'thread':
+            # The executor thread can't see the job until the creating transaction commits
+            transaction.on_commit(lambda: cls.get_executor().submit(cls._run_in_thread, job.pk))
+        return job
+
+    @classmethod
+    def _recover(cls) -> None:
+        """Requeue stale jobs and queue every pending job on this process's executor."""
+        from .models import CheckJob
 
         try:
-            logger.info(f"Checking Carfax/Autocheck (Carstat) for {vin_upper}")
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            data = response.json()
+            requeued = cls.requeue_stale()
+            if requeued:
+                logger.warning(f"Requeued {requeued} stale check jobs")
+            # run_job claims each job atomically, so jobs queued by other processes run only once
+            for job_pk in CheckJob.objects.filter(status='pending').order_by('created_at').values_list('pk', flat=True):
+                cls._executor.submit(cls._run_in_thread, job_pk)
+        except Exception:
+            logger.exception("Failed to recover pending check jobs")
+        finally:
+            connections.close_all()
 
-            vehicle_info = data.get('vehicle')
-            carfax_records = data.get('carfax')
-            autocheck_records = data.get('autocheck')
+    @classmethod
+    def _run_in_thread(cls, job_pk: int) -> None:
+        """Run a job on an executor thread and release its DB connection afterwards."""
+        try:
+            cls.run_job(job_pk)
+        except Exception:
+            logger.exception(f"Unexpected error running check job {job_pk}")
+        finally:
+            connections.close_all()
 
-            # Check if data is meaningful
-            has_records = (carfax_records is not None and carfax_records > 0) or \
-                        (autocheck_records is not None and autocheck_records > 0)
-            is_valid_vehicle = vehicle_info and vehicle_info.lower() not in ('null null', 'null null 0')
+    @classmethod
+    def run_job(cls, job_pk: int) -> bool:
+        """
+        Claim a pending job and execute its provider check.
 
-            if has_records and is_valid_vehicle:
-                result = {
-                    "success": True,
-                    "vehicle_info": vehicle_info,
-                    "carfax": carfax_records,
-                    "autocheck": autocheck_records,
-                    "message": f"✅ Найдены записи для {vehicle_info}"
-                }
-                logger.info(f"Carfax/Autocheck check successful for {vin_upper}")
-            else:
-                logger.info(f"No Carfax/Autocheck records found for {vin_upper}")
-                result = {"success": False, "message": f"❌ VIN {vin_upper} отсутствует в базах Carfax/Autocheck"}
+        Returns:
+            bool: True if this call ran the job, False if it was already claimed.
+        """
+        from django.utils import timezone
+        from .models import CheckJob
 
-            cache.set(cache_key, result, CACHE_TIME_LONG)
-            return result
+        claimed = CheckJob.objects.filter(pk=job_pk, status='pending').update(
+            status='running', started_at=timezone.now()
+        )
+        if not claimed:
+            return False
 
-        except requests.exceptions.HTTPError as e:
-            logger.exception(f"HTTP error during Carfax/Autocheck check for {vin_upper}. Status: {e.response.status_code}, Response: {e.response.text}")
-            # Handle specific Carstat errors if known, e.g., 404 for not found
-            if e.response.status_code == 404:
-                result = {"success": False, "message": f"❌ VIN {vin_upper} не найден в Carstat"}
-                cache.set(cache_key, result, CACHE_TIME_SHORT)
-                return result
-            return {"error": f"Ошибка сети при запросе к Carstat ({e.response.status_code})"}
-        except requests.exceptions.RequestException:
-            logger.exception(f"Request error during Carfax/Autocheck check for {vin_upper}")
-            return {"error": "Ошибка сети при запросе к Carstat. Проверьте подключение к интернету."}
+        job = CheckJob.objects.get(pk=job_pk)
+        try:
+            result = cls.JOB_CHECKS[job.provider](job.input_value, job.input_type)
         except Exception:
-            logger.exception(f"Unexpected error during Carfax/Autocheck check for {vin_upper}")
-            return {"error": "Внутренняя ошибка при проверке Carfax/Autocheck. Пожалуйста, попробуйте позже."}
+            logger.exception(f"Unexpected error in {job.provider} check job {job.job_id}")
+            result = {"error": "Непредвиденная ошибка при проверке"}
 
+        job.result = result
+        job.status = 'failed' if 'error' in result else 'done'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['result', 'status', 'finished_at', 'updated_at'])
+        logger.info(f"Check job {job.job_id} finished with status {job.status}")
+        return True
+
+    @classmethod
+    def requeue_stale(cls) -> int:
+        """Return jobs whose worker died mid-check to the queue."""
+        from django.utils import timezone
+        from .models import CheckJob
+
+        stale_before = timezone.now() - timedelta(seconds=settings.PROVIDER_CHECK_TIMEOUT * 2)
+        return CheckJob.objects.filter(status='running', started_at__lt=stale_before).update(
+            status='pending', started_at=None
+        )
+
+    @classmethod
+    def get_status(cls, job_id) -> Optional[Dict[str, Any]]:
+        """Get the public status of a job, or None if it does not exist."""
+        from .models import CheckJob
+
+        job = CheckJob.objects.filter(job_id=job_id).first()
+        if not job:
+            return None
+        return cls.serialize(job)
 
-class VinhistoryService:
-    """Service for interacting with Vinhistory API."""
-    
     @staticmethod
-    def check(vin: str) -> Dict[str, Any]:
+    def serialize(job) -> Dict[str, Any]:
+        """Represent a job in API responses."""
+        data = {"job_id": str(job.job_id), "status": job.status}
+        if job.is_finished:
+            data["result"] = job.result
+        return data
+
+
+class CacheWarmingService:
+    """
+    Refresh-ahead of the cached results of popular VINs.
+
+    VINs are ranked by how often they were requested recently. Their long-lived results
+    are fetched again shortly before they go stale, so repeat visitors keep getting fresh
+    cache hits instead of stale results or upstream waits. Upstream calls made for
+    warming are limited by a daily budget shared by all workers.
+    """
+
+    # Cache keys and upstream fetches of the warmed results per provider
+    TARGETS: Dict[str, Tuple[Callable[[str], str], Callable[[str], FetchResult]]] = {
+        "autoteka": (lambda vin: CacheService.generate_key("autoteka", "vin", vin),
+                     lambda vin: AutotekaService._fetch(vin, 'vin')),
+        "carstat": (lambda vin: CacheService.generate_key("carstat", vin),
+                    lambda vin: CarstatService._fetch(vin)),
+        "vinhistory": (lambda vin: CacheService.generate_key("vinhistory", vin),
+                       lambda vin: VinhistoryService._fetch(vin)),
+    }
+
+    STATS_DAYS = 7
+
+    @staticmethod
+    def get_budget() -> RateLimiter:
+        """Get the daily budget of upstream calls made for warming."""
+        return RateLimiter("warming", {86400: settings.CACHE_WARMING_DAILY_BUDGET})
+
+    @staticmethod
+    def popular(top_k: Optional[int] = None) -> List[str]:
         """
-        Check vehicle information in Vinhistory database.
-        
-        Args:
-            vin: Vehicle identification number.
-            
-        Returns:
-            Dict with results of the check or an error message.
+        Get the most frequently requested VINs of the last CACHE_WARMING_WINDOW_DAYS.
+
+        Plates and Avito listings logged instead of a VIN count towards the VIN they are linked to.
         """
-        if not vin:
-            logger.error("Empty VIN provided to check_vinhistory")
-            return {"error": "Необходимо указать VIN"}
+        from django.db.models import Count
+        from django.utils import timezone
+        from .models import Query
+
+        top_k = top_k or settings.CACHE_WARMING_TOP_K
+        since = timezone.now() - timedelta(days=settings.CACHE_WARMING_WINDOW_DAYS)
+        # Extra rows make up for identifiers that can't be resolved to a VIN
+        rows = (
+            Query.objects.filter(created_at__gte=since)
+            .values('vin')
+            .annotate(requests=Count('id'))
+            .order_by('-requests')[:top_k * 2]
+        )
+
+        counts: Dict[str, int] = {}
+        for row in rows:
+            identifier = normalize_vin(row['vin'])
+            if not validate_vin(identifier):
+                vin = identifier
+            elif identifier.startswith("AVITO-"):
+                vin = VinAliasService.resolve('itemId', identifier[len("AVITO-"):])
+            else:
+                vin = VinAliasService.resolve('regNumber', identifier)
+            if vin:
+                counts[vin] = counts.get(vin, 0) + row['requests']
 
-        vin_upper = vin.upper()
-        if len(vin_upper) != 17:
-            logger.warning(f"Invalid VIN length for Vinhistory check: {len(vin_upper)}")
-            return {"error": "VIN должен состоять из 17 символов"}
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return [vin for vin, requests in ranked if requests >= settings.CACHE_WARMING_MIN_REQUESTS][:top_k]
 
-        cache_key = CacheService.generate_key("vinhistory", vin_upper)
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.info(f"Retrieved Vinhistory data from cache for VIN: {vin_upper}")
-            return cached_result
+    @staticmethod
+    def is_due(entry: Optional[Dict[str, Any]], now: float) -> bool:
+        """Check if an entry is a long-lived result that goes stale within CACHE_WARMING_LEAD."""
+        if not entry or not entry.get("fetched_at"):
+            return False
+        # Short-lived "not found" results are cheap to miss and not worth the budget
+        if entry["fresh_until"] - entry["fetched_at"] < settings.CACHE_TIME_LONG:
+            return False
+        return entry["fresh_until"] - now <= settings.CACHE_WARMING_LEAD
 
-        LoggingService.log_check_request("Vinhistory", vin_upper)
+    @classmethod
+    def run(cls, top_k: Optional[int] = None) -> Dict[str, int]:
+        """
+        Refresh the due results of the popular VINs until the daily budget is used up.
 
-        if not settings.VINHISTORY_LOGIN or not settings.VINHISTORY_PASS:
-            logger.error("VINHistory credentials not configured properly.")
-            return {"error": "Ошибка конфигурации сервиса Vinhistory."}
+        Returns:
+            Dict with the numbers of 'vins' looked at, 'due' results, 'refreshed' and
+            'failed' ones, 'skipped' ones (no budget left or already being refreshed)
+            and the misses 'prevented' today.
+        """
+        stats = dict.fromkeys(("vins", "due", "refreshed", "failed", "skipped"), 0)
+        if settings.CACHE_WARMING_DAILY_BUDGET <= 0:
+            return {**stats, "prevented": cls.prevented()}
+
+        budget = cls.get_budget()
+        exhausted = False
+        for vin in cls.popular(top_k):
+            stats["vins"] += 1
+            now = time.time()
+            for provider, (cache_key_of, fetch_of) in cls.TARGETS.items():
+                cache_key = cache_key_of(vin)
+                store_key = (provider, "vin", vin)
+                entry = CacheService.read(cache_key) or ProviderResultService.load(cache_key, *store_key)
+                if not cls.is_due(entry, now):
+                    continue
+                stats["due"] += 1
+                if exhausted:
+                    stats["skipped"] += 1
+                    continue
+                try:
+                    budget.acquire(max_wait=0)
+                except QuotaExceededError:
+                    logger.warning("Cache warming budget for today is used up")
+                    exhausted = True
+                    stats["skipped"] += 1
+                    continue
+                outcome = cls._refresh(cache_key, lambda: fetch_of(vin), store_key, entry["fresh_until"])
+                stats[outcome] += 1
+
+        stats["prevented"] = cls.prevented()
+        return stats
 
-        params = {"login": settings.VINHISTORY_LOGIN, "password": settings.VINHISTORY_PASS, "vin": vin_upper}
+    @classmethod
+    def record_hit(cls, provider: str, vin: str, warmed_from: float) -> None:
+        """
+        Count a fresh hit on a warmed result as a prevented miss.
 
+        Only the first hit after the replaced entry would have gone stale counts, later
+        ones would have been hits anyway after that first request refreshed it.
+        """
+        if time.time() < warmed_from:
+            return
         try:
-            logger.info(f"Checking Vinhistory for {vin_upper}")
-            response = requests.get("https://vinhistory.ru/api/search", params=params, timeout=15)
-            response.raise_for_status()  # Raise HTTPError for bad responses
+            marker = f"warming:hit:{provider}:{vin}:{int(warmed_from)}"
+            if cache.add(marker, 1, settings.CACHE_TIME_LONG + settings.CACHE_WARMING_LEAD):
+                counter_key = cls._counter_key(time.time())
+                cache.add(counter_key, 0, (cls.STATS_DAYS + 1) * 86400)
+                cache.incr(counter_key)
+        except Exception:
+            logger.exception(f"Failed to count warmed hit of {provider} for {vin}")
 
-            data = response.json()
+    @classmethod
+    def prevented(cls, days: int = 1) -> int:
+        """Get the number of misses prevented by warming during the last days (today included)."""
+        now = time.time()
+        keys = [cls._counter_key(now - day * 86400) for day in range(days)]
+        return sum(cache.get_many(keys).values())
 
-            # Extract relevant data
-            vehicle_data = data.get('vehicle', {})
-            images_count = data.get('images', 0)
-            
-            vehicle_make = vehicle_data.get('make')
-            vehicle_model = vehicle_data.get('model')
-            vehicle_year = vehicle_data.get('year')
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Get the budget usage of today and the misses prevented per day."""
+        now = time.time()
+        days = [now - day * 86400 for day in range(cls.STATS_DAYS)]
+        counts = cache.get_many([cls._counter_key(day) for day in days])
+        return {
+            "budget": cls.get_budget().stats(),
+            "prevented": {
+                time.strftime("%Y-%m-%d", time.gmtime(day)): counts.get(cls._counter_key(day), 0) for day in days
+            },
+        }
 
-            # Check if actual data exists and there are images
-            if images_count > 0 and vehicle_make and vehicle_model and vehicle_year:
-                logger.info(f"Vinhistory found {images_count} images for {vin_upper}")
-                result = {
-                    "success": True,
-                    "message": "Данные найдены в Vinhistory.",
-                    "vehicle": f"{vehicle_make} {vehicle_model} {vehicle_year}",
-                    "images_count": images_count
-                }
-                ttl = CACHE_TIME_LONG
-            # Handle case where VIN might be found but has no images (or incomplete data)
-            elif vehicle_make and vehicle_model and vehicle_year:
-                logger.info(f"Vinhistory found vehicle data but no images for {vin_upper}")
-                # Return a slightly different message indicating data exists but no images
-                result = {
-                    "success": True,  # Still technically a success, but with nuance
-                    "message": "Данные об автомобиле найдены, но фото отсутствуют.",
-                    "vehicle": f"{vehicle_make} {vehicle_model} {vehicle_year}",
-                    "images_count": 0
-                }
-                ttl = CACHE_TIME_SHORT
-            else:
-                # VIN not found or incomplete data returned
-                logger.info(f"No complete Vinhistory data found for {vin_upper}")
-                result = {"success": False, "message": f"❌ В базе данных Vinhistory отсутствует VIN {vin_upper}"}
-                ttl = CACHE_TIME_SHORT  # Cache not found results shorter
+    @staticmethod
+    def _refresh(cache_key: str, fetch: Callable[[], FetchResult], store_key: Tuple[str, str, str],
+                 warmed_from: float) -> str:
+        """Fetch a result again under the revalidation lease, so user-triggered refreshes are not duplicated."""
+        lease_key = f"singleflight:revalidate:{cache_key}"
+        if not cache.add(lease_key, os.getpid(), settings.SINGLE_FLIGHT_LEASE_TTL):
+            return "skipped"
+        try:
+            result, ttl = fetch()
+            if not ttl:
+                # Keep the current result rather than replacing it with an error
+                logger.warning(f"Failed to warm {cache_key}: {result.get('error')}")
+                return "failed"
+            CacheService._save_result(cache_key, result, ttl, store_key, warmed_from)
+            logger.info(f"Warmed {cache_key}")
+            return "refreshed"
+        except Exception:
+            logger.exception(f"Unexpected error warming {cache_key}")
+            return "failed"
+        finally:
+            cache.delete(lease_key)
+
+    @staticmethod
+    def _counter_key(timestamp: float) -> str:
+        return f"warming:prevented:{time.strftime('%Y%m%d', time.gmtime(timestamp))}"
 
-            cache.set(cache_key, result, ttl)
-            logger.info(f"Stored Vinhistory result for VIN: {vin_upper} with TTL: {ttl}s")
-            return result
 
-        except requests.exceptions.HTTPError as e:
-            status_code = e.response.status_code
-            error_text = e.response.text
-            logger.exception(f"HTTP error during Vinhistory check for {vin_upper}: {status_code}, {error_text}")
-            # Check for specific errors if needed, e.g., bad credentials
-            if status_code == 401 or status_code == 403:
-                return {"error": "Ошибка авторизации в Vinhistory. Проверьте учетные данные."}
-            return {"error": f"Ошибка сервера Vinhistory ({status_code}). Попробуйте позже."}
-        except requests.exceptions.RequestException:
-            logger.exception(f"Request error during Vinhistory check for {vin_upper}")
-            return {"error": "Ошибка соединения с сервером Vinhistory."}
-        except json.JSONDecodeError:
-            logger.exception(f"Invalid JSON in Vinhistory response")
-            return {"error": "Некорректный ответ от сервера Vinhistory."}
+class BatchJobService:
+    """
+    Service for dealer batch jobs: thousands of VINs from a spreadsheet checked in the background.
+
+    VINs are checked in chunks of BATCH_JOB_CHUNK_SIZE through BulkCheckService, sharing
+    the provider services and the cache with the site. Each chunk's results go to a part
+    file, then the progress counter and the chunk's Query rows are saved in one
+    transaction. That is the checkpoint a job continues from after its worker dies, so
+    the Query rows of a VIN are recorded once. While a chunk runs, the worker refreshes
+    updated_at every HEARTBEAT_INTERVAL seconds, so a job is only requeued once its worker
+    has stopped and its VINs are not checked again by a second worker meanwhile. The
+    finished job gets a zip archive with one CSV.
+    """
+
+    RESULT_COLUMNS = ["VIN", "Сервис", "Статус", "Ошибка", "Результат"]
+
+    # Seconds between updated_at refreshes of a running chunk
+    HEARTBEAT_INTERVAL = 30
+
+    _executor: Optional[ThreadPoolExecutor] = None
+    _executor_lock = threading.Lock()
+
+    @classmethod
+    def submit(cls, user, file, providers: List[str]):
+        """
+        Create a batch job from an uploaded CSV or XLSX file and hand it to the worker.
+
+        Raises:
+            ValueError: With a message for the user if the file or the providers are not acceptable.
+        """
+        from django.db import transaction
+        from .models import BatchJob
+        from .spreadsheets import read_vins
+
+        providers = [provider for provider in BulkCheckService.CHECKS if provider in providers]
+        if not providers:
+            raise ValueError("Не выбраны сервисы для проверки")
+        if file.size > settings.BATCH_JOB_MAX_FILE_SIZE:
+            raise ValueError(f"Размер файла превышает {settings.BATCH_JOB_MAX_FILE_SIZE // (1024 * 1024)} МБ")
+
+        vins = read_vins(file, file.name, settings.BATCH_JOB_MAX_VINS, settings.BATCH_JOB_MAX_UNPACKED_SIZE)
+        job = BatchJob.objects.create(
+            user=user, file_name=file.name[:255], providers=providers, vins=vins, total_count=len(vins)
+        )
+        logger.info(f"Created batch job {job.job_id} for {len(vins)} VINs, providers: {', '.join(providers)}")
+
+        if settings.CHECK_JOBS_BACKEND == 'thread':
+            # The batch thread can't see the job until the creating transaction commits
+            transaction.on_commit(lambda: cls._start_thread(job.pk))
+        return job
+
+    @classmethod
+    def run_job(cls, job_pk: int) -> bool:
+        """
+        Claim a pending batch job and check its VINs from the last checkpoint on.
+
+        Returns:
+            bool: True if this call ran the job, False if it was already claimed.
+        """
+        from django.db.models import Value
+        from django.db.models.functions import Coalesce
+        from django.utils import timezone
+        from .models import BatchJob
+
+        now = timezone.now()
+        claimed = BatchJob.objects.filter(pk=job_pk, status='pending').update(
+            status='running', started_at=Coalesce('started_at', Value(now)), updated_at=now
+        )
+        if not claimed:
+            return False
+
+        job = BatchJob.objects.get(pk=job_pk)
+        if job.processed_count:
+            logger.info(f"Resuming batch job {job.job_id} at {job.processed_count}/{job.total_count}")
+
+        size = settings.BATCH_JOB_CHUNK_SIZE
+        try:
+            for start in range(job.processed_count, job.total_count, size):
+                if not cls._process_chunk(job, start, job.vins[start:start + size]):
+                    logger.warning(f"Batch job {job.job_id} was taken over by another worker")
+                    return True
+            cls._finish(job)
         except Exception:
-            logger.exception(f"Unexpected error during Vinhistory check for {vin_upper}")
-            return {"error": "Непредвиденная ошибка при проверке Vinhistory"}
+            logger.exception(f"Unexpected error in batch job {job.job_id}")
+            BatchJob.objects.filter(pk=job.pk, status='running').update(
+                status='failed', finished_at=timezone.now(), updated_at=timezone.now()
+            )
+        return True
 
+    @classmethod
+    def requeue_stale(cls) -> int:
+        """Return jobs whose worker died mid-chunk to the queue, keeping their progress."""
+        from .models import BatchJob
+
+        return BatchJob.objects.filter(status='running', updated_at__lt=cls._stale_before()).update(
+            status='pending'
+        )
+
+    @classmethod
+    def get_status(cls, job_id, user) -> Optional[Dict[str, Any]]:
+        """Get the public status of a user's job, or None if it does not exist."""
+        from .models import BatchJob
+
+        job = BatchJob.objects.filter(job_id=job_id, user=user).first()
+        if not job:
+            return None
+        if settings.CHECK_JOBS_BACKEND == 'thread' and job.status == 'running' and job.updated_at < cls._stale_before():
+            # Without a worker process a job interrupted by a restart resumes on the next status poll.
+            # Only the poll that actually requeues it starts a run, so polls never pile up queued runs.
+            if BatchJob.objects.filter(
+                pk=job.pk, status='running', updated_at__lt=cls._stale_before()
+            ).update(status='pending'):
+                job.status = 'pending'
+                cls._start_thread(job.pk)
+        return cls.serialize(job)
 
-class AuctionService:
-    """Service for checking auction data."""
-    
     @staticmethod
-    def check(vin: str) -> Dict[str, Any]:
+    def serialize(job) -> Dict[str, Any]:
+        """Represent a job in API responses."""
+        return {
+            "job_id": str(job.job_id),
+            "status": job.status,
+            "file_name": job.file_name,
+            "providers": job.providers,
+            "total": job.total_count,
+            "processed": job.processed_count,
+            "errors": job.error_count,
+            "progress": job.progress,
+            "ready": bool(job.result_file),
+        }
+
+    @classmethod
+    def _process_chunk(cls, job, start: int, vins: List[str]) -> bool:
         """
-        Check vehicle auction history using Carstat API.
-        
-        Args:
-            vin: Vehicle identification number.
-            
+        Check a chunk of VINs, write its part file and save the checkpoint.
+
         Returns:
-            Dict with results of the check or an error message.
+            bool: False if the checkpoint moved meanwhile, i.e. another worker owns the job.
         """
-        vin_upper = vin.upper()
-        if not vin or len(vin_upper) != 17:
-            return {"error": "VIN должен состоять из 17 символов"}
+        from django.db import transaction
+        from django.db.models import F
+        from django.utils import timezone
+        from .models import BatchJob, Query
+
+        errors = {vin: error for vin in vins if (error := validate_vin(vin))}
+        valid = [vin for vin in vins if vin not in errors]
+        results = {}
+        beat_at = time.monotonic()
+        for line in BulkCheckService.iter_results(
+            valid, job.providers,
+            timeout=settings.BATCH_JOB_CHUNK_TIMEOUT,
+            concurrency=settings.BATCH_JOB_CONCURRENCY,
+            provider_concurrency=settings.BATCH_JOB_PROVIDER_CONCURRENCY,
+        ):
+            results[(line["vin"], line["provider"])] = line["result"]
+            if time.monotonic() - beat_at >= cls.HEARTBEAT_INTERVAL:
+                if not cls._heartbeat(job, start):
+                    return False
+                beat_at = time.monotonic()
+        # Writing the part file of a large chunk takes a while too
+        if time.monotonic() - beat_at >= cls.HEARTBEAT_INTERVAL and not cls._heartbeat(job, start):
+            return False
+
+        rows = []
+        for vin in vins:
+            if vin in errors:
+                rows.append([vin, "", "error", errors[vin], ""])
+                continue
+            for provider in job.providers:
+                result = results.get((vin, provider)) or {"error": "Нет ответа от сервиса"}
+                error = result.get("error") if isinstance(result, dict) else None
+                rows.append([vin, provider, "error" if error else "ok", error or "",
+                             json.dumps(result, ensure_ascii=False)])
+        cls._save_part(job, start, rows)
+
+        with transaction.atomic():
+            updated = BatchJob.objects.filter(pk=job.pk, status='running', processed_count=start).update(
+                processed_count=start + len(vins),
+                error_count=F('error_count') + sum(row[2] == "error" for row in rows),
+                updated_at=timezone.now(),
+            )
+            if not updated:
+                return False
+            Query.objects.bulk_create(
+                [Query(user_id=job.user_id, vin=vin, query_type=provider) for vin in valid for provider in job.providers],
+                batch_size=settings.QUERY_LOG_BATCH_SIZE,
+            )
+        logger.info(f"Batch job {job.job_id}: {start + len(vins)}/{job.total_count} VINs processed")
+        return True
 
-        # Check if API key is set properly
-        if not settings.CARSTAT_API_KEY or len(settings.CARSTAT_API_KEY) < 10:
-            logger.error("Carstat API key not configured properly. Check CARSTAT_API_KEY in settings.")
-            return {"error": "Ошибка настройки API ключа Carstat. Пожалуйста, обратитесь к администратору."}
+    @staticmethod
+    def _heartbeat(job, start: int) -> bool:
+        """Refresh updated_at of a running chunk, returning False if another worker owns the job."""
+        from django.utils import timezone
+        from .models import BatchJob
 
-        cache_key = CacheService.generate_key("auction", vin_upper)
-        cached_result = cache.get(cache_key)
-        if cached_result:
-            logger.info(f"Retrieved auction data (Carstat) from cache for {vin_upper}")
-            return cached_result
+        return bool(BatchJob.objects.filter(pk=job.pk, status='running', processed_count=start).update(
+            updated_at=timezone.now()
+        ))
 
-        LoggingService.log_check_request("Auction (Carstat)", vin_upper)
-        url = f'https://carstat.dev/api/local-exists/{vin_upper}'
-        headers = {'accept': '*/*', 'x-api-key': settings.CARSTAT_API_KEY}
+    @classmethod
+    def _save_part(cls, job, start: int, rows: List[List[str]]) -> None:
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        # A part left by a worker that died before its checkpoint is written again
+        name = f"{cls._parts_dir(job)}/part-{start:08d}.csv"
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(buffer.getvalue().encode()))
+
+    @classmethod
+    def _finish(cls, job) -> None:
+        """Pack the part files into the results archive and mark the job done."""
+        from django.core.files import File
+        from django.core.files.storage import default_storage
+        from django.utils import timezone
+        from .models import BatchJob
+
+        directory = cls._parts_dir(job)
+        parts = sorted(default_storage.listdir(directory)[1])
+        header = io.StringIO()
+        csv.writer(header).writerow(cls.RESULT_COLUMNS)
+
+        with tempfile.TemporaryFile() as archive_file:
+            with zipfile.ZipFile(archive_file, 'w', zipfile.ZIP_DEFLATED) as archive:
+                with archive.open("results.csv", 'w', force_zip64=True) as member:
+                    # BOM, so Excel opens the Cyrillic text as UTF-8
+                    member.write(header.getvalue().encode('utf-8-sig'))
+                    for part in parts:
+                        with default_storage.open(f"{directory}/{part}") as part_file:
+                            shutil.copyfileobj(part_file, member)
+            archive_file.seek(0)
+            job.result_file.save(f"{job.job_id}.zip", File(archive_file), save=False)
+
+        BatchJob.objects.filter(pk=job.pk).update(
+            status='done', result_file=job.result_file.name, finished_at=timezone.now(), updated_at=timezone.now()
+        )
+        for part in parts:
+            default_storage.delete(f"{directory}/{part}")
+        logger.info(f"Batch job {job.job_id} finished, results saved to {job.result_file.name}")
+
+    @classmethod
+    def _start_thread(cls, job_pk: int) -> None:
+        """Run a job on the per-process batch thread, one job at a time so batches never crowd out site checks."""
+        if cls._executor is None:
+            with cls._executor_lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-job")
+        cls._executor.submit(cls._run_in_thread, job_pk)
 
+    @classmethod
+    def _run_in_thread(cls, job_pk: int) -> None:
         try:
-            logger.info(f"Checking auction history (Carstat) for {vin_upper}")
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            data = response.json()
+            cls.run_job(job_pk)
+        except Exception:
+            logger.exception(f"Unexpected error running batch job {job_pk}")
+        finally:
+            connections.close_all()
 
-            if data.get('exists'):
-                # The 'domains' list seems to indicate individual auction records/sources
-                auction_count = len(data.get('domains', []))
-                result = {
-                    "success": True,
-                    "auction_count": auction_count,
-                    "message": f"✅ Найдены записи об аукционах ({auction_count} шт.) для VIN {vin_upper}"
-                }
-                logger.info(f"Auction check (Carstat) successful for {vin_upper}")
-            else:
-                logger.info(f"No auction records (Carstat) found for {vin_upper}")
-                result = {"success": False, "message": f"❌ VIN {vin_upper} отсутствует в базе аукционов Carstat"}
+    @staticmethod
+    def _parts_dir(job) -> str:
+        return f"batch_jobs/{job.job_id}"
 
-            cache.set(cache_key, result, CACHE_TIME_LONG)
-            return result
+    @staticmethod
+    def _stale_before() -> datetime:
+        from django.utils import timezone
 
-        except requests.exceptions.HTTPError as e:
-            logger.exception(f"HTTP error during auction check (Carstat) for {vin_upper}. Status: {e.response.status_code}, Response: {e.response.text}")
-            # Handle specific Carstat errors if known, e.g., 404
-            if e.response.status_code == 404:
-                result = {"success": False, "message": f"❌ VIN {vin_upper} не найден в базе аукционов Carstat"}
-                cache.set(cache_key, result, CACHE_TIME_SHORT)
-                return result
-            return {"error": f"Ошибка сети при запросе к Carstat (аукционы) ({e.response.status_code})"}
-        except requests.exceptions.RequestException:
-            logger.exception(f"Request error during auction check (Carstat) for {vin_upper}")
-            return {"error": "Ошибка сети при запросе к Carstat (аукционы). Проверьте подключение к интернету."}
-        except Exception:
-            logger.exception(f"Unexpected error during auction check (Carstat) for {vin_upper}")
-            return {"error": "Внутренняя ошибка при проверке истории аукционов. Пожалуйста, попробуйте позже."}
+        return timezone.now() - timedelta(seconds=settings.BATCH_JOB_CHUNK_TIMEOUT * 2)
 
 
 class ExamplesService:
@@ -714,37 +3033,7 @@ class ExamplesService:
     def get_recent_queries(limit: int = 10) -> List[str]:
         """Get recent queries from the website only."""
         try:
-            from datetime import datetime
-            from .models import Query
-            
-            # Fetch recent website queries
-            recent_queries = Query.objects.order_by('-created_at')[:limit]
-            
-            # Format the queries similar to how they were previously displayed
-            formatted_queries = []
-            for query in recent_queries:
-                timestamp = query.created_at.strftime('%d-%m-%y %H:%M:%S')
-                
-                # Map query types to more descriptive names
-                query_type_display = {
-                    'autoteka': 'Автотека (VIN)',
-                    'autoteka_reg': 'Автотека (Госномер)',
-                    'autoteka_avito': 'Автотека (Avito)',
-                    'carfax': 'Carfax / Autocheck',
-                    'vinhistory': 'Vinhistory',
-                    'auction': 'Аукционы',
-                    'basic': 'Базовый отчет',
-                    'full': 'Полный отчет',
-                    'unified': 'Комплексная проверка'
-                }.get(query.query_type, query.query_type)
-                
-                formatted_query = (
-                    f"{timestamp} Пользователь сайта запросил проверку " 
-                    f"{query_type_display} по VIN {query.vin}"
-                )
-                formatted_queries.append(formatted_query)
-            
-            return formatted_queries
+            return RecentQueriesService.get(limit)[1]
         except Exception:
             logger.exception("Failed to fetch recent website queries")
             return []
@@ -0,0 +1,167 @@
+"""
+Reading VIN lists from dealer spreadsheets (CSV or XLSX) for batch jobs.
+
+XLSX files are read with the standard library only: a workbook is a zip archive of
+XML parts, and only the first worksheet and the shared strings table are needed.
+Rows are streamed, so large sheets are never held in memory as a DOM, and parts are
+refused if they unpack to more than the given size.
+"""
+import csv
+import io
+import posixpath
+import re
+import zipfile
+from typing import IO, Dict, Iterator, List, Optional
+from xml.etree import ElementTree
+
+from .vin import normalize_vin
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_COLUMN_RE = re.compile(r'^([A-Z]+)')
+
+# Encodings tried for CSV files, Excel in Russian locales saves cp1251
+_CSV_ENCODINGS = ("utf-8-sig", "cp1251")
+
+
+def read_rows(file: IO[bytes], name: str, max_part_size: Optional[int] = None) -> Iterator[List[str]]:
+    """
+    Read the rows of an uploaded CSV or XLSX file.
+
+    XLSX parts that unpack to more than max_part_size bytes are refused.
+
+    Raises:
+        ValueError: If the format is not supported or the file can't be parsed.
+    """
+    extension = posixpath.splitext(name.lower())[1]
+    if extension == ".xlsx":
+        return _read_xlsx(file, max_part_size)
+    if extension in (".csv", ".txt"):
+        return _read_csv(file)
+    raise ValueError("Поддерживаются только файлы CSV и XLSX")
+
+
+def read_vins(file: IO[bytes], name: str, max_count: int, max_part_size: Optional[int] = None) -> List[str]:
+    """
+    Read VINs from the 'VIN' column of a spreadsheet, or from its first column if there is no such header.
+
+    Values are normalized and deduplicated keeping the file order, but not validated.
+
+    Raises:
+        ValueError: If the file can't be read, has no values or more than max_count of them.
+    """
+    vins: Dict[str, None] = {}
+    column = 0
+    count = 0
+    try:
+        for index, row in enumerate(read_rows(file, name, max_part_size)):
+            if index == 0:
+                headers = [normalize_vin(cell) for cell in row]
+                if "VIN" in headers:
+                    column = headers.index("VIN")
+                    continue
+            vin = normalize_vin(row[column]) if column < len(row) else ""
+            if not vin:
+                continue
+            count += 1
+            if count > max_count:
+                raise ValueError(f"Файл содержит больше {max_count} VIN")
+            vins.setdefault(vin, None)
+    except (zipfile.BadZipFile, ElementTree.ParseError, KeyError, IndexError, csv.Error):
+        raise ValueError("Не удалось прочитать файл")
+    if not vins:
+        raise ValueError("В файле не найдено ни одного VIN")
+    return list(vins)
+
+
+def _read_csv(file: IO[bytes]) -> Iterator[List[str]]:
+    data = file.read()
+    for encoding in _CSV_ENCODINGS:
+        try:
+            text = data.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("Не удалось определить кодировку файла")
+
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    return csv.reader(io.StringIO(text), dialect)
+
+
+def _read_xlsx(file: IO[bytes], max_part_size: Optional[int]) -> Iterator[List[str]]:
+    archive = zipfile.ZipFile(file)
+    shared_strings = _read_shared_strings(archive, max_part_size)
+    with _open_part(archive, _first_sheet_path(archive, max_part_size), max_part_size) as sheet:
+        for _, element in ElementTree.iterparse(sheet):
+            if element.tag != f"{_MAIN_NS}row":
+                continue
+            cells = {}
+            for cell in element.iter(f"{_MAIN_NS}c"):
+                match = _COLUMN_RE.match(cell.get("r", ""))
+                column = _column_index(match.group(1)) if match else len(cells)
+                cells[column] = _cell_value(cell, shared_strings)
+            element.clear()
+            if cells:
+                yield [cells.get(column, "") for column in range(max(cells) + 1)]
+
+
+def _open_part(archive: zipfile.ZipFile, name: str, max_size: Optional[int]) -> IO[bytes]:
+    """
+    Open a part of the archive unless it unpacks to more than max_size bytes.
+
+    The reader never returns more than the size declared in the archive, so a part
+    can't unpack past the checked size either.
+    """
+    info = archive.getinfo(name)
+    if max_size is not None and info.file_size > max_size:
+        raise ValueError("Файл слишком большой после распаковки")
+    return archive.open(info)
+
+
+def _read_part(archive: zipfile.ZipFile, name: str, max_size: Optional[int]) -> bytes:
+    with _open_part(archive, name, max_size) as part:
+        return part.read()
+
+
+def _first_sheet_path(archive: zipfile.ZipFile, max_part_size: Optional[int]) -> str:
+    """Resolve the part of the first worksheet through the workbook relationships."""
+    workbook = ElementTree.fromstring(_read_part(archive, "xl/workbook.xml", max_part_size))
+    sheet = workbook.find(f"{_MAIN_NS}sheets/{_MAIN_NS}sheet")
+    relations = ElementTree.fromstring(_read_part(archive, "xl/_rels/workbook.xml.rels", max_part_size))
+    for relation in relations.iter(f"{_PACKAGE_REL_NS}Relationship"):
+        if sheet is not None and relation.get("Id") == sheet.get(f"{_REL_NS}id"):
+            target = relation.get("Target", "")
+            return target.lstrip("/") if target.startswith("/") else posixpath.normpath(f"xl/{target}")
+    return "xl/worksheets/sheet1.xml"
+
+
+def _read_shared_strings(archive: zipfile.ZipFile, max_part_size: Optional[int]) -> List[str]:
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    root = ElementTree.fromstring(_read_part(archive, "xl/sharedStrings.xml", max_part_size))
+    # Rich text strings are split into runs, each with its own <t>
+    return ["".join(text.text or "" for text in item.iter(f"{_MAIN_NS}t"))
+            for item in root.iter(f"{_MAIN_NS}si")]
+
+
+def _cell_value(cell: ElementTree.Element, shared_strings: List[str]) -> str:
+    cell_type = cell.get("t")
+    if cell_type == "inlineStr":
+        return "".join(text.text or "" for text in cell.iter(f"{_MAIN_NS}t"))
+    value = cell.findtext(f"{_MAIN_NS}v") or ""
+    if cell_type == "s" and value:
+        return shared_strings[int(value)]
+    return value
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord("A") + 1
+    return index - 1
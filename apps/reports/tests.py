@@ -0,0 +1,1760 @@
+import csv
+import io
+import json
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import MagicMock, patch
+
+import requests
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+from django.urls import reverse
+
+from vagvin.bloom_filter import BloomFilter
+from vagvin.cache import TieredCache
+from vagvin.circuit_breaker import CircuitBreaker, CircuitOpenError
+from vagvin.http_client import HttpClient, HttpClientRegistry
+from vagvin.poll_scheduler import PollScheduler, parse_retry_after
+from vagvin.rate_limiter import QuotaExceededError, RateLimiter
+from .models import Query, CheckJob, ProviderResult, NegativeFilter, BatchJob, VinAlias
+from .plates import normalize_plate, validate_plate
+from .spreadsheets import read_vins
+from .vin import check_digit, decode_vin, validate_vin
+from .services import (
+    ProviderCheckService, CheckJobService, CacheService, VinhistoryService, ProviderResultService,
+    CarstatService, CarfaxService, AuctionService, AvitoAuthService, NegativeFilterService, BulkCheckService,
+    AutotekaService, QueryLogService, RecentQueriesService, BatchJobService,
+    VinAliasService, VehicleReportService, CacheWarmingService
+)
+
+User = get_user_model()
+
+
+class ProviderCheckServiceTest(TestCase):
+    """Tests for the concurrent provider fan-out."""
+
+    def test_checks_run_concurrently(self) -> None:
+        """Test that the wall-clock time is bounded by the slowest check, not the sum."""
+        def slow_check() -> dict:
+            time.sleep(0.3)
+            return {"success": True}
+
+        started = time.monotonic()
+        results = ProviderCheckService.run_checks({
+            "first": slow_check,
+            "second": slow_check,
+            "third": slow_check,
+        })
+        elapsed = time.monotonic() - started
+
+        self.assertEqual(set(results), {"first", "second", "third"})
+        self.assertTrue(all(result["success"] for result in results.values()))
+        self.assertLess(elapsed, 0.8)
+
+    def test_failure_is_isolated(self) -> None:
+        """Test that one failing check does not lose the other results."""
+        def failing_check() -> dict:
+            raise RuntimeError("boom")
+
+        results = ProviderCheckService.run_checks({
+            "ok": lambda: {"success": True},
+            "broken": failing_check,
+        })
+
+        self.assertEqual(results["ok"], {"success": True})
+        self.assertIn("error", results["broken"])
+
+    def test_deadline(self) -> None:
+        """Test that checks exceeding the deadline get an error result."""
+        results = ProviderCheckService.run_checks({
+            "fast": lambda: {"success": True},
+            "slow": lambda: time.sleep(0.5) or {"success": True},
+        }, timeout=0.1)
+
+        self.assertEqual(results["fast"], {"success": True})
+        self.assertIn("error", results["slow"])
+
+
+@override_settings(QUERY_LOG_BUFFERED=False)
+class UnifiedCheckViewTest(TestCase):
+    """Tests for the dashboard unified check endpoint."""
+
+    def setUp(self) -> None:
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="testuser",
+            email="test@example.com",
+            password="testpass123"
+        )
+        self.client.login(username="testuser", password="testpass123")
+
+    @patch('apps.reports.services.VinhistoryService.check', side_effect=RuntimeError("boom"))
+    @patch('apps.reports.services.CarstatService.check', return_value={
+        "carfax": {"success": True, "carfax": 3},
+        "auction": {"success": False, "message": "none"},
+    })
+    @patch('apps.reports.services.AutotekaService.check', return_value={"success": True, "data": {}})
+    def test_unified_check(self, *mocks) -> None:
+        """Test that all providers are reported and the query is saved."""
+        response = self.client.post(
+            reverse('accounts:unified_check'),
+            data=json.dumps({"vin": "WVWZZZ1JZXW000001"}),
+            content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["autoteka"]["success"])
+        self.assertEqual(data["carfax"]["carfax"], 3)
+        self.assertIn("error", data["vinhistory"])
+        self.assertFalse(data["auction"]["success"])
+        self.assertTrue(Query.objects.filter(user=self.user, query_type='unified').exists())
+
+    @patch('apps.reports.services.VinhistoryService.check', return_value={"success": True})
+    @patch('apps.reports.services.CarstatService.check', return_value={
+        "carfax": {"success": True, "carfax": 3},
+        "auction": {"success": False, "message": "none"},
+    })
+    @patch('apps.reports.services.AutotekaService.check', return_value={"success": True, "data": {}})
+    @override_settings(CHECK_JOBS_BACKEND='worker')
+    def test_unified_check_stream(self, *mocks) -> None:
+        """Test that the stream sends a cached result first, one event per provider and a final event."""
+        cache.clear()
+        vin = "WVWZZZ1JZXW000001"
+        CacheService.write(CacheService.generate_key("vinhistory", vin), {"success": True, "cached": 1}, 60, 60)
+
+        response = self.client.get(reverse('accounts:unified_check_stream'), {"vin": vin})
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = [block.split("\n") for block in b"".join(response.streaming_content).decode().split("\n\n") if block]
+        names = [lines[0] for lines in events]
+        payloads = [json.loads(lines[1][len("data: "):]) for lines in events]
+        self.assertEqual(names, ["event: vehicle"] + ["event: result"] * 3 + ["event: job", "event: done"])
+        self.assertEqual(payloads.pop(0)["make"], "Volkswagen")
+        self.assertEqual(payloads[0], {"provider": "vinhistory", "result": {"success": True, "cached": 1}, "cached": True})
+        self.assertEqual({payload["provider"] for payload in payloads[:3]}, {"carfax", "vinhistory", "auction"})
+        # Autoteka is left to a background job instead of being polled inline
+        job = CheckJob.objects.get(job_id=payloads[3]["job_id"])
+        self.assertEqual((job.input_value, job.status), (vin, 'pending'))
+        self.assertEqual(payloads[3]["status_url"], reverse('reports:api_check_job_status', args=[job.job_id]))
+        mocks[0].assert_not_called()
+        self.assertTrue(Query.objects.filter(user=self.user, query_type='unified').exists())
+
+        response = self.client.get(reverse('accounts:unified_check_stream'), {"vin": "short"})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('apps.reports.services.VinhistoryService.check', return_value={"success": True})
+    @patch('apps.reports.services.CarstatService.check', return_value={"carfax": {}, "auction": {}})
+    @override_settings(CHECK_JOBS_BACKEND='worker', CHECK_JOB_STREAM_POLL_INTERVAL=0.01)
+    async def test_unified_check_stream_pushes_autoteka_job(self, *mocks) -> None:
+        """Test that under ASGI the stream waits for the Autoteka job and pushes its result."""
+        await sync_to_async(cache.clear)()
+        await self.async_client.aforce_login(self.user)
+        vin = "WVWZZZ1JZXW000001"
+
+        response = await self.async_client.get(reverse('accounts:unified_check_stream'), {"vin": vin})
+        events = aiter(response.streaming_content)
+        inline = [(await anext(events)).decode() for _ in range(4)]
+        self.assertTrue(all(event.startswith("event: ") for event in inline))
+
+        job = await CheckJob.objects.aget(input_value=vin)
+        with patch('apps.reports.services.AutotekaService.check', return_value={"success": True, "data": {}}):
+            await sync_to_async(CheckJobService.run_job)(job.pk)
+
+        event = (await anext(events)).decode()
+        while event.startswith(": keep-alive"):
+            event = (await anext(events)).decode()
+        await events.aclose()
+
+        self.assertEqual(event.split("\n")[0], "event: result")
+        self.assertEqual(json.loads(event.split("data: ", 1)[1]),
+                         {"provider": "autoteka", "result": {"success": True, "data": {}}, "cached": False})
+
+
+@override_settings(CHECK_JOBS_BACKEND='worker')
+class CheckJobTest(TestCase):
+    """Tests for background Autoteka check jobs."""
+
+    def setUp(self) -> None:
+        self.client = Client()
+
+    def test_autoteka_job_mode(self) -> None:
+        """Test that job mode returns a job id right away and the status endpoint returns the result."""
+        response = self.client.get(reverse('reports:api_check_autoteka'), {'vin': 'WVWZZZ1JZXW000001', 'async': '1'})
+
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+        self.assertEqual(response.json()['status'], 'pending')
+
+        status_url = reverse('reports:api_check_job_status', args=[job_id])
+        self.assertNotIn('result', self.client.get(status_url).json())
+
+        with patch('apps.reports.services.AutotekaService.check', return_value={"success": True}) as mock_check:
+            job = CheckJob.objects.get(job_id=job_id)
+            self.assertTrue(CheckJobService.run_job(job.pk))
+            self.assertFalse(CheckJobService.run_job(job.pk))
+            mock_check.assert_called_once_with('WVWZZZ1JZXW000001', 'vin')
+
+        data = self.client.get(status_url).json()
+        self.assertEqual(data['status'], 'done')
+        self.assertEqual(data['result'], {"success": True})
+
+    @patch('apps.reports.services.AutotekaService.check', return_value={"error": "Ошибка"})
+    def test_worker_command(self, mock_check) -> None:
+        """Test that the worker command drains the queue and marks failed checks."""
+        job = CheckJobService.submit('A123BC77', 'regNumber')
+
+        call_command('run_check_jobs', '--once', '--concurrency', '1', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.result, {"error": "Ошибка"})
+
+    @override_settings(CHECK_JOBS_BACKEND='thread')
+    def test_thread_backend_runs_job_after_commit(self) -> None:
+        """Test that the thread backend queues a job only once its transaction commits."""
+        executor = MagicMock()
+        with patch.object(CheckJobService, 'get_executor', return_value=executor):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                job = CheckJobService.submit('WVWZZZ1JZXW000001', 'vin')
+                executor.submit.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+        executor.submit.assert_called_once_with(CheckJobService._run_in_thread, job.pk)
+
+    def test_unknown_job(self) -> None:
+        """Test that an unknown job id returns 404."""
+        response = self.client.get(reverse('reports:api_check_job_status', args=['00000000-0000-0000-0000-000000000000']))
+
+        self.assertEqual(response.status_code, 404)
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    """Minimal HTTP/1.1 handler for connection pool tests."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class HttpClientTest(TestCase):
+    """Tests for the pooled HTTP client layer."""
+
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connection_reuse(self) -> None:
+        """Test that consecutive requests reuse one keep-alive connection."""
+        client = HttpClient('test', {'timeout': 5})
+
+        for _ in range(3):
+            self.assertEqual(client.get(self.url).json(), {"ok": True})
+
+        pool_stats = list(client.stats()['pools'].values())[0]
+        self.assertEqual(client.stats()['requests'], 3)
+        self.assertEqual(pool_stats['connections_opened'], 1)
+        self.assertEqual(pool_stats['requests'], 3)
+        client.close()
+
+    def test_provider_status_requires_staff(self) -> None:
+        """Test that pool usage is visible to staff only."""
+        HttpClientRegistry.get('carstat')
+        url = reverse('reports:api_provider_status')
+        client = Client()
+
+        self.assertEqual(client.get(url).status_code, 302)
+
+        User.objects.create_user(username="staff", email="staff@example.com", password="testpass123", is_staff=True)
+        client.login(username="staff", password="testpass123")
+        response = client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('carstat', response.json()['http'])
+
+
+class SingleFlightTest(TestCase):
+    """Tests for coalescing of concurrent identical provider checks."""
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_concurrent_callers_share_one_fetch(self) -> None:
+        """Test that threads asking for the same key trigger a single upstream call."""
+        calls = []
+
+        def fetch() -> tuple:
+            calls.append(1)
+            time.sleep(0.3)
+            return {"success": True}, 60
+
+        results = ProviderCheckService.run_checks({
+            str(i): (lambda: CacheService.get_or_fetch("test:same-vin", fetch)) for i in range(5)
+        })
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result == {"success": True} for result in results.values()))
+        self.assertEqual(CacheService.read("test:same-vin")["result"], {"success": True})
+
+    def test_uncached_error_is_shared(self) -> None:
+        """Test that followers get the leader's error although errors are not cached."""
+        calls = []
+
+        def fetch() -> tuple:
+            calls.append(1)
+            time.sleep(0.2)
+            return {"error": "upstream down"}, None
+
+        results = ProviderCheckService.run_checks({
+            str(i): (lambda: CacheService.get_or_fetch("test:error", fetch)) for i in range(3)
+        })
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result == {"error": "upstream down"} for result in results.values()))
+        self.assertIsNone(cache.get("test:error"))
+
+    def test_waits_for_lease_of_other_worker(self) -> None:
+        """Test that a lease held by another worker is waited on instead of calling upstream."""
+        cache.add("singleflight:lease:test:leased", "other-worker", 10)
+
+        def finish_other_worker() -> None:
+            time.sleep(0.3)
+            CacheService.write("test:leased", {"success": True, "from": "other"}, 60, 60)
+            cache.delete("singleflight:lease:test:leased")
+
+        threading.Thread(target=finish_other_worker).start()
+        result = CacheService.get_or_fetch("test:leased", lambda: self.fail("upstream must not be called"))
+
+        self.assertEqual(result, {"success": True, "from": "other"})
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    @override_settings(VINHISTORY_LOGIN='login', VINHISTORY_PASS='pass')
+    def test_provider_service_uses_single_flight(self, mock_get_client) -> None:
+        """Test that a provider check result is cached under its generate_key key."""
+        response = mock_get_client.return_value.get.return_value
+        response.json.return_value = {"vehicle": {"make": "VW", "model": "Golf", "year": 2015}, "images": 3}
+
+        first = VinhistoryService.check("wvwzzz1jzxw000001")
+        second = VinhistoryService.check("WVWZZZ1JZXW000001")
+
+        self.assertTrue(first["success"])
+        self.assertEqual(first, second)
+        mock_get_client.return_value.get.assert_called_once()
+        self.assertEqual(CacheService.read(CacheService.generate_key("vinhistory", "WVWZZZ1JZXW000001"))["result"], first)
+
+
+class TieredCacheTest(TestCase):
+    """Tests for the two-tier cache backend."""
+
+    def setUp(self) -> None:
+        caches['shared'].clear()
+
+    def make_cache(self, name: str, **options) -> TieredCache:
+        options = {'L2': 'shared', 'SYNC_INTERVAL': 0, **options}
+        return TieredCache(f'test-{name}-{time.monotonic()}', {'OPTIONS': options})
+
+    def test_l2_hit_is_promoted(self) -> None:
+        """Test that a value found in the shared cache is served from L1 afterwards."""
+        tiered = self.make_cache('promote')
+        caches['shared'].set('carfax_autocheck:VIN', {"success": True}, 60)
+
+        self.assertEqual(tiered.get('carfax_autocheck:VIN'), {"success": True})
+        self.assertEqual(tiered.get('carfax_autocheck:VIN'), {"success": True})
+        self.assertIsNone(tiered.get('missing'))
+
+        stats = tiered.stats()
+        self.assertEqual((stats['l2_hits'], stats['l1_hits'], stats['misses']), (1, 1, 1))
+        self.assertEqual(stats['l1_entries'], 1)
+
+    def test_l1_respects_byte_budget(self) -> None:
+        """Test that least recently used entries are evicted once the budget is exceeded."""
+        tiered = self.make_cache('budget', L1_MAX_BYTES=4000)
+
+        for i in range(20):
+            tiered.set(f'key:{i}', 'x' * 300, 60)
+
+        stats = tiered.stats()
+        self.assertLessEqual(stats['l1_bytes'], 4000)
+        self.assertLess(stats['l1_entries'], 20)
+        # Evicted values are still served by the shared cache
+        self.assertEqual(tiered.get('key:0'), 'x' * 300)
+
+    def test_invalidation_reaches_other_processes(self) -> None:
+        """Test that a write in one process drops the stale L1 copy in another."""
+        first = self.make_cache('first')
+        second = self.make_cache('second')
+
+        with patch('vagvin.cache._process_id', return_value='worker-1'):
+            first.set('vinhistory:VIN', 'old', 60)
+        with patch('vagvin.cache._process_id', return_value='worker-2'):
+            self.assertEqual(second.get('vinhistory:VIN'), 'old')
+        with patch('vagvin.cache._process_id', return_value='worker-1'):
+            first.set('vinhistory:VIN', 'new', 60)
+        with patch('vagvin.cache._process_id', return_value='worker-2'):
+            self.assertEqual(second.get('vinhistory:VIN'), 'new')
+            self.assertEqual(second.stats()['invalidations'], 1)
+
+    def test_racing_sequence_numbers_keep_both_invalidations(self) -> None:
+        """Test that two writers given the same sequence number by a non-atomic incr publish both keys."""
+        first = self.make_cache('racing-first')
+        second = self.make_cache('racing-second')
+        shared = caches['shared']
+        first.set('vinhistory:A', 'old', 60)
+        first.set('vinhistory:B', 'old', 60)
+        with patch('vagvin.cache._process_id', return_value='worker-2'):
+            second.get('vinhistory:A')
+            second.get('vinhistory:B')
+
+        seq = shared.get(TieredCache.SEQ_KEY)
+        incr = shared.incr
+        # Both writers read the counter before either stored its increment
+        numbers = iter([seq + 1, seq + 1])
+        with patch.object(shared, 'incr', side_effect=lambda key, delta=1, **kwargs: next(numbers, None) or incr(key)):
+            first.set('vinhistory:A', 'new', 60)
+            first.set('vinhistory:B', 'new', 60)
+
+        with patch('vagvin.cache._process_id', return_value='worker-2'):
+            self.assertEqual(second.get('vinhistory:A'), 'new')
+            self.assertEqual(second.get('vinhistory:B'), 'new')
+            self.assertEqual(second.stats()['invalidations'], 2)
+
+    def test_bypass_prefixes_skip_l1(self) -> None:
+        """Test that coordination keys are always read from the shared cache."""
+        tiered = self.make_cache('bypass', L1_BYPASS_PREFIXES=['singleflight:'])
+
+        self.assertTrue(tiered.add('singleflight:lease:key', 'token', 60))
+        self.assertEqual(tiered.get('singleflight:lease:key'), 'token')
+        caches['shared'].delete('singleflight:lease:key')
+
+        self.assertIsNone(tiered.get('singleflight:lease:key'))
+        self.assertEqual(tiered.stats()['l1_entries'], 0)
+
+
+@override_settings(VINHISTORY_LOGIN='login', VINHISTORY_PASS='pass')
+class ProviderResultStoreTest(TestCase):
+    """Tests for the durable provider result store."""
+
+    VIN = "WVWZZZ1JZXW000001"
+
+    def setUp(self) -> None:
+        cache.clear()
+        NegativeFilterService._states.clear()
+        self.cache_key = CacheService.generate_key("vinhistory", self.VIN)
+
+    def store(self, payload: dict, ttl: int) -> None:
+        ProviderResultService.save(self.cache_key, "vinhistory", "vin", self.VIN, payload, ttl, ttl)
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_fetched_result_is_stored(self, mock_get_client) -> None:
+        """Test that a cacheable upstream result is persisted with its expiry."""
+        mock_get_client.return_value.get.return_value.json.return_value = {"vehicle": {"make": "VW"}, "images": 1}
+
+        result = VinhistoryService.check(self.VIN)
+
+        record = ProviderResult.objects.get(provider="vinhistory", identifier_type="vin", identifier=self.VIN)
+        self.assertEqual(record.payload, result)
+        self.assertEqual(record.cache_key, self.cache_key)
+        self.assertFalse(record.is_expired)
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_store_refills_cache_after_cold_start(self, mock_get_client) -> None:
+        """Test that an empty cache is served from the store without calling upstream."""
+        self.store({"success": True, "stored": True}, 3600)
+        cache.clear()
+
+        result = VinhistoryService.check(self.VIN)
+
+        self.assertEqual(result, {"success": True, "stored": True})
+        mock_get_client.return_value.get.assert_not_called()
+        self.assertEqual(CacheService.read(self.cache_key)["result"], result)
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_expired_result_is_refetched(self, mock_get_client) -> None:
+        """Test that an expired stored result falls through to upstream and is replaced."""
+        self.store({"success": True, "stored": True}, 3600)
+        ProviderResult.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        cache.clear()
+        mock_get_client.return_value.get.return_value.json.return_value = {"vehicle": {"make": "VW"}, "images": 1}
+
+        result = VinhistoryService.check(self.VIN)
+
+        mock_get_client.return_value.get.assert_called_once()
+        self.assertNotIn("stored", result)
+        self.assertEqual(ProviderResult.objects.get().payload, result)
+
+    def test_preload_command(self) -> None:
+        """Test that the preload command warms the cache for recently requested VINs."""
+        user = User.objects.create_user(username="testuser", email="test@example.com", password="testpass123")
+        Query.objects.create(user=user, vin=self.VIN, query_type='vinhistory')
+        self.store({"success": True, "stored": True}, 3600)
+        cache.clear()
+
+        out = StringIO()
+        call_command('preload_provider_results', stdout=out)
+
+        self.assertIn('Loaded 1 stored results', out.getvalue())
+        self.assertEqual(CacheService.read(self.cache_key)["result"], {"success": True, "stored": True})
+
+
+@override_settings(CARSTAT_API_KEY='test-carstat-key')
+class CarstatServiceTest(TestCase):
+    """Tests for the combined Carstat lookup."""
+
+    VIN = "WVWZZZ1JZXW000001"
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def mock_responses(self, mock_get_client, auction_error: bool = False) -> None:
+        def get(url, **kwargs):
+            response = MagicMock()
+            if 'check-records' in url:
+                response.json.return_value = {"vehicle": "VW Golf", "carfax": 2, "autocheck": 1}
+            elif auction_error:
+                response.raise_for_status.side_effect = requests.exceptions.ConnectionError()
+            else:
+                response.json.return_value = {"exists": True, "domains": ["a", "b"]}
+            return response
+
+        mock_get_client.return_value.get.side_effect = get
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_parts_share_one_entry(self, mock_get_client) -> None:
+        """Test that Carfax and auction checks are served by one fetch and one cache entry."""
+        self.mock_responses(mock_get_client)
+
+        carfax = CarfaxService.check(self.VIN)
+        auction = AuctionService.check(self.VIN)
+
+        self.assertEqual(carfax["carfax"], 2)
+        self.assertEqual(auction["auction_count"], 2)
+        self.assertEqual(mock_get_client.return_value.get.call_count, 2)
+        mock_get_client.assert_called_with("carstat")
+        self.assertEqual(
+            CacheService.read(CacheService.generate_key("carstat", self.VIN))["result"],
+            {"carfax": carfax, "auction": auction}
+        )
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_failed_part_is_not_cached(self, mock_get_client) -> None:
+        """Test that a transient error in one resource keeps the combined entry out of the cache."""
+        self.mock_responses(mock_get_client, auction_error=True)
+
+        results = CarstatService.split({"carstat": CarstatService.check(self.VIN)})
+
+        self.assertTrue(results["carfax"]["success"])
+        self.assertIn("error", results["auction"])
+        self.assertIsNone(cache.get(CacheService.generate_key("carstat", self.VIN)))
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_successful_part_is_reused_after_failure(self, mock_get_client) -> None:
+        """Test that the part that succeeded next to a failed one is not requested again."""
+        self.mock_responses(mock_get_client, auction_error=True)
+        CarstatService.check(self.VIN)
+
+        self.mock_responses(mock_get_client)
+        mock_get_client.return_value.get.reset_mock()
+        results = CarstatService.split({"carstat": CarstatService.check(self.VIN)})
+
+        self.assertEqual(results["carfax"]["carfax"], 2)
+        self.assertEqual(results["auction"]["auction_count"], 2)
+        mock_get_client.return_value.get.assert_called_once()
+        self.assertNotIn('check-records', mock_get_client.return_value.get.call_args.args[0])
+        self.assertIsNotNone(cache.get(CacheService.generate_key("carstat", self.VIN)))
+
+    def test_validation_error_applies_to_both_parts(self) -> None:
+        """Test that an invalid VIN yields the same error for both parts."""
+        results = CarstatService.split({"carstat": CarstatService.check("SHORT")})
+
+        self.assertEqual(results["carfax"], results["auction"])
+        self.assertIn("error", results["carfax"])
+
+
+class CircuitBreakerTest(TestCase):
+    """Tests for per-provider circuit breakers."""
+
+    BREAKER = {'min_calls': 2, 'error_rate': 0.5, 'open_seconds': 60, 'sync_interval': 0}
+
+    def setUp(self) -> None:
+        cache.clear()
+        NegativeFilterService._states.clear()
+
+    def make_client(self) -> HttpClient:
+        return HttpClient('test-circuit', {'retries': 0, 'circuit_breaker': self.BREAKER})
+
+    @patch('requests.Session.request', side_effect=requests.exceptions.ConnectionError("down"))
+    def test_opens_and_fails_fast(self, mock_request) -> None:
+        """Test that the circuit opens after repeated errors and stops calling upstream."""
+        client = self.make_client()
+
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                client.get('http://upstream.test/')
+        with self.assertRaises(CircuitOpenError):
+            client.get('http://upstream.test/')
+
+        self.assertEqual(mock_request.call_count, 2)
+        self.assertEqual(client.stats()['circuit']['state'], 'open')
+
+    @patch('requests.Session.request', side_effect=requests.exceptions.ConnectionError("down"))
+    def test_state_is_shared_between_workers(self, mock_request) -> None:
+        """Test that a circuit opened by one worker fails fast in another."""
+        first, second = self.make_client(), self.make_client()
+
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.ConnectionError):
+                first.get('http://upstream.test/')
+
+        with self.assertRaises(CircuitOpenError):
+            second.get('http://upstream.test/')
+
+    def test_half_open_probe_closes_circuit(self) -> None:
+        """Test that a successful probe after the open period closes the circuit."""
+        breaker = CircuitBreaker('test-probe', self.BREAKER)
+        breaker._open("test")
+        cache.set(breaker.state_key, {**cache.get(breaker.state_key), 'open_until': time.time() - 1}, None)
+        other_worker = CircuitBreaker('test-probe', self.BREAKER)
+
+        self.assertTrue(breaker.before_call())
+        # Only one worker probes, the others keep failing fast meanwhile
+        with self.assertRaises(CircuitOpenError):
+            other_worker.before_call()
+
+        breaker.record(True, 0.1, probe=True)
+
+        self.assertEqual(other_worker.stats()['state'], 'closed')
+        self.assertFalse(other_worker.before_call())
+
+    @override_settings(VINHISTORY_LOGIN='login', VINHISTORY_PASS='pass')
+    def test_provider_reports_open_circuit(self) -> None:
+        """Test that a provider check returns a clear error while its circuit is open."""
+        breaker = HttpClientRegistry.get('vinhistory').breaker
+        breaker._open("test")
+        try:
+            with patch('requests.Session.request') as mock_request:
+                result = VinhistoryService.check("WVWZZZ1JZXW000001")
+            mock_request.assert_not_called()
+            self.assertIn("временно недоступен", result["error"])
+        finally:
+            breaker.reset()
+
+
+@override_settings(AVITO_TOKEN_URL='https://avito.test/token', AVITO_CLIENT_ID='id', AVITO_CLIENT_SECRET='secret')
+class AvitoTokenTest(TestCase):
+    """Tests for the Avito token manager."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.issued = []
+
+    def mock_token_endpoint(self, mock_get_client, delay: float = 0) -> None:
+        def post(url, **kwargs):
+            time.sleep(delay)
+            self.issued.append(f"token-{len(self.issued) + 1}")
+            response = MagicMock()
+            response.json.return_value = {"access_token": self.issued[-1], "expires_in": 3600}
+            return response
+
+        mock_get_client.return_value.post.side_effect = post
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_concurrent_cold_start_fetches_once(self, mock_get_client) -> None:
+        """Test that concurrent requests without a token share one token request."""
+        self.mock_token_endpoint(mock_get_client, delay=0.3)
+
+        results = ProviderCheckService.run_checks({
+            str(i): (lambda: {"token": AvitoAuthService.get_token()}) for i in range(5)
+        })
+
+        self.assertEqual(self.issued, ["token-1"])
+        self.assertTrue(all(result["token"] == "token-1" for result in results.values()))
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_refresh_ahead_keeps_serving_current_token(self, mock_get_client) -> None:
+        """Test that a token due for refresh is still returned while a new one is fetched."""
+        self.mock_token_endpoint(mock_get_client)
+        cache.set(AvitoAuthService.TOKEN_KEY, {
+            "token": "current", "expires_at": time.time() + 100, "refresh_at": time.time() - 1,
+        }, 100)
+
+        self.assertEqual(AvitoAuthService.get_token(), "current")
+        AvitoAuthService.refresh_in_background().result(timeout=5)
+
+        self.assertEqual(AvitoAuthService.get_token(), "token-1")
+        self.assertEqual(self.issued, ["token-1"])
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_rejected_token_is_refreshed_once(self, mock_get_client) -> None:
+        """Test that repeated 401s for the same token cause a single refresh."""
+        self.mock_token_endpoint(mock_get_client)
+        rejected = AvitoAuthService.get_token()
+
+        AvitoAuthService.invalidate(rejected).result(timeout=5)
+        AvitoAuthService.invalidate(rejected).result(timeout=5)
+
+        self.assertEqual(self.issued, ["token-1", "token-2"])
+        self.assertEqual(AvitoAuthService.get_token(), "token-2")
+
+
+@override_settings(
+    NEGATIVE_FILTER_CAPACITY=1000, NEGATIVE_FILTER_SYNC_INTERVAL=0,
+    VINHISTORY_LOGIN='login', VINHISTORY_PASS='pass', CARSTAT_API_KEY='test-carstat-key'
+)
+class NegativeFilterTest(TestCase):
+    """Tests for the negative result Bloom filters."""
+
+    VIN = "1HGCM82633A004352"
+
+    def setUp(self) -> None:
+        cache.clear()
+        NegativeFilterService._states.clear()
+
+    def tearDown(self) -> None:
+        NegativeFilterService._states.clear()
+
+    def test_bloom_filter(self) -> None:
+        """Test membership, persistence round trip and the size of the filter."""
+        bloom = BloomFilter(10000, 0.001)
+        vins = [f"TESTVIN{i:010d}" for i in range(10000)]
+        for vin in vins:
+            bloom.add(vin)
+
+        restored = BloomFilter(10000, 0.001, bloom.to_bytes())
+        self.assertTrue(all(vin in restored for vin in vins))
+        false_positives = sum(f"OTHERVIN{i:09d}" in restored for i in range(10000))
+        self.assertLess(false_positives, 50)
+        # Under 2 bytes per VIN, far less than a cache entry
+        self.assertLess(len(bloom.to_bytes()), 2 * len(vins))
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_missing_vin_skips_upstream(self, mock_get_client) -> None:
+        """Test that a VIN confirmed missing is answered without a network call once the cache expired."""
+        mock_get_client.return_value.get.return_value.json.return_value = {"vehicle": {}, "images": 0}
+
+        first = VinhistoryService.check(self.VIN)
+        cache.clear()
+        second = VinhistoryService.check(self.VIN)
+
+        self.assertFalse(first["success"])
+        self.assertEqual(first, second)
+        mock_get_client.return_value.get.assert_called_once()
+        self.assertEqual(NegativeFilterService.stats()["vinhistory"]["hits"], 1)
+
+    def test_filter_is_shared_through_database(self) -> None:
+        """Test that additions reach other workers through the stored filter."""
+        NegativeFilterService.add("auction", self.VIN)
+        NegativeFilterService.sync("auction")
+        NegativeFilterService._states.clear()
+
+        self.assertTrue(NegativeFilterService.contains("auction", self.VIN))
+        self.assertFalse(NegativeFilterService.contains("auction", "WVWZZZ1JZXW000001"))
+        self.assertEqual(NegativeFilter.objects.get(provider="auction").items_count, 1)
+
+    @override_settings(NEGATIVE_FILTER_ROTATION=3600)
+    def test_rotation_keeps_previous_generation(self) -> None:
+        """Test that rotation starts a new generation and drops the one before the previous."""
+        NegativeFilterService.add("carfax", self.VIN)
+        NegativeFilterService.sync("carfax")
+        NegativeFilter.objects.update(started_at=timezone.now() - timedelta(hours=2))
+        NegativeFilterService.sync("carfax")
+
+        self.assertEqual(NegativeFilter.objects.filter(provider="carfax").count(), 2)
+        self.assertTrue(NegativeFilterService.contains("carfax", self.VIN))
+
+        NegativeFilter.objects.update(started_at=timezone.now() - timedelta(hours=2))
+        NegativeFilterService.sync("carfax")
+
+        self.assertEqual(NegativeFilter.objects.filter(provider="carfax").count(), 2)
+        self.assertFalse(NegativeFilterService.contains("carfax", self.VIN))
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_carstat_needs_both_parts_missing(self, mock_get_client) -> None:
+        """Test that the combined Carstat lookup is skipped only when both parts are known missing."""
+        NegativeFilterService.add("carfax", self.VIN)
+        self.assertIn("carfax", CarfaxService.check(self.VIN)["message"].lower())
+
+        NegativeFilterService.add("auction", self.VIN)
+        results = CarstatService.split({"carstat": CarstatService.check(self.VIN)})
+
+        self.assertFalse(results["carfax"]["success"])
+        self.assertFalse(results["auction"]["success"])
+        mock_get_client.return_value.get.assert_not_called()
+
+
+class StaleWhileRevalidateTest(TestCase):
+    """Tests for serving stale provider results while they are refreshed."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.calls = []
+
+    def fetch(self) -> tuple:
+        self.calls.append(1)
+        time.sleep(0.2)
+        return {"success": True, "version": len(self.calls)}, 60
+
+    def wait_until_fresh(self, key: str) -> dict:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            entry = CacheService.read(key)
+            if CacheService.is_fresh(entry):
+                return entry
+            time.sleep(0.05)
+        self.fail("entry was not refreshed")
+
+    def test_stale_result_is_served_and_refreshed_once(self) -> None:
+        """Test that a stale entry is returned with its age and refreshed by one background call."""
+        CacheService.write("test:swr", {"success": True, "version": 0}, 10, 3600, fetched_at=time.time() - 100)
+
+        first = CacheService.get_or_fetch("test:swr", self.fetch)
+        second = CacheService.get_or_fetch("test:swr", self.fetch)
+
+        self.assertTrue(first["stale"])
+        self.assertGreaterEqual(first["age"], 100)
+        self.assertEqual(first["version"], 0)
+        self.assertEqual(second["version"], 0)
+
+        entry = self.wait_until_fresh("test:swr")
+        self.assertEqual(entry["result"], {"success": True, "version": 1})
+        self.assertEqual(CacheService.get_or_fetch("test:swr", self.fetch), {"success": True, "version": 1})
+        self.assertEqual(len(self.calls), 1)
+
+    def test_failed_refresh_keeps_stale_result(self) -> None:
+        """Test that an upstream error during the refresh does not replace the stale entry."""
+        CacheService.write("test:swr-error", {"success": True}, 10, 3600, fetched_at=time.time() - 100)
+
+        result = CacheService.get_or_fetch("test:swr-error", lambda: ({"error": "down"}, None))
+        deadline = time.monotonic() + 5
+        while CacheService._revalidating and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        self.assertTrue(result["stale"])
+        self.assertEqual(CacheService.read("test:swr-error")["result"], {"success": True})
+
+    @override_settings(PROVIDER_CACHE_TTL={
+        'default': {'short': (60, 600), 'long': (3600, 36000)},
+        'autoteka': {'short': (60, 600), 'long': (3600, 72000)},
+    })
+    def test_provider_windows(self) -> None:
+        """Test that freshness classes resolve to per-provider soft and hard TTLs."""
+        self.assertEqual(CacheService.get_windows("autoteka", "long"), (3600, 72000))
+        self.assertEqual(CacheService.get_windows("vinhistory", "long"), (3600, 36000))
+        self.assertEqual(CacheService.get_windows("carstat", "short"), (60, 600))
+        self.assertEqual(CacheService.get_windows(None, 30), (30, 30))
+
+
+class RateLimiterTest(TestCase):
+    """Tests for the shared provider quotas."""
+
+    def setUp(self) -> None:
+        cache.clear()
+
+    def test_bucket_is_shared_and_fails_fast(self) -> None:
+        """Test that workers share one bucket and an empty bucket fails without waiting."""
+        first = RateLimiter('test-quota', {60: 3})
+        second = RateLimiter('test-quota', {60: 3})
+
+        first.acquire()
+        second.acquire()
+        first.acquire()
+        started = time.monotonic()
+        with self.assertRaises(QuotaExceededError) as raised:
+            second.acquire()
+
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(raised.exception.period, 60)
+        self.assertEqual(first.stats()['per_60s']['remaining'], 0)
+
+    def test_rejected_call_gives_back_daily_token(self) -> None:
+        """Test that a call rejected by the per-minute limit doesn't use up the daily quota."""
+        limiter = RateLimiter('test-mixed', {60: 1, 86400: 5})
+        limiter.acquire()
+
+        for _ in range(4):
+            with self.assertRaises(QuotaExceededError) as raised:
+                limiter.acquire()
+            self.assertEqual(raised.exception.period, 60)
+
+        self.assertEqual(limiter.stats()['per_86400s']['used'], 1)
+        self.assertEqual(limiter.stats()['per_86400s']['remaining'], 4)
+
+    def test_waits_for_refill(self) -> None:
+        """Test that a request waits for the next window when it fits in the deadline."""
+        limiter = RateLimiter('test-refill', {1: 1})
+        limiter.acquire()
+
+        # Raises if the refill is not awaited
+        limiter.acquire(max_wait=2)
+
+        self.assertEqual(limiter.stats()['per_1s']['used'], 1)
+
+    def test_concurrent_workers_never_exceed_limit(self) -> None:
+        """Test that racing threads get exactly the configured number of tokens."""
+        limiter = RateLimiter('test-race', {60: 5})
+
+        def take() -> dict:
+            try:
+                limiter.acquire()
+                return {"success": True}
+            except QuotaExceededError:
+                return {"success": False}
+
+        results = ProviderCheckService.run_checks({str(i): take for i in range(12)})
+
+        self.assertEqual(sum(result["success"] for result in results.values()), 5)
+
+    @override_settings(VINHISTORY_LOGIN='login', VINHISTORY_PASS='pass')
+    def test_provider_reports_used_up_quota(self) -> None:
+        """Test that a provider check returns a clear error when its quota is used up."""
+        client = HttpClientRegistry.get('vinhistory')
+        limiter = client.limiter
+        client.limiter = RateLimiter('vinhistory', {60: 1})
+        NegativeFilterService._states.clear()
+        try:
+            with patch('requests.Session.request') as mock_request:
+                mock_request.return_value.status_code = 200
+                mock_request.return_value.json.return_value = {
+                    "vehicle": {"make": "VW", "model": "Golf", "year": 2015}, "images": 1
+                }
+                VinhistoryService.check("WVWZZZ1JZXW000001")
+                cache.delete(CacheService.generate_key("vinhistory", "WVWZZZ1JZXW000001"))
+                ProviderResult.objects.all().delete()
+                result = VinhistoryService.check("WVWZZZ1JZXW000001")
+
+            mock_request.assert_called_once()
+            self.assertIn("лимит", result["error"])
+            self.assertIn('quota', client.stats())
+        finally:
+            client.limiter = limiter
+
+
+@override_settings(QUERY_LOG_BUFFERED=False)
+class BulkCheckTest(TestCase):
+    """Tests for the streaming bulk VIN check."""
+
+    VIN = "WVWZZZ1JZXW000001"
+    OTHER_VIN = "WVWZZZ1JZXW000002"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.client = Client()
+        self.url = reverse('reports:api_check_bulk')
+        User.objects.create_user(username="website", email="website@example.com", password="testpass123")
+        self.dealer = User.objects.create_user(username="dealer", email="dealer@example.com", password="testpass123")
+        self.client.force_login(self.dealer)
+        QueryLogService._website_user_id = None
+
+    def _post(self, payload) -> list:
+        response = self.client.post(self.url, json.dumps(payload), content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+
+    def test_streams_deduplicated_results_cache_first(self) -> None:
+        """Test that duplicates are checked once and cached results come before upstream checks."""
+        CacheService.write(CacheService.generate_key("vinhistory", self.OTHER_VIN), {"success": True}, 60, 60)
+        checked = []
+
+        def check(vin):
+            checked.append(vin)
+            return {"success": False}
+
+        with patch.dict(BulkCheckService.CHECKS, {"vinhistory": check}):
+            lines = self._post({"vins": [self.VIN, self.VIN.lower(), self.OTHER_VIN], "providers": ["vinhistory"]})
+
+        self.assertEqual(checked, [self.VIN])
+        self.assertEqual(lines[0], {"vin": self.OTHER_VIN, "provider": "vinhistory",
+                                    "result": {"success": True}, "cached": True})
+        self.assertEqual(lines[1]["vin"], self.VIN)
+        self.assertFalse(lines[1]["cached"])
+        self.assertEqual(Query.objects.filter(query_type="vinhistory").count(), 2)
+
+    def test_carstat_parts_are_read_from_combined_entry(self) -> None:
+        """Test that Carfax and auction results are answered from the combined Carstat entry."""
+        CacheService.write(CacheService.generate_key("carstat", self.VIN),
+                           {"carfax": {"carfax": 1}, "auction": {"auction": 2}}, 60, 60)
+
+        self.assertEqual(BulkCheckService.peek("carfax", self.VIN), {"carfax": 1})
+        self.assertEqual(BulkCheckService.peek("auction", self.VIN), {"auction": 2})
+        self.assertIsNone(BulkCheckService.peek("vinhistory", self.VIN))
+
+    @override_settings(BULK_CHECK_CONCURRENCY=1)
+    def test_deadline_reports_unfinished_checks(self) -> None:
+        """Test that checks past the deadline get an error line instead of blocking the stream."""
+        release = threading.Event()
+
+        def slow_check(vin):
+            release.wait(5)
+            return {"success": True}
+
+        try:
+            with patch.dict(BulkCheckService.CHECKS, {"vinhistory": slow_check}):
+                lines = list(BulkCheckService.iter_results([self.VIN, self.OTHER_VIN], ["vinhistory"], timeout=0.2))
+        finally:
+            release.set()
+
+        self.assertEqual([line["vin"] for line in lines], [self.VIN, self.OTHER_VIN])
+        self.assertTrue(all("error" in line["result"] for line in lines))
+
+    @override_settings(BULK_CHECK_MAX_VINS=1)
+    def test_rejects_invalid_requests(self) -> None:
+        """Test that too many VINs and unknown providers are rejected before any check."""
+        response = self.client.post(self.url, json.dumps({"vins": [self.VIN, self.OTHER_VIN]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(self.url, json.dumps({"vins": [self.VIN], "providers": ["unknown"]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Query.objects.exists())
+
+    def test_requires_login(self) -> None:
+        """Test that anonymous bulk checks are rejected."""
+        self.client.logout()
+        response = self.client.post(self.url, json.dumps({"vins": [self.VIN]}), content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Query.objects.exists())
+
+    def test_invalid_vins_are_not_checked(self) -> None:
+        """Test that invalid VINs get an error line without an upstream check or a query log row."""
+        checked = []
+
+        def check(vin):
+            checked.append(vin)
+            return {"success": True}
+
+        with patch.dict(BulkCheckService.CHECKS, {"vinhistory": check}):
+            lines = self._post({"vins": ["SHORT", self.VIN], "providers": ["vinhistory"]})
+
+        self.assertEqual(checked, [self.VIN])
+        self.assertEqual(lines[0]["vin"], "SHORT")
+        self.assertIn("error", lines[0]["result"])
+        self.assertEqual(list(Query.objects.values_list("vin", "user")), [(self.VIN, self.dealer.pk)])
+
+    @override_settings(BULK_CHECK_USER_HOURLY_LIMIT=1)
+    def test_user_limit(self) -> None:
+        """Test that bulk requests past the user's hourly limit are refused."""
+        with patch.dict(BulkCheckService.CHECKS, {"vinhistory": lambda vin: {"success": True}}):
+            self._post({"vins": [self.VIN], "providers": ["vinhistory"]})
+            response = self.client.post(self.url, json.dumps({"vins": [self.VIN], "providers": ["vinhistory"]}),
+                                        content_type='application/json')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+@override_settings(AUTOTEKA_POLLING={'initial_interval': 0.01, 'min_interval': 0.01, 'jitter': 0, 'max_wait': 5})
+class AutotekaPollingTest(TestCase):
+    """Tests for the adaptive Autoteka preview polling."""
+
+    VIN = "WVWZZZ1JZXW000001"
+
+    def setUp(self) -> None:
+        cache.clear()
+        cache.set(AvitoAuthService.TOKEN_KEY, {
+            "token": "token", "expires_at": time.time() + 3600, "refresh_at": time.time() + 3600,
+        }, 3600)
+
+    def test_schedule_learns_and_backs_off(self) -> None:
+        """Test that the first poll follows recorded completion times and later polls back off."""
+        scheduler = PollScheduler('test-poll', {'jitter': 0, 'min_samples': 2, 'max_interval': 3})
+        self.assertAlmostEqual(scheduler.start('vin').next_delay(), 1.0, places=2)
+
+        for elapsed in (4, 4, 4):
+            scheduler.record('vin', elapsed, 2)
+        run = scheduler.start('vin')
+        delays = [run.next_delay() for _ in range(4)]
+
+        self.assertAlmostEqual(delays[0], 2.0, places=2)
+        self.assertEqual(delays[-1], 3)
+        self.assertEqual(run.next_delay(retry_after=5), 5)
+        self.assertEqual(scheduler.stats(['vin'])['vin']['avg_polls'], 2)
+        # A resumed job is polled right away and still gets a full polling window
+        resumed = scheduler.start('vin', started_at=time.time() - 200)
+        self.assertEqual(resumed.next_delay(), 0.5)
+        self.assertIsNone(PollScheduler('test-poll', {'max_wait': 0}).start('vin').next_delay())
+
+    def test_parse_retry_after(self) -> None:
+        """Test that Retry-After is parsed in seconds and as an HTTP date."""
+        self.assertEqual(parse_retry_after("7"), 7.0)
+        self.assertAlmostEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0.0)
+        self.assertIsNone(parse_retry_after("soon"))
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_transient_polling_errors_are_retried(self, mock_get_client) -> None:
+        """Test that 5xx and connection errors while polling don't end the check."""
+        client = mock_get_client.return_value
+        client.post.return_value.json.return_value = {"result": {"preview": {"previewId": 1}}}
+        unavailable = requests.Response()
+        unavailable.status_code = 503
+        unavailable.headers['Retry-After'] = '0'
+        ready = MagicMock(status_code=200, headers={})
+        ready.json.return_value = {"result": {"preview": {"status": "success", "data": {"brand": "VW"}}}}
+        client.get.side_effect = [unavailable, requests.exceptions.ConnectionError(), ready]
+
+        result = AutotekaService.check(self.VIN, 'vin')
+
+        self.assertTrue(result["success"])
+        self.assertEqual(client.get.call_count, 3)
+        stats = AutotekaService.get_poll_scheduler().stats(['vin'])['vin']
+        self.assertEqual((stats['samples'], stats['max_polls']), (1, 3))
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_interrupted_preview_is_resumed(self, mock_get_client) -> None:
+        """Test that a preview left by a dead worker is polled instead of requesting a new one."""
+        cache.set(AutotekaService.pending_preview_key('vin', self.VIN), {
+            "preview_id": 42, "started_at": time.time() - 30,
+        }, 600)
+        client = mock_get_client.return_value
+        ready = MagicMock(status_code=200, headers={})
+        ready.json.return_value = {"result": {"preview": {"status": "success", "data": {"brand": "VW"}}}}
+        client.get.return_value = ready
+
+        result = AutotekaService.check(self.VIN, 'vin')
+
+        self.assertTrue(result["success"])
+        client.post.assert_not_called()
+        self.assertTrue(client.get.call_args[0][0].endswith("/42"))
+        self.assertIsNone(cache.get(AutotekaService.pending_preview_key('vin', self.VIN)))
+        self.assertGreaterEqual(AutotekaService.get_poll_scheduler().stats(['vin'])['vin']['p50'], 30)
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    @override_settings(AUTOTEKA_POLLING={'initial_interval': 0.01, 'min_interval': 0.01, 'max_wait': 0.05})
+    def test_timed_out_preview_is_kept(self, mock_get_client) -> None:
+        """Test that a preview still processing at the deadline is kept for the next attempt."""
+        client = mock_get_client.return_value
+        client.post.return_value.json.return_value = {"result": {"preview": {"previewId": 7}}}
+        processing = MagicMock(status_code=200, headers={})
+        processing.json.return_value = {"result": {"preview": {"status": "processing"}}}
+        client.get.return_value = processing
+
+        result = AutotekaService.check(self.VIN, 'vin')
+
+        self.assertIn("error", result)
+        self.assertEqual(cache.get(AutotekaService.pending_preview_key('vin', self.VIN))["preview_id"], 7)
+
+
+class VinTest(TestCase):
+    """Tests for the local VIN validation and decoding."""
+
+    def test_check_digit(self) -> None:
+        """Test that the ISO 3779 check digit is enforced for North American VINs only."""
+        self.assertEqual(check_digit("1M8GDM9AXKP042788"), "X")
+        self.assertIsNone(validate_vin("1M8GDM9AXKP042788"))
+        self.assertIn("контрольная", validate_vin("1M8GDM9A1KP042788"))
+        # European VINs have no mandatory check digit
+        self.assertIsNone(validate_vin("WVWZZZ1JZXW000001"))
+        self.assertIn("недопустимые", validate_vin("WVWZZZ1JZXW00000O"))
+        self.assertIn("17", validate_vin("WVWZZZ1JZXW"))
+
+    def test_decode(self) -> None:
+        """Test that make, country, model year and plant come from the local tables."""
+        self.assertEqual(decode_vin("WVWZZZ1JZXW000001"), {
+            "vin": "WVWZZZ1JZXW000001", "valid": True, "error": None, "wmi": "WVW", "make": "Volkswagen",
+            "country": "Германия", "year": 1999, "plant": "Вольфсбург",
+        })
+        self.assertEqual(decode_vin("WAUZZZ8K9BA000001")["year"], 2011)
+        self.assertEqual(decode_vin("1M8GDM9AXKP042788")["country"], "США")
+        self.assertFalse(decode_vin("1M8GDM9A1KP042788")["valid"])
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    @override_settings(CARSTAT_API_KEY='test-carstat-key')
+    def test_invalid_vin_skips_upstream(self, mock_get_client) -> None:
+        """Test that a VIN with a wrong check digit is rejected without a network call."""
+        for check in (CarfaxService.check, AuctionService.check, VinhistoryService.check):
+            self.assertIn("error", check("1M8GDM9A1KP042788"))
+        mock_get_client.assert_not_called()
+
+    @patch('apps.reports.services.AutotekaService._fetch', return_value=({"success": True}, None))
+    def test_autoteka_vin_is_only_normalized(self, mock_fetch) -> None:
+        """Test that Autoteka gets VINs failing the ISO check digit, since it also covers non-ISO bodies."""
+        self.assertEqual(AutotekaService.check(" 1m8gdm9a1kp042788 ", 'vin'), {"success": True})
+        mock_fetch.assert_called_once_with("1M8GDM9A1KP042788", 'vin')
+
+
+@override_settings(QUERY_LOG_BUFFERED=True, QUERY_LOG_BATCH_SIZE=100, QUERY_LOG_FLUSH_INTERVAL=3600)
+class QueryLogTest(TestCase):
+    """Tests for the buffered query log writer."""
+
+    def setUp(self) -> None:
+        QueryLogService.flush()
+        QueryLogService._website_user_id = None
+        self.website = User.objects.create_user(username="website", email="website@example.com", password="testpass123")
+        cache.clear()
+        # Seed the recent queries buffer, so flushes only append to it
+        RecentQueriesService.get()
+
+    def test_log_is_queued_and_flushed_in_one_insert(self) -> None:
+        """Test that logging touches no database and a flush saves the batch with one INSERT."""
+        user = User.objects.create_user(username="dealer", email="dealer@example.com", password="testpass123")
+
+        with self.assertNumQueries(0):
+            QueryLogService.log("wvwzzz1jzxw000001", "carfax")
+            QueryLogService.log("WVWZZZ1JZXW000002", "auction", user)
+
+        # Website user lookup and the INSERT, in a savepoint under the test transaction
+        with self.assertNumQueries(4):
+            self.assertEqual(QueryLogService.flush(), 2)
+        self.assertEqual(Query.objects.get(query_type="carfax").user, self.website)
+        self.assertEqual(Query.objects.get(query_type="auction").user, user)
+
+        # The website user is resolved once per process
+        QueryLogService.log("WVWZZZ1JZXW000003", "vinhistory")
+        with self.assertNumQueries(3):
+            QueryLogService.flush()
+        self.assertEqual(Query.objects.filter(vin="WVWZZZ1JZXW000001").count(), 1)
+
+    def test_failed_batch_is_saved_row_by_row(self) -> None:
+        """Test that over-long identifiers are truncated and a failed batch insert is retried per row."""
+        QueryLogService.log("А123ВС777 RUS / AVITO-1234567890", "autoteka_reg")
+        QueryLogService.log("WVWZZZ1JZXW000002", "carfax")
+
+        with patch.object(Query.objects, 'bulk_create', side_effect=Exception("bad row")) as mock_bulk_create:
+            self.assertEqual(QueryLogService.flush(), 2)
+        mock_bulk_create.assert_called_once()
+
+        self.assertEqual(len(Query.objects.get(query_type="autoteka_reg").vin), 17)
+        self.assertTrue(Query.objects.filter(vin="WVWZZZ1JZXW000002").exists())
+
+    def test_website_check_view_does_not_write(self) -> None:
+        """Test that a website check only queues its query."""
+        with patch('apps.reports.views.VinhistoryService.check', return_value={"success": True}):
+            Client().post(reverse('reports:api_check_vinhistory'), {"vin": "WVWZZZ1JZXW000001"})
+
+        self.assertFalse(Query.objects.exists())
+        QueryLogService.flush()
+        self.assertTrue(Query.objects.filter(query_type="vinhistory", user=self.website).exists())
+
+
+@override_settings(QUERY_LOG_BUFFERED=False, RECENT_QUERIES_SIZE=3)
+class RecentQueriesTest(TestCase):
+    """Tests for the recent queries ring buffer."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        QueryLogService._website_user_id = None
+        User.objects.create_user(username="website", email="website@example.com", password="testpass123")
+
+    def test_buffer_keeps_latest_queries_without_database(self) -> None:
+        """Test that logged queries are read newest first from the cache, overwriting the oldest."""
+        for i in range(5):
+            QueryLogService.log(f"WVWZZZ1JZXW00000{i}", "carfax")
+
+        with self.assertNumQueries(0):
+            seq, entries = RecentQueriesService.get(limit=10)
+
+        self.assertEqual(seq, 5)
+        self.assertEqual(len(entries), 3)
+        self.assertTrue(entries[0].endswith("Carfax / Autocheck по VIN WVWZZZ1JZXW000004"))
+        self.assertTrue(entries[-1].endswith("WVWZZZ1JZXW000002"))
+
+    def test_racing_appends_keep_both_entries(self) -> None:
+        """Test that two appends given the same sequence number by a non-atomic incr both land in the buffer."""
+        QueryLogService.log("WVWZZZ1JZXW000001", "carfax")
+        incr = cache.incr
+        # Both writers read the counter before either stored its increment
+        numbers = iter([2, 2])
+        with patch.object(caches['default'], 'incr',
+                          side_effect=lambda key, delta=1, **kwargs: next(numbers, None) or incr(key, delta)):
+            QueryLogService.log("WVWZZZ1JZXW000002", "carfax")
+            QueryLogService.log("WVWZZZ1JZXW000003", "carfax")
+
+        seq, entries = RecentQueriesService.get(limit=3)
+        self.assertEqual(seq, 3)
+        self.assertEqual([entry[-1] for entry in entries], ["3", "2", "1"])
+
+    def test_unwritten_slot_does_not_show_wrapped_entry(self) -> None:
+        """Test that a claimed slot still holding an entry from before the ring wrapped is not shown."""
+        for i in range(3):
+            QueryLogService.log(f"WVWZZZ1JZXW00000{i}", "carfax")
+        # Another writer claimed number 4 but hasn't written slot 1 yet
+        cache.incr(RecentQueriesService.SEQ_KEY)
+
+        seq, entries = RecentQueriesService.get(limit=3)
+
+        self.assertEqual(seq, 4)
+        self.assertEqual([entry[-1] for entry in entries], ["2", "1"])
+
+    def test_empty_buffer_is_seeded_from_database(self) -> None:
+        """Test that a flushed cache is refilled from the latest Query rows once."""
+        QueryLogService.log("WVWZZZ1JZXW000001", "auction")
+        cache.clear()
+
+        self.assertEqual(len(RecentQueriesService.get()[1]), 1)
+        with self.assertNumQueries(0):
+            self.assertIn("Аукционы", RecentQueriesService.get()[1][0])
+
+    def test_etag_not_modified(self) -> None:
+        """Test that polling without new queries gets a 304."""
+        client = Client()
+        url = reverse('reports:recent_queries')
+        QueryLogService.log("WVWZZZ1JZXW000001", "vinhistory")
+
+        response = client.get(url)
+        self.assertEqual(len(response.json()), 1)
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        QueryLogService.log("WVWZZZ1JZXW000002", "vinhistory")
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_stream_under_wsgi_sends_snapshot_and_retry(self) -> None:
+        """Test that the stream degrades to one snapshot with a reconnect delay without ASGI."""
+        QueryLogService.log("WVWZZZ1JZXW000001", "carfax")
+
+        response = Client().get(reverse('reports:recent_queries_stream'))
+        body = b"".join(response.streaming_content).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertTrue(body.startswith("retry: 15000"))
+        self.assertIn("id: 1\nevent: snapshot\n", body)
+        self.assertIn("WVWZZZ1JZXW000001", body)
+
+    @override_settings(RECENT_QUERIES_PUSH_INTERVAL=0.05, RECENT_QUERIES_STREAM_TTL=2)
+    async def test_stream_pushes_new_queries(self) -> None:
+        """Test that an ASGI stream sends only the queries logged after the snapshot."""
+        await sync_to_async(QueryLogService.log)("WVWZZZ1JZXW000001", "carfax")
+
+        response = await self.async_client.get(reverse('reports:recent_queries_stream'))
+        events = aiter(response.streaming_content)
+        snapshot = (await anext(events)).decode()
+        self.assertIn("event: snapshot", snapshot)
+
+        await sync_to_async(QueryLogService.log)("WVWZZZ1JZXW000002", "auction")
+        pushed = (await anext(events)).decode()
+        await events.aclose()
+
+        self.assertTrue(pushed.startswith("id: 2\nevent: queries\n"))
+        entries = json.loads(pushed.split("data: ", 1)[1])
+        self.assertEqual(len(entries), 1)
+        self.assertIn("WVWZZZ1JZXW000002", entries[0])
+
+
+def _xlsx(rows) -> bytes:
+    """Build a minimal XLSX workbook with shared strings, like the ones Excel saves."""
+    main = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+    strings = [value for row in rows for value in row]
+    sheet_rows = "".join(
+        f'<row r="{r}">' + "".join(
+            f'<c r="{chr(65 + c)}{r}" t="s"><v>{strings.index(value)}</v></c>' for c, value in enumerate(row)
+        ) + "</row>"
+        for r, row in enumerate(rows, 1)
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("xl/workbook.xml", (
+            f'<workbook xmlns="{main}" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            '<sheets><sheet name="VINs" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        archive.writestr("xl/_rels/workbook.xml.rels", (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="worksheets/data.xml"/></Relationships>'
+        ))
+        archive.writestr("xl/sharedStrings.xml",
+                         f'<sst xmlns="{main}">' + "".join(f"<si><t>{v}</t></si>" for v in strings) + "</sst>")
+        archive.writestr("xl/worksheets/data.xml", f'<worksheet xmlns="{main}"><sheetData>{sheet_rows}</sheetData></worksheet>')
+    return buffer.getvalue()
+
+
+@override_settings(CHECK_JOBS_BACKEND='worker', BATCH_JOB_CHUNK_SIZE=2)
+class BatchJobTest(TestCase):
+    """Tests for dealer batch jobs."""
+
+    VINS = ["WVWZZZ1JZXW000001", "WVWZZZ1JZXW000002", "BADVIN", "WVWZZZ1JZXW000003"]
+
+    def setUp(self) -> None:
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        media = override_settings(MEDIA_ROOT=media_root.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user(username="dealer", email="dealer@example.com", password="testpass123")
+
+    def _job(self, **kwargs) -> BatchJob:
+        return BatchJob.objects.create(user=self.user, file_name="vins.csv", providers=["vinhistory"],
+                                       vins=self.VINS, total_count=len(self.VINS), **kwargs)
+
+    def test_read_vins_from_csv_column(self) -> None:
+        """Test that the VIN column is found by its header and values are deduplicated."""
+        data = "Марка;VIN\nVW;wvwzzz1jzxw000001\nVW;WVWZZZ1JZXW000001\nAudi; WAUZZZ8V0JA000001\n;\n"
+        vins = read_vins(io.BytesIO(data.encode("cp1251")), "vins.csv", 10)
+        self.assertEqual(vins, ["WVWZZZ1JZXW000001", "WAUZZZ8V0JA000001"])
+
+    def test_read_vins_from_xlsx(self) -> None:
+        """Test that VINs are read from the first column of an XLSX sheet without a header."""
+        data = _xlsx([["WVWZZZ1JZXW000001", "x"], ["WVWZZZ1JZXW000002", "y"]])
+        self.assertEqual(read_vins(io.BytesIO(data), "vins.xlsx", 10), ["WVWZZZ1JZXW000001", "WVWZZZ1JZXW000002"])
+        with self.assertRaisesMessage(ValueError, "больше 1 VIN"):
+            read_vins(io.BytesIO(data), "vins.xlsx", 1)
+
+    def test_read_vins_refuses_oversized_xlsx_part(self) -> None:
+        """Test that an XLSX part unpacking to more than the limit is refused before it is read."""
+        data = _xlsx([["WVWZZZ1JZXW000001"] * 50])
+        self.assertEqual(read_vins(io.BytesIO(data), "vins.xlsx", 10, 10000), ["WVWZZZ1JZXW000001"])
+        with self.assertRaisesMessage(ValueError, "после распаковки"):
+            read_vins(io.BytesIO(data), "vins.xlsx", 10, 500)
+
+    def test_run_job_writes_results_archive_and_queries(self) -> None:
+        """Test that a job checks valid VINs chunk by chunk, records queries and packs the results."""
+        job = self._job()
+        with patch.dict(BulkCheckService.CHECKS, {"vinhistory": lambda vin: {"success": True, "vin": vin}}):
+            self.assertTrue(BatchJobService.run_job(job.pk))
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual((job.processed_count, job.error_count, job.progress), (4, 1, 100))
+        self.assertEqual(Query.objects.filter(user=self.user, query_type="vinhistory").count(), 3)
+
+        with zipfile.ZipFile(job.result_file.open('rb')) as archive:
+            rows = list(csv.reader(io.StringIO(archive.read("results.csv").decode("utf-8-sig"))))
+        self.assertEqual(rows[0], BatchJobService.RESULT_COLUMNS)
+        self.assertEqual([row[0] for row in rows[1:]], self.VINS)
+        self.assertEqual(rows[3][2:4], ["error", "VIN должен состоять из 17 символов"])
+        self.assertEqual(json.loads(rows[1][4]), {"success": True, "vin": self.VINS[0]})
+
+    def test_stale_job_resumes_from_checkpoint(self) -> None:
+        """Test that a job whose worker died is requeued and continues after the last saved chunk."""
+        job = self._job(status='running', processed_count=2)
+        BatchJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        checked = []
+
+        def check(vin):
+            checked.append(vin)
+            return {"success": True}
+
+        self.assertEqual(BatchJobService.requeue_stale(), 1)
+        with patch.dict(BulkCheckService.CHECKS, {"vinhistory": check}):
+            BatchJobService.run_job(job.pk)
+
+        self.assertEqual(checked, ["WVWZZZ1JZXW000003"])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_count), ('done', 4))
+        self.assertEqual(Query.objects.count(), 1)
+
+    def test_heartbeat_stops_chunk_taken_over(self) -> None:
+        """Test that a worker refreshes a running chunk and stops once another worker owns the job."""
+        job = self._job(status='pending')
+
+        def iter_results(vins, providers, **kwargs):
+            yield {"vin": vins[0], "provider": "vinhistory", "result": {"success": True}}
+            self.assertGreater(BatchJob.objects.get(pk=job.pk).updated_at, timezone.now() - timedelta(minutes=1))
+            BatchJob.objects.filter(pk=job.pk).update(processed_count=2)
+            yield {"vin": vins[1], "provider": "vinhistory", "result": {"success": True}}
+
+        with patch.object(BatchJobService, 'HEARTBEAT_INTERVAL', 0), \
+                patch('apps.reports.services.BulkCheckService.iter_results', side_effect=iter_results):
+            self.assertTrue(BatchJobService.run_job(job.pk))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed_count), ('running', 2))
+        self.assertEqual(Query.objects.count(), 0)
+
+    @override_settings(CHECK_JOBS_BACKEND='thread')
+    def test_status_poll_restarts_only_stale_running_job(self) -> None:
+        """Test that status polls start a run only when they requeue a job whose worker died."""
+        waiting = self._job(status='pending')
+        stale = self._job(status='running')
+        BatchJob.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+        with patch.object(BatchJobService, '_start_thread') as mock_start:
+            for _ in range(3):
+                BatchJobService.get_status(waiting.job_id, self.user)
+                BatchJobService.get_status(stale.job_id, self.user)
+
+        mock_start.assert_called_once_with(stale.pk)
+        self.assertEqual(BatchJob.objects.get(pk=stale.pk).status, 'pending')
+
+    @override_settings(CHECK_JOBS_BACKEND='thread')
+    def test_thread_backend_starts_job_after_commit(self) -> None:
+        """Test that the thread backend starts a batch job only once its transaction commits."""
+        upload = SimpleUploadedFile("vins.csv", "\n".join(self.VINS).encode())
+        with patch.object(BatchJobService, '_start_thread') as mock_start:
+            with self.captureOnCommitCallbacks(execute=True):
+                job = BatchJobService.submit(self.user, upload, ["carfax"])
+                mock_start.assert_not_called()
+
+        mock_start.assert_called_once_with(job.pk)
+
+    def test_upload_creates_job(self) -> None:
+        """Test that the dashboard upload creates a job and its status can be polled."""
+        client = Client()
+        client.force_login(self.user)
+        upload = SimpleUploadedFile("vins.csv", "\n".join(self.VINS).encode())
+
+        response = client.post(reverse('accounts:batch_job_create'), {"file": upload, "providers": ["carfax", "x"]})
+        self.assertEqual(response.status_code, 202)
+        job = BatchJob.objects.get(job_id=response.json()["job_id"])
+        self.assertEqual((job.providers, job.total_count, job.status), (["carfax"], 4, 'pending'))
+
+        response = client.get(response.json()["status_url"])
+        self.assertEqual(response.json()["progress"], 0)
+        self.assertNotIn("download_url", response.json())
+
+        response = client.post(reverse('accounts:batch_job_create'),
+                               {"file": SimpleUploadedFile("vins.pdf", b"x"), "providers": ["carfax"]})
+        self.assertEqual(response.json(), {"error": "Поддерживаются только файлы CSV и XLSX"})
+
+
+@override_settings(AUTOTEKA_POLLING={'initial_interval': 0.01, 'min_interval': 0.01}, QUERY_LOG_BUFFERED=False)
+class VinAliasTest(TestCase):
+    """Tests for linking plates and Avito listings to VINs."""
+
+    VIN = "WVWZZZ1JZXW000001"
+
+    def setUp(self) -> None:
+        cache.clear()
+        NegativeFilterService._states.clear()
+        QueryLogService._website_user_id = None
+        User.objects.create_user(username="website", email="website@example.com", password="testpass123")
+        cache.set(AvitoAuthService.TOKEN_KEY, {
+            "token": "token", "expires_at": time.time() + 3600, "refresh_at": time.time() + 3600,
+        }, 3600)
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_plate_lookup_links_vin_result(self, mock_get_client) -> None:
+        """Test that a resolved plate lookup answers later lookups by VIN and plate without upstream calls."""
+        client = mock_get_client.return_value
+        client.post.return_value.json.return_value = {"result": {"preview": {"previewId": 1}}}
+        ready = MagicMock(status_code=200, headers={})
+        ready.json.return_value = {"result": {"preview": {
+            "status": "success", "vin": self.VIN.lower(), "data": {"brand": "VW"},
+        }}}
+        client.get.return_value = ready
+
+        result = AutotekaService.check("а123вс77", 'regNumber')
+        self.assertEqual(result["data"]["VIN"], self.VIN)
+        self.assertEqual(result["data"]["VIN/ГН/Id"], "А123ВС77")
+        self.assertEqual(VinAlias.objects.get(identifier="А123ВС77").vin, self.VIN)
+
+        # The copy under the VIN key names the VIN it is looked up by
+        vin_result = AutotekaService.check(self.VIN, 'vin')
+        self.assertEqual(vin_result["data"]["VIN/ГН/Id"], self.VIN)
+        self.assertEqual({**vin_result["data"], "VIN/ГН/Id": "А123ВС77"}, result["data"])
+        cache.clear()
+        self.assertEqual(AutotekaService.check("А123ВС77", 'regNumber')["data"]["Марка"], "VW")
+        self.assertEqual(client.post.call_count, 1)
+
+    def test_stale_alias_is_ignored(self) -> None:
+        """Test that mappings older than VIN_ALIAS_TTL are not used."""
+        VinAliasService.record('itemId', "123", self.VIN)
+        self.assertEqual(VinAliasService.resolve('itemId', " 123 "), self.VIN)
+        self.assertIsNone(VinAliasService.resolve('itemId', "abc"))
+
+        cache.clear()
+        VinAlias.objects.update(updated_at=timezone.now() - timedelta(days=31))
+        self.assertIsNone(VinAliasService.resolve('itemId', "123"))
+
+    @patch('apps.reports.views.CarfaxService.check', return_value={"success": True})
+    def test_vin_only_check_accepts_linked_plate(self, mock_check) -> None:
+        """Test that Carfax can be checked by a plate linked to a VIN, and unknown plates are rejected."""
+        VinAliasService.record('regNumber', "A123BC77", self.VIN)
+        client = Client()
+
+        response = client.get(reverse('reports:api_check_carfax_autocheck'), {"regNumber": "a123bc77"})
+        self.assertEqual(response.status_code, 200)
+        mock_check.assert_called_once_with(self.VIN)
+
+        response = client.get(reverse('reports:api_check_carfax_autocheck'), {"regNumber": "B456BC77"})
+        self.assertEqual(response.status_code, 400)
+
+
+class PlateTest(TestCase):
+    """Tests for registration plate canonicalization."""
+
+    def setUp(self) -> None:
+        cache.clear()
+        NegativeFilterService._states.clear()
+        CacheService._lookups.clear()
+        cache.set(AvitoAuthService.TOKEN_KEY, {
+            "token": "token", "expires_at": time.time() + 3600, "refresh_at": time.time() + 3600,
+        }, 3600)
+
+    def test_spellings_share_canonical_form(self) -> None:
+        """Test that Cyrillic, Latin lookalike and separated spellings give one plate."""
+        spellings = ["А123ВС77", "а123вс77", "A123BC77", "a 123 bc-77", "А123ВС 77 RUS", "A123ВС|77"]
+        self.assertEqual({normalize_plate(plate) for plate in spellings}, {"А123ВС77"})
+        self.assertEqual(normalize_plate("ах 1234 777"), "АХ1234777")
+
+    def test_validate_plate(self) -> None:
+        """Test that plate formats and region codes are validated."""
+        for plate in ("А123ВС77", "А123ВС777", "АВ12378", "1234АВ50", "АВ1234102"):
+            self.assertIsNone(validate_plate(plate), plate)
+        self.assertEqual(validate_plate("А123ВС00"), "Неверный код региона в госномере")
+        self.assertEqual(validate_plate("А123ВС577"), "Неверный код региона в госномере")
+        self.assertIn("формат", validate_plate(normalize_plate("Q123BC77")))
+        self.assertIn("формат", validate_plate(normalize_plate("А12ВС77")))
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    @override_settings(AUTOTEKA_POLLING={'initial_interval': 0.01, 'min_interval': 0.01})
+    def test_spellings_share_one_preview(self, mock_get_client) -> None:
+        """Test that differently typed plates hit one cache entry and the hits show in the lookup stats."""
+        client = mock_get_client.return_value
+        client.post.return_value.json.return_value = {"result": {"preview": {"previewId": 1}}}
+        ready = MagicMock(status_code=200, headers={})
+        ready.json.return_value = {"result": {"preview": {"status": "success", "data": {"brand": "VW"}}}}
+        client.get.return_value = ready
+
+        for plate in ("А123ВС77", "a123bc77", "A 123 BC 77"):
+            self.assertTrue(AutotekaService.check(plate, 'regNumber')["success"])
+        self.assertEqual(AutotekaService.check("А123ВС00", 'regNumber'), {"error": "Неверный код региона в госномере"})
+
+        self.assertEqual(client.post.call_count, 1)
+        self.assertEqual(client.post.call_args.kwargs["json"], {"regNumber": "А123ВС77"})
+        stats = CacheService.lookup_stats()["autoteka:regNumber"]
+        self.assertEqual((stats["misses"], stats["hits"], stats["canonicalized"]), (1, 2, 2))
+        self.assertAlmostEqual(stats["hit_rate"], 0.6667)
+
+
+class VehicleReportTest(TestCase):
+    """Tests for the canonical per-VIN report."""
+
+    VIN = "WVWZZZ1JZXW000001"
+    CARSTAT = {"carfax": {"success": True, "carfax": 2}, "auction": {"success": True, "auction_count": 1}}
+
+    def setUp(self) -> None:
+        cache.clear()
+        NegativeFilterService._states.clear()
+        QueryLogService._website_user_id = None
+        User.objects.create_user(username="website", email="website@example.com", password="testpass123")
+
+    def test_results_merge_into_one_key(self) -> None:
+        """Test that provider results are merged into one compressed report as they are cached."""
+        CacheService._save_result(CacheService.generate_key("carstat", self.VIN), self.CARSTAT, 3600,
+                                  ("carstat", "vin", self.VIN))
+        CacheService._save_result(CacheService.generate_key("vinhistory", self.VIN),
+                                  {"success": True, "vehicle": "VW Golf"}, 3600, ("vinhistory", "vin", self.VIN))
+
+        self.assertIsInstance(cache.get(VehicleReportService.key(self.VIN)), bytes)
+        report = VehicleReportService.get(self.VIN)
+        self.assertEqual(set(report["sections"]), {"carfax", "auction", "vinhistory"})
+        self.assertEqual(report["sections"]["carfax"]["result"], self.CARSTAT["carfax"])
+        self.assertEqual(report["vehicle"]["title"], "VW Golf")
+        self.assertEqual(report["vehicle"]["make"], "Volkswagen")
+
+    def test_stale_section_is_not_answered(self) -> None:
+        """Test that sections past their soft TTL are left to the provider services."""
+        now = time.time()
+        VehicleReportService.update("vinhistory", self.VIN, {"success": True}, now - 20, now - 10, now + 60)
+        VehicleReportService.update("autoteka", self.VIN, {"success": True}, now, now + 60, now + 120)
+
+        self.assertEqual(VehicleReportService.fresh_sections(self.VIN), {"autoteka": {"success": True}})
+        cached, checks = VehicleReportService.answer(self.VIN, ProviderCheckService.unified_checks(self.VIN))
+        self.assertEqual(set(cached), {"autoteka"})
+        self.assertEqual(set(checks), {"carstat", "vinhistory"})
+
+    @patch('apps.reports.services.HttpClientRegistry.get')
+    def test_unified_check_reads_report(self, mock_get_client) -> None:
+        """Test that a unified check of a VIN with a complete fresh report calls no provider."""
+        now = time.time()
+        VehicleReportService.update("autoteka", self.VIN, {"success": True}, now, now + 60, now + 120)
+        VehicleReportService.update("carstat", self.VIN, self.CARSTAT, now, now + 60, now + 120)
+        VehicleReportService.update("vinhistory", self.VIN, {"success": True}, now, now + 60, now + 120)
+
+        results = ProviderCheckService.check_unified(self.VIN)
+
+        self.assertEqual(results["carfax"], self.CARSTAT["carfax"])
+        self.assertEqual(set(results), {"autoteka", "carfax", "auction", "vinhistory"})
+        mock_get_client.assert_not_called()
+
+    @patch('apps.reports.views.CarfaxService.check')
+    def test_check_view_reads_report(self, mock_check) -> None:
+        """Test that the Carfax check view is answered from the report section."""
+        now = time.time()
+        VehicleReportService.update("carstat", self.VIN, self.CARSTAT, now, now + 60, now + 120)
+
+        response = Client().get(reverse('reports:api_check_carfax_autocheck'), {"vin": self.VIN.lower()})
+
+        self.assertEqual(response.json(), self.CARSTAT["carfax"])
+        mock_check.assert_not_called()
+
+
+class CacheWarmingTest(TestCase):
+    """Tests for refresh-ahead of popular VINs."""
+
+    VIN = "WVWZZZ1JZXW000001"
+    OTHER_VIN = "WVWZZZ1JZXW000002"
+
+    def setUp(self) -> None:
+        cache.clear()
+        NegativeFilterService._states.clear()
+        QueryLogService._website_user_id = None
+        self.user = User.objects.create_user(username="website", email="website@example.com", password="testpass123")
+
+    def request(self, identifier: str, count: int, query_type: str = "vinhistory") -> None:
+        for _ in range(count):
+            Query.objects.create(user=self.user, vin=identifier, query_type=query_type)
+
+    def cache_long_result(self, vin: str, stale_in: float) -> None:
+        """Cache a found Vinhistory result that goes stale in stale_in seconds."""
+        fetched_at = time.time() - settings.CACHE_TIME_LONG + stale_in
+        CacheService.write(CacheService.generate_key("vinhistory", vin), {"success": True, "vehicle": "old"},
+                           settings.CACHE_TIME_LONG, 2 * settings.CACHE_TIME_LONG, fetched_at)
+
+    def test_popular_ranks_linked_identifiers(self) -> None:
+        """Test that VINs are ranked by requests, plates count towards their VIN and rare VINs are left out."""
+        VinAliasService.record('regNumber', "А123ВС77", self.OTHER_VIN)
+        self.request(self.VIN, 2)
+        self.request(self.OTHER_VIN, 1)
+        self.request("A123BC77", 2, "autoteka_reg")
+        self.request("WVWZZZ1JZXW000003", 1)
+
+        self.assertEqual(CacheWarmingService.popular(), [self.OTHER_VIN, self.VIN])
+
+    @override_settings(CACHE_WARMING_DAILY_BUDGET=1)
+    @patch('apps.reports.services.VinhistoryService._fetch', return_value=({"success": True, "vehicle": "new"}, "long"))
+    def test_due_results_are_refreshed_within_budget(self, mock_fetch) -> None:
+        """Test that only long-lived results close to going stale are refreshed, up to the daily budget."""
+        self.request(self.VIN, 3)
+        self.request(self.OTHER_VIN, 2)
+        self.cache_long_result(self.VIN, 60)
+        self.cache_long_result(self.OTHER_VIN, 60)
+        CacheService.write(CacheService.generate_key("autoteka", "vin", self.VIN), {"success": False},
+                           settings.CACHE_TIME_SHORT, settings.CACHE_TIME_SHORT)
+
+        out = StringIO()
+        call_command('warm_popular_vins', '--once', stdout=out)
+
+        self.assertIn("2 results due, 1 refreshed, 0 failed, 1 skipped", out.getvalue())
+        mock_fetch.assert_called_once_with(self.VIN)
+        self.assertEqual(VinhistoryService.check(self.VIN)["vehicle"], "new")
+        self.assertEqual(VinhistoryService.check(self.OTHER_VIN)["vehicle"], "old")
+
+    @patch('apps.reports.services.VinhistoryService._fetch', return_value=({"success": True, "vehicle": "new"}, "long"))
+    def test_prevented_miss_is_counted_once(self, mock_fetch) -> None:
+        """Test that the first hit on a warmed result after the old one went stale counts as a prevented miss."""
+        self.request(self.VIN, 2)
+        self.cache_long_result(self.VIN, -60)
+
+        stats = CacheWarmingService.run()
+        self.assertEqual((stats["refreshed"], stats["prevented"]), (1, 0))
+
+        self.assertEqual(VinhistoryService.check(self.VIN), {"success": True, "vehicle": "new"})
+        VinhistoryService.check(self.VIN)
+        self.assertIn("vinhistory", VehicleReportService.fresh_sections(self.VIN))
+        self.assertEqual(CacheWarmingService.prevented(), 1)
@@ -14,7 +14,15 @@ urlpatterns = [
     path('api/check/carfax-autocheck/', views.CarfaxCheckView.as_view(), name='api_check_carfax_autocheck'),
     path('api/check/vinhistory/', views.VinhistoryCheckView.as_view(), name='api_check_vinhistory'),
     path('api/check/auction/', views.AuctionCheckView.as_view(), name='api_check_auction'),
+    path('api/check/bulk/', views.BulkCheckView.as_view(), name='api_check_bulk'),
+
+    # Background check jobs
+    path('api/jobs/<uuid:job_id>/', views.CheckJobStatusView.as_view(), name='api_check_job_status'),
     
+    # Upstream provider status for operators
+    path('api/providers/status/', views.ProviderStatusView.as_view(), name='api_provider_status'),
+
     # Recent website queries endpoint
     path('api/recent-queries/', views.RecentQueriesView.as_view(), name='recent_queries'),
+    path('api/recent-queries/stream/', views.RecentQueriesStreamView.as_view(), name='recent_queries_stream'),
 ]
\ No newline at end of file
@@ -1,11 +1,22 @@
+import asyncio
+import json
+import os
+from itertools import chain
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.generic import View, TemplateView
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 import logging
 from typing import Dict, Any, List, Optional, Tuple
-from django.contrib.auth import get_user_model
+from vagvin.http_client import HttpClientRegistry
+from vagvin.rate_limiter import QuotaExceededError
 from .models import Query
 from .services import (
     AutotekaService,
@@ -13,10 +24,19 @@ from .services import (
     VinhistoryService,
     AuctionService,
     AvitoService,
-    ExamplesService
+    BulkCheckService,
+    CacheService,
+    CacheWarmingService,
+    CheckJobService,
+    ExamplesService,
+    NegativeFilterService,
+    QueryLogService,
+    RecentQueriesFeed,
+    RecentQueriesService,
+    VehicleReportService,
+    VinAliasService
 )
 
-User = get_user_model()
 logger = logging.getLogger(__name__)
 
 
@@ -67,7 +87,16 @@ class AutotekaCheckView(View):
             logger.warning("Missing required parameters for Autoteka check")
             return JsonResponse({"error": "Необходимо указать VIN, регистрационный номер или ссылку на Avito"}, status=400)
         
-        result = AutotekaService.check(input_value, input_type)
+        if CheckJobService.is_requested(data):
+            # Return immediately, the background worker owns the preview polling
+            job = CheckJobService.submit(input_value, input_type)
+            return JsonResponse(CheckJobService.serialize(job), status=202)
+        
+        result = None
+        if input_type == 'vin':
+            result = VehicleReportService.section(input_value, 'autoteka')
+        if result is None:
+            result = AutotekaService.check(input_value, input_type)
         
         return JsonResponse(result)
 
@@ -92,16 +121,16 @@ class CarfaxCheckView(View):
         """Process the check request."""
         logger.info("Carfax/Autocheck check request received")
         
-        vin = data.get('vin')
+        vin, error = resolve_vin(data)
         
         if not vin:
             logger.warning("Missing VIN parameter for Carfax check")
-            return JsonResponse({"error": "Необходимо указать VIN автомобиля"}, status=400)
+            return JsonResponse({"error": error}, status=400)
         
         # Save query to database
         save_website_query(vin, 'carfax')
         
-        result = CarfaxService.check(vin)
+        result = VehicleReportService.section(vin, 'carfax') or CarfaxService.check(vin)
         
         return JsonResponse(result)
 
@@ -126,16 +155,16 @@ class VinhistoryCheckView(View):
         """Process the check request."""
         logger.info("Vinhistory check request received")
         
-        vin = data.get('vin')
+        vin, error = resolve_vin(data)
         
         if not vin:
             logger.warning("Missing VIN parameter for Vinhistory check")
-            return JsonResponse({"error": "Необходимо указать VIN автомобиля"}, status=400)
+            return JsonResponse({"error": error}, status=400)
         
         # Save query to database
         save_website_query(vin, 'vinhistory')
         
-        result = VinhistoryService.check(vin)
+        result = VehicleReportService.section(vin, 'vinhistory') or VinhistoryService.check(vin)
         
         return JsonResponse(result)
 
@@ -160,20 +189,109 @@ class AuctionCheckView(View):
         """Process the check request."""
         logger.info("Auction check request received")
         
-        vin = data.get('vin')
+        vin, error = resolve_vin(data)
         
         if not vin:
             logger.warning("Missing VIN parameter for Auction check")
-            return JsonResponse({"error": "Необходимо указать VIN автомобиля"}, status=400)
+            return JsonResponse({"error": error}, status=400)
         
         # Save query to database
         save_website_query(vin, 'auction')
         
-        result = AuctionService.check(vin)
+        result = VehicleReportService.section(vin, 'auction') or AuctionService.check(vin)
         
         return JsonResponse(result)
 
 
+class BulkCheckView(View):
+    """API endpoint for authenticated dealers checking many VINs at once, streaming results as NDJSON."""
+
+    def post(self, request, *args, **kwargs):
+        """Handle POST requests with a JSON body of 'vins' and optional 'providers'."""
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Необходимо войти в личный кабинет"}, status=401)
+
+        try:
+            data = json.loads(request.body)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            logger.warning("Invalid JSON received for bulk check")
+            return JsonResponse({"error": "Некорректный формат запроса"}, status=400)
+
+        vins = data.get('vins') if isinstance(data, dict) else None
+        if not isinstance(vins, list) or not vins:
+            return JsonResponse({"error": "Необходимо указать список VIN"}, status=400)
+        vins = BulkCheckService.normalize(vins)
+        if len(vins) > settings.BULK_CHECK_MAX_VINS:
+            return JsonResponse(
+                {"error": f"Можно проверить не более {settings.BULK_CHECK_MAX_VINS} VIN за один запрос"},
+                status=400
+            )
+
+        providers = data.get('providers') or list(BulkCheckService.CHECKS)
+        if not isinstance(providers, list) or set(providers) - set(BulkCheckService.CHECKS):
+            return JsonResponse(
+                {"error": f"Доступные сервисы: {', '.join(BulkCheckService.CHECKS)}"},
+                status=400
+            )
+        providers = list(dict.fromkeys(providers))
+
+        # Invalid VINs never reach the paid providers or the query log
+        vins, errors = BulkCheckService.validate(vins)
+
+        try:
+            BulkCheckService.acquire(request.user)
+        except QuotaExceededError as e:
+            logger.warning(f"Bulk check limit of user {request.user.username} is used up")
+            response = JsonResponse({"error": "Превышен лимит пакетных проверок, попробуйте позже"}, status=429)
+            response['Retry-After'] = str(int(e.retry_after) + 1)
+            return response
+
+        logger.info(f"Bulk check request of {request.user.username} received for {len(vins)} VINs "
+                    f"({len(errors)} invalid), providers: {', '.join(providers)}")
+        BulkCheckService.record_queries(vins, providers, request.user)
+
+        invalid_lines = (
+            {"vin": vin, "provider": provider, "result": {"error": error}, "cached": False}
+            for vin, error in errors.items() for provider in providers
+        )
+        lines = (
+            json.dumps(line, ensure_ascii=False) + "\n"
+            for line in chain(invalid_lines, BulkCheckService.iter_results(vins, providers))
+        )
+        response = StreamingHttpResponse(lines, content_type='application/x-ndjson')
+        # Keep proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class CheckJobStatusView(View):
+    """API endpoint for getting the status and result of a background check job."""
+
+    def get(self, request, job_id, *args, **kwargs) -> JsonResponse:
+        """Handle GET requests."""
+        status = CheckJobService.get_status(job_id)
+        if status is None:
+            return JsonResponse({"error": "Задача не найдена"}, status=404)
+        return JsonResponse(status)
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ProviderStatusView(View):
+    """Operator endpoint with upstream provider health and usage of the serving process."""
+
+    def get(self, request, *args, **kwargs) -> JsonResponse:
+        """Handle GET requests."""
+        return JsonResponse({
+            "pid": os.getpid(),
+            "http": HttpClientRegistry.stats(),
+            "cache": cache.stats() if hasattr(cache, 'stats') else None,
+            "cache_lookups": CacheService.lookup_stats(),
+            "cache_warming": CacheWarmingService.stats(),
+            "negative_filters": NegativeFilterService.stats(),
+            "autoteka_polling": AutotekaService.get_poll_scheduler().stats(list(AutotekaService.INPUT_TYPES)),
+        })
+
+
 class ExamplesView(TemplateView):
     """Render the examples page with all available example sections."""
     template_name = 'reports/examples.html'
@@ -205,35 +323,109 @@ class RecentQueriesView(View):
         except ValueError:
             limit = 10
         
-        queries = ExamplesService.get_recent_queries(limit=limit)
-        # Return JsonResponse consistent with other API views used by JS
-        return JsonResponse(queries, safe=False)
+        try:
+            seq, queries = RecentQueriesService.get(limit)
+        except Exception:
+            logger.exception("Failed to fetch recent website queries")
+            return JsonResponse([], safe=False)
+
+        # The buffer sequence only changes when a query is added
+        etag = f'"recent-{seq}-{limit}"'
+        if request.headers.get('If-None-Match') == etag:
+            response = HttpResponseNotModified()
+        else:
+            # Return JsonResponse consistent with other API views used by JS
+            response = JsonResponse(queries, safe=False)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+
+class RecentQueriesStreamView(View):
+    """
+    Server-Sent Events feed of recent website queries.
+
+    Sends the latest queries on connect and then only new ones as they are logged.
+    Under ASGI a connection is a coroutine waiting on RecentQueriesFeed, so idle
+    browsers hold no worker. Under WSGI it sends one snapshot and asks the browser
+    to reconnect later, which degrades to polling.
+    """
+
+    async def get(self, request, *args, **kwargs) -> StreamingHttpResponse:
+        """Handle GET requests from an EventSource."""
+        try:
+            limit = int(request.GET.get('limit', 10))
+        except ValueError:
+            limit = 10
+
+        seq, queries = await sync_to_async(RecentQueriesService.get)(limit)
+        if isinstance(request, ASGIRequest):
+            events = self._events(seq, queries, limit)
+        else:
+            events = [f"retry: {settings.RECENT_QUERIES_POLL_INTERVAL * 1000}\n\n",
+                      self._event("snapshot", seq, queries)]
+
+        response = StreamingHttpResponse(events, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        # Keep proxies from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @classmethod
+    async def _events(cls, seq: int, queries: List[str], limit: int):
+        """Yield the snapshot, then new queries as they arrive, until the connection is recycled."""
+        yield cls._event("snapshot", seq, queries)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.RECENT_QUERIES_STREAM_TTL
+        while (remaining := deadline - loop.time()) > 0:
+            new_seq = await RecentQueriesFeed.wait(seq, min(settings.RECENT_QUERIES_HEARTBEAT, remaining))
+            if new_seq == seq:
+                yield ": keep-alive\n\n"
+            elif new_seq < seq:
+                # The buffer was reset, e.g. by a cache flush
+                seq, queries = await sync_to_async(RecentQueriesService.get)(limit)
+                yield cls._event("snapshot", seq, queries)
+            else:
+                seq, queries = await sync_to_async(RecentQueriesService.since)(seq)
+                yield cls._event("queries", seq, queries)
+
+    @staticmethod
+    def _event(name: str, seq: int, queries: List[str]) -> str:
+        return f"id: {seq}\nevent: {name}\ndata: {json.dumps(queries, ensure_ascii=False)}\n\n"
+
+
+def resolve_vin(data) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Get the VIN of a VIN-only check request.
+
+    A license plate or Avito link is accepted instead of the VIN if an earlier Autoteka
+    check linked it to a VIN, so no upstream call is needed to resolve it.
+
+    Returns:
+        Tuple of the VIN, or None and the error message for the user.
+    """
+    if data.get('vin'):
+        return data.get('vin'), None
+    if data.get('regNumber'):
+        vin = VinAliasService.resolve('regNumber', data.get('regNumber'))
+    elif data.get('avitoUrl'):
+        vin = VinAliasService.resolve('itemId', AvitoService.extract_id(data.get('avitoUrl')))
+    else:
+        return None, "Необходимо указать VIN автомобиля"
+    if not vin:
+        return None, "VIN автомобиля ещё не известен, сначала проверьте его в Автотеке"
+    return vin, None
 
 
 # Helper function to save a query from website API checks
 def save_website_query(vin: str, query_type_value: str) -> None:
     """
     Save a query from website checks without authentication.
+
+    The row is queued and saved in a batch by QueryLogService, off the request path.
     
     Args:
         vin: Vehicle identification number
         query_type_value: Type of check (autoteka, carfax, etc.) formerly 'tip'
     """
-    try:
-        # Try to get a "website" user or use the first superuser as a fallback
-        website_user = User.objects.filter(username='website').first()
-        if not website_user:
-            website_user = User.objects.filter(is_superuser=True).first()
-        
-        if website_user:
-            # Create a query without cost (free check from website)
-            Query.objects.create(
-                user=website_user,
-                vin=vin.upper(),
-                query_type=query_type_value
-            )
-            logger.info(f"Saved website query for VIN {vin}, type {query_type_value}")
-        else:
-            logger.warning("Could not save website query - no suitable user found")
-    except Exception:
-        logger.exception("Failed to save website query")
+    QueryLogService.log(vin, query_type_value)
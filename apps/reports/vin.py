@@ -0,0 +1,172 @@
+"""
+Local VIN validation and decoding (ISO 3779), done before any paid upstream call.
+
+All lookup tables are built once at import, so validating and decoding a VIN is a
+handful of dict lookups.
+"""
+import re
+from datetime import date
+from typing import Any, Dict, Optional
+
+VIN_RE = re.compile(r'^[A-HJ-NPR-Z0-9]{17}$')
+
+# Characters allowed in a VIN in the order ISO 3780 uses for WMI ranges
+_RANGE_CHARS = "ABCDEFGHJKLMNPRSTUVWXYZ1234567890"
+
+# Check digit transliteration and position weights (ISO 3779 / 49 CFR 565)
+_TRANSLITERATION = {
+    **{str(digit): digit for digit in range(10)},
+    **dict(zip("ABCDEFGH", range(1, 9))),
+    **dict(zip("JKLMN", range(1, 6))), 'P': 7, 'R': 9,
+    **dict(zip("STUVWXYZ", range(2, 10))),
+}
+_WEIGHTS = (8, 7, 6, 5, 4, 3, 2, 10, 0, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# Model year codes (position 10) for the 1980-2009 cycle, the next cycle is 30 years later
+_YEAR_CODES = {code: 1980 + offset for offset, code in enumerate("ABCDEFGHJKLMNPRSTVWXY123456789")}
+
+# WMI regions of the first character, the check digit is mandatory for North American VINs
+_NORTH_AMERICA = frozenset("12345")
+
+_COUNTRY_RANGES = (
+    ("AA", "AH", "ЮАР"),
+    ("J", None, "Япония"),
+    ("KL", "KR", "Южная Корея"),
+    ("L", None, "Китай"),
+    ("MA", "ME", "Индия"),
+    ("MF", "MK", "Индонезия"),
+    ("ML", "MR", "Таиланд"),
+    ("NM", "NM", "Турция"),
+    ("PL", "PR", "Малайзия"),
+    ("SA", "SM", "Великобритания"),
+    ("SN", "ST", "Германия"),
+    ("SU", "SZ", "Польша"),
+    ("TA", "TH", "Швейцария"),
+    ("TJ", "TP", "Чехия"),
+    ("TR", "TV", "Венгрия"),
+    ("TW", "T1", "Португалия"),
+    ("VA", "VE", "Австрия"),
+    ("VF", "VR", "Франция"),
+    ("VS", "VW", "Испания"),
+    ("VX", "V2", "Сербия"),
+    ("WA", "W0", "Германия"),
+    ("XL", "XR", "Нидерланды"),
+    ("XS", "XW", "Россия"),
+    ("X3", "X0", "Россия"),
+    ("YA", "YE", "Бельгия"),
+    ("YF", "YK", "Финляндия"),
+    ("YS", "YW", "Швеция"),
+    ("ZA", "ZR", "Италия"),
+    ("1", None, "США"),
+    ("2", None, "Канада"),
+    ("3A", "3W", "Мексика"),
+    ("4", None, "США"),
+    ("5", None, "США"),
+    ("8A", "8E", "Аргентина"),
+    ("9A", "9E", "Бразилия"),
+)
+
+
+def _expand_countries() -> Dict[str, str]:
+    """Expand the ISO 3780 ranges to a country per two-character WMI prefix."""
+    countries = {}
+    for start, end, country in _COUNTRY_RANGES:
+        if end is None:
+            for second in _RANGE_CHARS:
+                countries[start + second] = country
+            continue
+        first = start[0]
+        low, high = _RANGE_CHARS.index(start[1]), _RANGE_CHARS.index(end[1])
+        for second in _RANGE_CHARS[low:high + 1]:
+            countries[first + second] = country
+    return countries
+
+
+_COUNTRIES = _expand_countries()
+
+MANUFACTURERS = {
+    "WVW": "Volkswagen", "WV1": "Volkswagen Коммерческие", "WV2": "Volkswagen Коммерческие",
+    "WV3": "Volkswagen Коммерческие", "1VW": "Volkswagen", "3VW": "Volkswagen", "XW8": "Volkswagen",
+    "WAU": "Audi", "WUA": "Audi", "TRU": "Audi", "WP0": "Porsche", "WP1": "Porsche",
+    "TMB": "Škoda", "VSS": "SEAT",
+    "WBA": "BMW", "WBS": "BMW M", "WMW": "MINI",
+    "WDB": "Mercedes-Benz", "WDD": "Mercedes-Benz", "W1K": "Mercedes-Benz",
+    "WF0": "Ford", "1FA": "Ford", "W0L": "Opel",
+    "VF1": "Renault", "X7L": "Renault", "VF3": "Peugeot", "VF7": "Citroën", "ZFA": "Fiat",
+    "YV1": "Volvo", "SAL": "Land Rover", "SAJ": "Jaguar",
+    "JTD": "Toyota", "JTE": "Toyota", "2T1": "Toyota", "VNK": "Toyota",
+    "JHM": "Honda", "1HG": "Honda", "JN1": "Nissan",
+    "KMH": "Hyundai", "Z94": "Hyundai", "KNA": "Kia",
+    "1G1": "Chevrolet", "5YJ": "Tesla", "XTA": "Lada",
+}
+
+# Assembly plants (position 11) of the makes whose codes are stable across models
+PLANTS = {
+    "Volkswagen": {"W": "Вольфсбург", "E": "Эмден", "H": "Ганновер", "M": "Пуэбла", "P": "Цвиккау",
+                   "D": "Братислава"},
+    "Audi": {"A": "Ингольштадт", "N": "Неккарзульм", "1": "Дьёр"},
+}
+
+
+def normalize_vin(vin: Any) -> str:
+    """Strip and uppercase a VIN."""
+    return str(vin or "").strip().upper()
+
+
+def check_digit(vin: str) -> str:
+    """Compute the ISO 3779 check digit ('0'-'9' or 'X') of a syntactically valid VIN."""
+    remainder = sum(_TRANSLITERATION[char] * weight for char, weight in zip(vin, _WEIGHTS)) % 11
+    return "X" if remainder == 10 else str(remainder)
+
+
+def validate_vin(vin: str) -> Optional[str]:
+    """
+    Validate a normalized VIN without any network call.
+
+    Returns:
+        Error message for the user, or None if the VIN is valid.
+    """
+    if len(vin) != 17:
+        return "VIN должен состоять из 17 символов"
+    if not VIN_RE.fullmatch(vin):
+        return "VIN содержит недопустимые символы (буквы I, O, Q не используются)"
+    if vin[0] in _NORTH_AMERICA and vin[8] != check_digit(vin):
+        return "Неверная контрольная цифра VIN"
+    return None
+
+
+def decode_vin(vin: str) -> Dict[str, Any]:
+    """
+    Decode the make, country, model year and plant of a normalized VIN from local tables.
+
+    Returns:
+        Dict with 'valid' and 'error'; valid VINs also get 'wmi', 'make', 'country',
+        'year' and 'plant' (None where the tables have no answer).
+    """
+    error = validate_vin(vin)
+    if error:
+        return {"vin": vin, "valid": False, "error": error}
+
+    wmi = vin[:3]
+    make = MANUFACTURERS.get(wmi)
+    return {
+        "vin": vin,
+        "valid": True,
+        "error": None,
+        "wmi": wmi,
+        "make": make,
+        "country": _COUNTRIES.get(vin[:2]),
+        "year": _model_year(vin),
+        "plant": PLANTS.get(make, {}).get(vin[10]),
+    }
+
+
+def _model_year(vin: str) -> Optional[int]:
+    """Get the model year, picking the 30-year cycle from position 7 or the current date."""
+    year = _YEAR_CODES.get(vin[9])
+    if year is None:
+        return None
+    if vin[0] in _NORTH_AMERICA:
+        # North American VINs use a letter in position 7 from model year 2010 on
+        return year + 30 if vin[6].isalpha() else year
+    return year + 30 if year + 30 <= date.today().year + 1 else year
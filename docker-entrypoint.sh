@@ -41,21 +41,32 @@ mkdir -p logs
 mkdir -p media
 mkdir -p staticfiles
 
-# Apply migrations
-echo "Applying database migrations..."
-python manage.py migrate contenttypes
-python manage.py migrate auth
-python manage.py migrate accounts
-python manage.py migrate admin
-python manage.py migrate sessions
-python manage.py migrate payments
-python manage.py migrate reports
-python manage.py migrate reviews
-python manage.py migrate
-
-# Collect static files
-echo "Collecting static files..."
-python manage.py collectstatic --noinput
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+    # Apply migrations
+    echo "Applying database migrations..."
+    python manage.py migrate contenttypes
+    python manage.py migrate auth
+    python manage.py migrate accounts
+    python manage.py migrate admin
+    python manage.py migrate sessions
+    python manage.py migrate payments
+    python manage.py migrate reports
+    python manage.py migrate reviews
+    python manage.py migrate
+
+    # Create the shared cache table (no-op unless CACHE_BACKEND is DatabaseCache)
+    python manage.py createcachetable
+
+    # Collect static files
+    echo "Collecting static files..."
+    python manage.py collectstatic --noinput
+else
+    # Another container owns the migrations, wait until it has applied them
+    echo "Waiting for database migrations..."
+    until python manage.py migrate --check > /dev/null 2>&1; do
+        sleep 2
+    done
+fi
 
 # Start the application
 echo "Starting application..."